@@ -0,0 +1,175 @@
+"""Headless UI benchmark: drives ``streamlit_app.py`` through Streamlit's AppTest.
+
+Each simulated commander is its own AppTest session, already logged in,
+that initializes the operation and then issues scripted orders. Turns go
+through the real pipeline (prompt build, worker pool, admission control,
+parse/apply, persistence) with the scripted squad model and the Firestore
+fake standing in for Gemini and GCP. Commanders run on threads in one
+process, so they share the app's cached resources like sessions on one
+Cloud Run instance do.
+
+Reports per (mission length, commanders):
+  rerun_*    wall time of every script rerun (order submit and polling runs)
+  turn_*     order submitted -> squad reply applied
+  turns_per_s  completed turns per second across all commanders
+  mem_kb_per_session  traced allocation growth per session (--memory)
+  state_kb   serialized mission state per session
+
+    python benchmarks/bench_app.py [--turns 1 10 50 200] [--commanders 1 4 16]
+                                   [--latency 0.0] [--memory] [--json out.json]
+
+``--record t.jsonl`` writes every model turn to a transcript; ``--replay
+t.jsonl`` plays that transcript's orders back with responses served only from
+it (an order it doesn't cover is refused, never sent to a model), so
+regressions can be measured on a fixed mission without a model at all.
+"""
+import argparse
+import os
+import threading
+import time
+import tracemalloc
+
+from common import APP_PATH, ROOT, TURN_COUNTS, commander_orders, load_mission, report, stats
+
+from uge.response_cache import load_transcript
+from uge.session_store import snapshot_session
+from uge.tracing import payload_bytes
+
+# Give up on a turn that hasn't landed after this long (something is wedged)
+TURN_TIMEOUT_SECONDS = 60
+POLL_INTERVAL_SECONDS = 0.01
+INITIALIZE_LABEL = "INITIALIZE OPERATION"
+CHECK_IN_ORDER = "Team is at the insertion point. Report in."
+
+
+def _timed_run(at, reruns):
+    start = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].message}")
+
+
+def _turn_settled(at):
+    state = at.session_state
+    pending = state["pending_turn"] if "pending_turn" in state else None
+    queued = state["queued_orders"] if "queued_orders" in state else []
+    return not pending and not queued
+
+
+def _wait_for_turn(at, reruns):
+    deadline = time.monotonic() + TURN_TIMEOUT_SECONDS
+    while not _turn_settled(at):
+        if time.monotonic() > deadline:
+            raise TimeoutError("turn did not land")
+        time.sleep(POLL_INTERVAL_SECONDS)
+        # A plain rerun is what the polling fragment triggers once the job is done
+        _timed_run(at, reruns)
+
+
+def commander(name, orders, results):
+    """One simulated player: log in, start the mission, play ``orders``."""
+    from streamlit.testing.v1 import AppTest
+
+    reruns, turns = [], []
+    at = AppTest.from_file(APP_PATH, default_timeout=TURN_TIMEOUT_SECONDS)
+    at.session_state["authentication_status"] = True
+    at.session_state["username"] = name
+    at.session_state["name"] = name
+    _timed_run(at, reruns)
+
+    start_buttons = [b for b in at.button if INITIALIZE_LABEL in str(b.label)]
+    if start_buttons:
+        start = time.perf_counter()
+        start_buttons[0].click()
+        _timed_run(at, reruns)
+        _wait_for_turn(at, reruns)
+        turns.append(time.perf_counter() - start)
+
+    for order in orders:
+        start = time.perf_counter()
+        at.chat_input[0].set_value(order)
+        _timed_run(at, reruns)
+        _wait_for_turn(at, reruns)
+        turns.append(time.perf_counter() - start)
+
+    state = {key: at.session_state[key] for key in
+             ("locations", "objectives", "mission_time", "discovered_locations",
+              "messages", "mission_context") if key in at.session_state}
+    results[name] = {
+        "reruns": reruns,
+        "turns": turns,
+        "state_bytes": payload_bytes(snapshot_session(state)) + payload_bytes(state.get("messages", [])),
+    }
+
+
+def run(mission, turns, commanders, memory=False, script=None):
+    results = {}
+    threads = [
+        threading.Thread(target=commander, args=(
+            f"bench{i:03d}", script if script is not None else commander_orders(mission, turns, offset=i), results))
+        for i in range(commanders)
+    ]
+    if memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    mem_kb = None
+    if memory:
+        mem_kb = round((tracemalloc.get_traced_memory()[0] - baseline) / 1024 / commanders, 1)
+        tracemalloc.stop()
+
+    if len(results) != commanders:
+        raise RuntimeError(f"{commanders - len(results)} commander(s) failed; see traceback above")
+    reruns = [r for res in results.values() for r in res["reruns"]]
+    turn_times = [t for res in results.values() for t in res["turns"]]
+    rerun_stats, turn_stats = stats(reruns), stats(turn_times)
+    return {
+        "turns": turns,
+        "commanders": commanders,
+        "rerun_p50_ms": rerun_stats["p50"],
+        "rerun_p95_ms": rerun_stats["p95"],
+        "turn_p50_ms": turn_stats["p50"],
+        "turn_p95_ms": turn_stats["p95"],
+        "turns_per_s": round(len(turn_times) / elapsed, 2),
+        "mem_kb_per_session": mem_kb,
+        "state_kb": round(max(res["state_bytes"] for res in results.values()) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=list(TURN_COUNTS))
+    parser.add_argument("--commanders", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated model seconds per turn (UGE_OFFLINE_LATENCY)")
+    parser.add_argument("--memory", action="store_true", help="trace allocations (slower)")
+    parser.add_argument("--record", help="append every model turn to this transcript")
+    parser.add_argument("--replay", help="replay this transcript's orders from the cache only")
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    os.environ["UGE_OFFLINE_LATENCY"] = str(args.latency)
+    if args.record:
+        os.environ["UGE_RESPONSE_RECORD"] = os.path.abspath(args.record)
+    script = None
+    if args.replay:
+        os.environ["UGE_RESPONSE_REPLAY"] = os.path.abspath(args.replay)
+        # The check-in comes from the INITIALIZE button, not the chat box
+        script = [t["command"] for t in load_transcript(args.replay) if t["command"] != CHECK_IN_ORDER]
+        args.turns = [len(script)]
+    # AppTest resolves style.css and the missions/ directory relative to the working directory
+    os.chdir(ROOT)
+    mission = load_mission()
+    rows = [run(mission, turns, n, memory=args.memory, script=script)
+            for turns in args.turns for n in args.commanders]
+    report(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
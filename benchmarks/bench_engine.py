@@ -0,0 +1,93 @@
+"""Engine-level benchmark: parsing, context building and persistence.
+
+No Streamlit involved. For each mission length it replays scripted SITREPs
+through ``parse_turn`` and ``MissionContext``, saves every turn through
+``MissionStateWriter`` against the Firestore fake, then loads the mission
+back. Reports per-turn costs and the serialized state size.
+
+    python benchmarks/bench_engine.py [--turns 1 10 50 200] [--json out.json]
+"""
+import argparse
+import time
+
+from common import TURN_COUNTS, commander_orders, load_mission, report, stats
+
+from uge.context import MissionContext
+from uge.fakes import FakeFirestoreClient, ScriptedSquadGateway
+from uge.persistence import MissionStateWriter
+from uge.session_store import snapshot_session
+from uge.sitrep import parse_turn
+from uge.tracing import payload_bytes
+
+
+def run(mission, turns):
+    gateway = ScriptedSquadGateway(mission)
+    db = FakeFirestoreClient()
+    writer = MissionStateWriter(db, debounce=0)
+    state = {
+        "locations": {u: "Insertion Point" for u in ("SAM", "DAVE", "MIKE")},
+        "objectives": mission.initial_objectives(),
+        "mission_time": 60,
+        "discovered_locations": [],
+        "mission_context": MissionContext(None),
+    }
+    messages = []
+    build_t, parse_t, save_t = [], [], []
+    started = time.perf_counter()
+    for i, order in enumerate(commander_orders(mission, turns)):
+        context = state["mission_context"]
+        locs = ", ".join(f"{u}@{loc}" for u, loc in state["locations"].items())
+        objs = ", ".join(f"{k}:{'DONE' if v else 'OPEN'}" for k, v in state["objectives"].items())
+        prompt = f"[SYSTEM_STATE] Time:{60 - i}m | Locations:{locs} | Objectives:{objs}\n[COMMANDER_ORDERS] {order}"
+
+        t0 = time.perf_counter()
+        contents = context.build_contents(prompt)
+        build_t.append(time.perf_counter() - t0)
+        text = gateway.complete(contents)
+
+        t0 = time.perf_counter()
+        turn = parse_turn(text, mission.win_condition.trigger_text)
+        parse_t.append(time.perf_counter() - t0)
+        state["locations"].update(turn.locations)
+        for obj_id in turn.completed_objectives:
+            state["objectives"][obj_id] = True
+        context.record(order, prompt, text, facts={"time": 60 - i})
+        new = [{"role": "user", "content": order},
+               {"role": "assistant", "content": turn.dialogue, "raw_text": turn.clean_text}]
+
+        t0 = time.perf_counter()
+        writer.save("bench", "panama", fields=snapshot_session(state),
+                    messages=new, start_seq=len(messages))
+        save_t.append(time.perf_counter() - t0)
+        messages.extend(new)
+    writer.flush()
+    elapsed = time.perf_counter() - started
+
+    t0 = time.perf_counter()
+    loaded = writer.load("bench", "panama")
+    load_t = time.perf_counter() - t0
+    assert len(loaded["messages"]) == len(messages)
+    return {
+        "turns": turns,
+        "turns_per_s": round(turns / elapsed, 1),
+        "build_p95_ms": stats(build_t)["p95"],
+        "parse_p95_ms": stats(parse_t)["p95"],
+        "save_p95_ms": stats(save_t)["p95"],
+        "load_ms": round(load_t * 1000, 2),
+        "state_bytes": payload_bytes(snapshot_session(state)),
+        "feed_bytes": payload_bytes(messages),
+        "firestore_writes": db.writes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=list(TURN_COUNTS))
+    parser.add_argument("--json")
+    args = parser.parse_args()
+    mission = load_mission()
+    report([run(mission, n) for n in args.turns], args.json)
+
+
+if __name__ == "__main__":
+    main()
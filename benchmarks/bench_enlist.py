@@ -0,0 +1,123 @@
+"""Enlistment throughput: concurrent sign-ups against one instance's hash pool.
+
+A burst of ``--burst`` commanders submit the enlistment form at once. Each
+request goes through ``EnlistmentService`` (bcrypt on the bounded pool,
+uniqueness checks alongside it, one write to the Firestore fake). Reports
+per-enlistment latency and enlistments per second.
+
+Target: with hashing the only CPU-bound step, an instance should sustain at
+least 80% of ``min(hash_workers, cores) / single_hash_seconds``
+(``target_per_s``), and the script thread should hand off in a few
+milliseconds (``submit_p95_ms``). The old path held the session thread for a
+hash plus a 2 s sleep per recruit (``legacy_hold_ms``).
+
+Uses stauth's hasher (bcrypt) when installed, else a PBKDF2 stand-in of
+similar cost; the ``hasher`` column says which.
+
+    python benchmarks/bench_enlist.py [--burst 1 8 32 64] [--workers N] [--json out.json]
+"""
+import argparse
+import hashlib
+import os
+import statistics
+import threading
+import time
+
+from common import report, stats
+
+from uge.credentials import CredentialStore
+from uge.enlistment import DEFAULT_HASH_WORKERS, EnlistmentService
+from uge.fakes import FakeFirestoreClient
+
+LEGACY_SLEEP_SECONDS = 2.0
+TARGET_EFFICIENCY = 0.8
+
+
+def pick_hasher():
+    try:
+        import bcrypt
+    except ImportError:
+        return "pbkdf2", lambda password: hashlib.pbkdf2_hmac(
+            "sha256", password.encode(), os.urandom(16), 200_000).hex()
+    return "bcrypt", lambda password: bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def single_hash_seconds(hasher, samples=7):
+    """Median time of one hash, measured serially (a mean of a few is skewed by CPU noise)."""
+    hasher("warm-up-password")
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher("reference-password")
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run(burst, workers, hasher_name, hasher):
+    # Re-measured right before each burst so the target tracks the CPU the burst actually gets
+    hash_s = single_hash_seconds(hasher)
+    db = FakeFirestoreClient()
+    service = EnlistmentService(db, CredentialStore(db), hasher, hash_workers=workers)
+    submit_t = []
+    started = time.perf_counter()
+    requests = []
+    for i in range(burst):
+        t0 = time.perf_counter()
+        request_id = service.enlist({"email": f"recruit{i}@gundogs.test", "username": f"recruit{i}",
+                                     "full_name": f"Recruit {i}", "role": "Recruit"}, f"pw-{i}")
+        submit_t.append(time.perf_counter() - t0)
+        requests.append((request_id, t0))
+
+    latencies = []
+    done = threading.Event()
+    remaining = [burst]
+    lock = threading.Lock()
+
+    def landed(t0):
+        def callback(_future):
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                remaining[0] -= 1
+                if not remaining[0]:
+                    done.set()
+        return callback
+
+    for request_id, t0 in requests:
+        service.get(request_id).add_done_callback(landed(t0))
+    done.wait()
+    elapsed = time.perf_counter() - started
+    for request_id, _ in requests:
+        service.get(request_id).result()   # surface any failure
+
+    lat, sub = stats(latencies), stats(submit_t)
+    # Hashes can't run wider than the cores, nor than the burst
+    parallel = min(workers, os.cpu_count() or 1, burst)
+    per_s = burst / elapsed
+    return {
+        "burst": burst,
+        "hash_workers": workers,
+        "hasher": hasher_name,
+        "hash_ms": round(hash_s * 1000, 1),
+        "submit_p95_ms": sub["p95"],
+        "enlist_p50_ms": lat["p50"],
+        "enlist_p95_ms": lat["p95"],
+        "enlist_per_s": round(per_s, 2),
+        "target_per_s": round(TARGET_EFFICIENCY * parallel / hash_s, 2),
+        "meets_target": per_s >= TARGET_EFFICIENCY * parallel / hash_s,
+        "legacy_hold_ms": round((hash_s + LEGACY_SLEEP_SECONDS) * 1000, 1),
+        "users_written": len(list(db.collection("users").stream())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--workers", type=int, default=DEFAULT_HASH_WORKERS)
+    parser.add_argument("--json")
+    args = parser.parse_args()
+    hasher_name, hasher = pick_hasher()
+    report([run(n, args.workers, hasher_name, hasher) for n in args.burst], args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Shared setup for the offline benchmarks.
+
+Importing this module points the app at its offline backends (``UGE_OFFLINE``:
+in-process Firestore fake and the scripted squad model), so nothing here
+spends Gemini quota or touches a real database. Run the scripts from the
+repository root, e.g. ``python benchmarks/bench_app.py``.
+"""
+import json
+import os
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "streamlit_app.py")
+MISSIONS_DIR = os.path.join(ROOT, "missions")
+MISSION_ID = os.environ.get("UGE_DEFAULT_MISSION", "panama")
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault("UGE_OFFLINE", "1")
+os.environ.setdefault("UGE_PREFIX_CACHE", "local")
+# Route every order through the (scripted) model so turns measure the full pipeline
+os.environ.setdefault("UGE_LOCAL_COMMANDS", "0")
+
+from uge.catalog import MissionCatalog  # noqa: E402
+
+UNITS = ("SAM", "DAVE", "MIKE")
+TURN_COUNTS = (1, 10, 50, 200)
+
+
+def load_mission(mission_id=MISSION_ID):
+    return MissionCatalog(MISSIONS_DIR).get(mission_id)
+
+
+def commander_orders(mission, turns, offset=0):
+    """Deterministic order script: units take turns moving around every POI."""
+    pois = [poi for poi in mission.pois.values() if poi.id != "insertion_point"]
+    orders = []
+    for i in range(turns):
+        poi = pois[(i + offset) % len(pois)]
+        unit = UNITS[(i + offset) % len(UNITS)]
+        orders.append(f"{unit}, get over to {poi.name} and sweep it. Report what you find.")
+    return orders
+
+
+def stats(values):
+    """p50/p95/mean/max in milliseconds for a list of second timings."""
+    if not values:
+        return {"n": 0}
+    ms = sorted(v * 1000 for v in values)
+    return {
+        "n": len(ms),
+        "p50": round(ms[len(ms) // 2], 2),
+        "p95": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 2),
+        "mean": round(statistics.fmean(ms), 2),
+        "max": round(ms[-1], 2),
+    }
+
+
+def report(rows, json_path=None):
+    """Prints one line per row and optionally writes all rows as JSON."""
+    for row in rows:
+        print("  ".join(f"{k}={v}" for k, v in row.items()))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"wrote {json_path}")
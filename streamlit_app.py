@@ -1,34 +1,60 @@
 import streamlit as st
-import xml.etree.ElementTree as ET
-import google.generativeai as genai
-import re
 import datetime
-import folium
-from streamlit_folium import st_folium
-from google.cloud import firestore
-from google.oauth2 import service_account
-import google.auth
-from google.auth.transport.requests import Request
-from google.cloud import storage
-import streamlit_authenticator as stauth
-import time
 import os
 import json
+import html
+import threading
+
+from uge.commands import (ChecklistQuery, MoveOrder, StatusQuery, acknowledge_move, checklist_report,
+                          move_event, parse_command, status_report)
+from uge.aar import AAREngine, extract_transcript
+from uge.admission import DEFAULT_RPM, DEFAULT_TPM, AdmissionController, AdmissionTimeout
+from uge.assets import (DEFAULT_MAX_BYTES as DEFAULT_ASSET_CACHE_BYTES, DERIVED_DIR, AssetPipeline,
+                        derived_path, fetch_bytes, static_url)
+from uge.catalog import DEFAULT_MAX_COMPILED, MissionCatalog
+from uge.context import (DEFAULT_MAX_LEDGER, DEFAULT_MAX_TURNS, DEFAULT_TOKEN_BUDGET, MissionContext,
+                         estimate_tokens)
+from uge.credentials import CredentialStore, DEFAULT_TTL_SECONDS, FALLBACK_OPERATIVE
+from uge.enlistment import DEFAULT_HASH_WORKERS, EnlistmentConflict, EnlistmentService
+from uge.jobs import DEFAULT_WORKERS as DEFAULT_TURN_WORKERS, QUEUED as JOB_QUEUED, TurnDispatcher
+from uge.llm import (DEFAULT_CACHE_MODEL, DEFAULT_CACHE_TTL_SECONDS, GeminiPrefixCache,
+                     LLMGateway, LocalPrefixCache, PromptPrefix)
+from uge.mission import MissionCompileError, compile_mission
+from uge.objectives import DONE as OBJ_DONE, LOCKED as OBJ_LOCKED, ObjectiveTracker
+from uge.persistence import server_timestamp
+from uge.response_cache import (FirestoreResponseTier, ReplayMiss, ResponseCache, TranscriptRecorder,
+                                load_transcript, response_key, state_snapshot)
+from uge.session_store import FIRESTORE, open_session_store, restore_session, snapshot_session
+from uge.sitrep import STRUCTURED_GENERATION_CONFIG, STRUCTURED_RESPONSE_GUIDE, parse_turn
+from uge.startup import REPORT
+from uge.tactical_map import SATELLITE_TILES, TOKEN_ICONS, build_base_map, build_dynamic_layer, detach_layer
+from uge.tiles import (BUNDLE_FILE, DEFAULT_CACHE_BYTES as DEFAULT_TILE_CACHE_BYTES, DEFAULT_HOST as DEFAULT_TILE_HOST,
+                       DEFAULT_PORT as DEFAULT_TILE_PORT, MBTilesBundle, TileCache, TileProxy, TileServer,
+                       http_fetcher, mission_bbox, mission_zooms)
+from uge.tracing import JsonlSink, Tracer, payload_bytes
+
+# Offline mode (UGE_OFFLINE=1): in-process Firestore and a scripted squad model, no GCP
+# or Gemini credentials needed. Used for local runs and the benchmarks/ harness.
+OFFLINE = os.environ.get("UGE_OFFLINE", "0") == "1"
 
 # --- TACTICAL SECRET LOADER ---
-try:
-    # First, try the standard Streamlit way (Local/Streamlit Cloud)
-    credentials_info = st.secrets["gcp_service_account_firestore"]
-except (st.errors.StreamlitSecretNotFoundError, KeyError):
-    # Fallback: Look for the Cloud Run Environment Variable
-    # This must match the exact name in your Cloud Run Variables tab
-    creds_json = os.environ.get("GCP_SERVICE_ACCOUNT_FIRESTORE")
-    if creds_json:
-        credentials_info = json.loads(creds_json)
-    else:
+def load_credentials_info():
+    if OFFLINE:
+        return {"project_id": "uge-offline"}
+    try:
+        # First, try the standard Streamlit way (Local/Streamlit Cloud)
+        return st.secrets["gcp_service_account_firestore"]
+    except (st.errors.StreamlitSecretNotFoundError, KeyError):
+        # Fallback: Look for the Cloud Run Environment Variable
+        # This must match the exact name in your Cloud Run Variables tab
+        creds_json = os.environ.get("GCP_SERVICE_ACCOUNT_FIRESTORE")
+        if creds_json:
+            return json.loads(creds_json)
         st.error("CRITICAL: GCP Credentials not found in Secrets or Env Vars.")
         st.stop()
 
+credentials_info = load_credentials_info()
+
 def local_css(file_name):
     with open(file_name) as f:
         st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
@@ -36,91 +62,194 @@ def local_css(file_name):
 local_css("style.css")
 
 # --- CONFIGURATION & INITIALIZATION ---
-st.set_page_config(layout="wide", page_title="Gundogs C2: Cristobal Mission")
+st.set_page_config(layout="wide", page_title="Gundogs C2")
+
+# Heavy SDKs (Firestore, Gemini, folium, stauth) are imported on first use and timed
+# into the startup report (UGE_STARTUP_REPORT) so cold starts can be tracked per release
+def get_service_account_credentials():
+    service_account = REPORT.lazy_import("google.oauth2.service_account")
+    # Note: Streamlit handles the TOML section as a clean Python dictionary
+    return service_account.Credentials.from_service_account_info(credentials_info)
+
+@st.cache_resource
+def get_db():
+    """Firestore client, built the first time something actually reads or writes."""
+    if OFFLINE:
+        # Only offline runs load the fakes; production never imports them
+        from uge.fakes import FakeFirestoreClient
+        return FakeFirestoreClient.shared()
+    firestore = REPORT.lazy_import("google.cloud.firestore")
+    with REPORT.phase("firestore_client"):
+        return firestore.Client(
+            credentials=get_service_account_credentials(), 
+            project=credentials_info["project_id"],
+            database="gundogs"  # <--- CRITICAL: Match the ID from your screenshot
+        )
+
+# --- TRACING ---
+# Span timings for turns, persistence, credentials and rendering; JSONL when UGE_TRACE_PATH is set
+@st.cache_resource
+def get_tracer():
+    path = os.environ.get("UGE_TRACE_PATH")
+    return Tracer(sink=JsonlSink(path) if path else None)
 
-# 1. Load the credentials from st.secrets dictionary
-# Note: Streamlit handles the TOML section as a clean Python dictionary
-gcp_service_creds = service_account.Credentials.from_service_account_info(credentials_info)
+def turn_number():
+    context = st.session_state.get("mission_context")
+    return (context.seq if context is not None else 0) + 1
 
-# 2. Initialize the Firestore client
-db = firestore.Client(
-    credentials=gcp_service_creds, 
-    project=credentials_info["project_id"],
-    database="gundogs"  # <--- CRITICAL: Match the ID from your screenshot
-)
+@st.cache_resource
+def get_credential_store():
+    """Process-wide operative roster shared by every session on this instance."""
+    return CredentialStore(get_db(), ttl=int(os.environ.get("UGE_CREDENTIALS_TTL", DEFAULT_TTL_SECONDS)))
 
 def get_user_credentials():
-    creds = {"usernames": {}}
     try:
-        # Stream operatives directly from the 'gundogs' database
-        users_ref = db.collection("users").stream()
-        for doc in users_ref:
-            data = doc.to_dict()
-            
-            # The library expects 'username' as the key in the 'usernames' dict
-            # Your Firestore uses 'username' field (e.g., peterburnett)
-            u_name = data.get("username")
-            if u_name:
-                creds["usernames"][u_name] = {
-                    "name": data.get("full_name"),
-                    "password": data.get("password"), # BCrypt hash
-                    "email": data.get("email")
-                }
+        # Served from the shared snapshot; Firestore is only streamed once per TTL
+        with get_tracer().span("credentials.snapshot") as span:
+            credentials = get_credential_store().snapshot()
+            span.set(operatives=len(credentials["usernames"]))
+        return credentials
     except Exception as e:
         st.error(f"Intel Sync Error: {e}")
+        return {"usernames": dict(FALLBACK_OPERATIVE)}
 
-    # Fallback for empty database
-    if not creds["usernames"]:
-        creds["usernames"]["admin"] = {"name": "Admin", "password": "N/A", "email": "N/A"}
-    return creds
-
-# --- 1. CLOUD DATA RETRIEVAL ---
-# Keep this! It fetches the latest operatives from Firestore
-credentials_data = get_user_credentials()
-
-# --- 2. SINGLETON AUTHENTICATOR INITIALIZATION ---
-# We check session state to ensure we only create ONE authenticator object
-if "authenticator" not in st.session_state:
+def build_authenticator():
+    stauth = REPORT.lazy_import("streamlit_authenticator")
     st.session_state.authenticator = stauth.Authenticate(
-        credentials_data,
+        get_user_credentials(),
         "gundog_cookie",
         "gundog_secret_key",
         cookie_expiry_days=30
     )
+    st.session_state.authenticator_version = get_credential_store().version
+
+# Session key of the login form's username input (read back when a login misses the roster)
+LOGIN_USERNAME_KEY = "login_username"
+
+def attempt_login(username, password):
+    """Checks a submitted login through the authenticator; sets its session keys and cookie."""
+    authenticator = st.session_state.authenticator
+    if authenticator.authentication_controller.login(username, password):
+        authenticator.cookie_controller.set_cookie()
+        return True
+    return False
+
+# --- ENLISTMENT & RESETS ---
+# bcrypt runs on a CPU-sized pool (UGE_HASH_WORKERS); the session only holds a request id
+AUTH_POLL_SECONDS = 0.5
+
+def hash_password(password):
+    return REPORT.lazy_import("streamlit_authenticator").Hasher.hash(password)
+
+@st.cache_resource
+def get_enlistment_service():
+    return EnlistmentService(get_db(), get_credential_store(), hash_password,
+                             hash_workers=int(os.environ.get("UGE_HASH_WORKERS", DEFAULT_HASH_WORKERS)),
+                             timestamp=lambda: server_timestamp(get_db()), tracer=get_tracer())
+
+@st.fragment(run_every=AUTH_POLL_SECONDS)
+def auth_request_monitor(key, label):
+    """Client-side uplink animation while the request runs; full rerun once it lands."""
+    future = get_enlistment_service().get(st.session_state.get(key) or "")
+    if future is None or future.done():
+        st.rerun()
+    st.markdown(f'<div class="uplink-progress">📡 {label}...</div>', unsafe_allow_html=True)
+
+def poll_auth_request(key, label):
+    """Result of the request whose id is in ``st.session_state[key]``; None while it runs.
+
+    Raises whatever the request raised (e.g. ``EnlistmentConflict``).
+    """
+    request_id = st.session_state.get(key)
+    if not request_id:
+        return None
+    service = get_enlistment_service()
+    future = service.get(request_id)
+    if future is not None and not future.done():
+        auth_request_monitor(key, label)
+        return None
+    service.release(request_id)
+    st.session_state[key] = None
+    if future is None:
+        raise LookupError("uplink lost (instance restarted); resubmit")
+    return future.result()
+
+# --- SINGLETON AUTHENTICATOR INITIALIZATION ---
+# We check session state to ensure we only create ONE authenticator object,
+# and only rebuild it (from the cached roster) when an operative is enlisted,
+# reset or looked up since it was made. No Firestore reads on a plain rerun.
+if "authenticator" not in st.session_state:
+    build_authenticator()
+elif not st.session_state.get("authentication_status") and \
+        st.session_state.get("authenticator_version") != get_credential_store().version:
+    build_authenticator()
 
 # Reference the persistent object for use in the tabs
 authenticator = st.session_state.authenticator
 
 
 # 1. ENGINE UTILITIES
-def load_mission(file_path):
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        mission_map = {}
-        for poi in root.findall('.//poi'):
-            poi_id = poi.get('id')
-            mission_map[poi_id] = {
-                "coords": [float(poi.find('lat').text), float(poi.find('lon').text)],
-                "image": poi.find('image').text,
-                "name": poi.find('name').text,
-                "intel": poi.find('intel').text
-            }
-        return mission_map
-    except Exception as e:
-        st.error(f"Mission Data Corruption: {e}")
-        return {}
+# Mission packages (missions/<id>/mission.xml + images); UGE_MISSION_DIRS takes several roots
+MISSION_DIRS = os.environ.get("UGE_MISSION_DIRS", "missions").split(os.pathsep)
+DEFAULT_MISSION = os.environ.get("UGE_DEFAULT_MISSION", "panama")
 
-# 2. GLOBAL INITIALIZATION
-MISSION_DATA = load_mission('mission_data.xml')
+def _compile_mission(file_path):
+    with REPORT.phase("mission_compile"), get_tracer().span("mission.compile", path=file_path) as span:
+        mission = compile_mission(file_path)
+        span.set(pois=len(mission.pois), objectives=len(mission.objectives))
+        return mission
 
-# Parse objectives immediately for the Sidebar UI
-def get_initial_objectives(file_path):
-    tree = ET.parse(file_path)
-    return {t.get('id'): (t.get('status').lower() == 'true') for t in tree.findall('.//task')}
+@st.cache_resource
+def get_mission_catalog():
+    # Compiled missions are shared by every session; the catalog keys them on the
+    # file stamp (edits hot-reload) and keeps at most UGE_MISSION_CACHE of them
+    return MissionCatalog(MISSION_DIRS, compile=_compile_mission,
+                          max_compiled=int(os.environ.get("UGE_MISSION_CACHE", DEFAULT_MAX_COMPILED)))
+
+def get_mission(mission_id):
+    """Compiled, shared mission model. One stat per rerun, zero parsing."""
+    return get_mission_catalog().get(mission_id)
+
+def current_mission_id():
+    """Session's theater: its own pick, then ?mission=, then UGE_DEFAULT_MISSION."""
+    mission_id = st.session_state.get("mission_id") or st.query_params.get("mission", DEFAULT_MISSION)
+    if mission_id not in get_mission_catalog():
+        mission_id = DEFAULT_MISSION
+    st.session_state.mission_id = mission_id
+    return mission_id
+
+def switch_mission(mission_id):
+    """Moves the operative to another theater; each keeps its own saved state."""
+    if st.session_state.get("mission_started"):
+        save_mission_state(st.session_state.get("username"), MISSION_ID)
+    for key in list(st.session_state.keys()):
+        if key not in ["authenticator", "authentication_status", "logout", "username", "name", "active_user"]:
+            del st.session_state[key]
+    st.session_state.mission_id = mission_id
+    st.query_params["mission"] = mission_id
+    st.rerun()
 
+# 2. GLOBAL INITIALIZATION
+try:
+    MISSION = get_mission(current_mission_id())
+except (MissionCompileError, OSError) as e:
+    st.error(f"Mission Data Corruption: {e}")
+    st.stop()
+MISSION_ID = MISSION.catalog_id
+MISSION_DATA = MISSION.pois
+
+# Seed objectives for the Sidebar UI from the compiled model
 if "objectives" not in st.session_state:
-    st.session_state.objectives = get_initial_objectives('mission_data.xml')
+    st.session_state.objectives = MISSION.initial_objectives()
+
+def get_objective_tracker():
+    """Session's done/open/locked frontier, rebuilt only on resume or mission change."""
+    tracker = st.session_state.get("objective_tracker")
+    if tracker is None or tracker.fingerprint != MISSION.fingerprint:
+        tracker = ObjectiveTracker.from_checklist(MISSION, st.session_state.objectives,
+                                                  st.session_state.get("objective_times"))
+        st.session_state.objective_tracker = tracker
+    return tracker
 
 if "mission_started" not in st.session_state:
     st.session_state.mission_started = False    
@@ -131,7 +260,9 @@ if "viability" not in st.session_state:
         "viability": 100,
         "mission_time": 60,
         "messages": [],
-        "chat_session": None,
+        "mission_context": None,
+        "pending_turn": None,   # {"job_id", ...} while a squad turn runs on the worker pool
+        "queued_orders": [],    # Orders given while that turn was still in flight
         "efficiency_score": 1000,
         "locations": {"SAM": "Insertion Point", "DAVE": "Insertion Point", "MIKE": "Insertion Point"},
         "idle_turns": {"SAM": 0, "DAVE": 0, "MIKE": 0},
@@ -145,13 +276,13 @@ BUCKET_NAME = "uge-repository-cu32"
 
 @st.cache_resource
 def get_gcs_client():
-    from google.cloud import storage
+    storage = REPORT.lazy_import("google.cloud.storage")
     
     # Use the 'credentials_info' we already initialized at the top
     # to avoid triggering the st.secrets parser again
     try:
         # We reuse the same credentials_info dictionary for the bucket
-        credentials = service_account.Credentials.from_service_account_info(credentials_info)
+        credentials = get_service_account_credentials()
         return storage.Client(
             credentials=credentials, 
             project=credentials_info["project_id"]
@@ -163,36 +294,68 @@ def get_gcs_client():
 def get_image_url(filename):
     if not filename: return ""
     # Direct public uplink path - bypasses IAM SignBlob entirely
-    return f"https://storage.googleapis.com/{BUCKET_NAME}/cinematics/{filename}"
+    return f"https://storage.googleapis.com/{BUCKET_NAME}/{MISSION.asset_prefix}/{filename}"
 
-def parse_operative_dialogue(text):
-    """Splits raw AI response and cleans up Markdown/Quotes."""
-    pattern = r"(SAM|DAVE|MIKE):\s*(.*?)(?=\s*(?:SAM|DAVE|MIKE):|$)"
-    segments = re.findall(pattern, text, re.DOTALL)
-    
-    cleaned_dict = {}
-    for name, msg in segments:
-        # 1. Strip whitespace
-        m = msg.strip()
-        # 2. Remove double asterisks (bolding)
-        m = m.replace("**", "")
-        # 3. Remove outer speech marks if the AI wrapped the whole line in them
-        m = m.strip('"').strip("'")
-        
-        cleaned_dict[name] = m
-        
-    return cleaned_dict
+# --- ASSET PIPELINE ---
+# Sized WebP derivatives held in one process-wide byte cache (UGE_ASSET_CACHE_MB)
+@st.cache_resource
+def get_asset_pipeline():
+    max_bytes = int(float(os.environ.get("UGE_ASSET_CACHE_MB", DEFAULT_ASSET_CACHE_BYTES / 2**20)) * 2**20)
+    # Offline runs stay off the network: package images only, everything else keeps its URL
+    return AssetPipeline(max_bytes=max_bytes, tracer=get_tracer(),
+                         fetch=lambda source: fetch_bytes(source, allow_remote=not OFFLINE))
+
+@st.cache_resource
+def get_package_images(mission_id, fingerprint):
+    """Images shipped in the mission package, by filename."""
+    return get_mission_catalog().entry(mission_id).images()
+
+def recon_source(filename):
+    # Prefer the copy in the package; otherwise the original in the bucket
+    return get_package_images(MISSION_ID, MISSION.fingerprint).get(filename) or get_image_url(filename)
+
+def recon_image(filename, size="popup"):
+    """Static URL of a POI image's derivative; the original URL until it has been built."""
+    if not filename:
+        return ""
+    path = get_asset_pipeline().served(recon_source(filename), size,
+                                       derived_path(os.path.join(DERIVED_DIR, MISSION_ID), size, filename))
+    return static_url(path) if path else get_image_url(filename)
+
+def recon_thumb_url(filename):
+    return recon_image(filename, "thumb")
+
+def prefetch_recon(poi_id):
+    """Warms a POI's recon derivatives as soon as a unit is ordered toward it."""
+    if poi_id is None or poi_id in st.session_state.get("discovered_locations", []):
+        return
+    filename = MISSION_DATA[poi_id].image
+    if filename:
+        root = os.path.join(DERIVED_DIR, MISSION_ID)
+        get_asset_pipeline().prefetch(recon_source(filename), disk_paths={
+            size: derived_path(root, size, filename) for size in ("popup", "thumb")})
+
+def local_image(path, size):
+    """Cached derivative of an image shipped with the app (squad portraits, avatars)."""
+    try:
+        return get_asset_pipeline().derivative(path, size)
+    except Exception:
+        return path
+
+def token_icons():
+    # Shared by every mission; the remote originals serve until the derivatives land
+    root = os.path.join(DERIVED_DIR, "squad")
+    icons = {}
+    for unit, url in TOKEN_ICONS.items():
+        path = get_asset_pipeline().served(url, "token", derived_path(root, "token", url))
+        icons[unit] = static_url(path) if path else url
+    return icons
 
 # --- AI ENGINE LOGIC (Architect / C2 Style) ---
-def get_dm_response(prompt):
-    # --- CONFIG & XML LOAD ---
-    safety_settings = [
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}
-    ]
+def get_gemini_api_key():
     # --- STEALTH API KEY RETRIEVAL ---
+    if OFFLINE:
+        return "offline"
     api_key = os.environ.get("GEMINI_API_KEY")
 
     if not api_key:
@@ -206,133 +369,292 @@ def get_dm_response(prompt):
     if not api_key:
         st.error("CRITICAL: GEMINI_API_KEY not found in Env Vars or Secrets.")
         st.stop()
+    return api_key
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.0-flash', 
-                                  generation_config={"temperature": 0.3},
-                                  safety_settings=safety_settings)
+@st.cache_resource
+def get_prefix_cache():
+    # gemini: shared server-side cached context | local: in-process stand-in (inline prefix)
+    backend = os.environ.get("UGE_PREFIX_CACHE", "gemini").lower()
+    if backend == "gemini":
+        return GeminiPrefixCache(
+            model_name=os.environ.get("UGE_CACHE_MODEL", DEFAULT_CACHE_MODEL),
+            ttl_seconds=int(os.environ.get("UGE_CACHE_TTL", DEFAULT_CACHE_TTL_SECONDS)),
+        )
+    return LocalPrefixCache()
 
-    mission_tree = ET.parse("mission_data.xml")
-    mission_root = mission_tree.getroot()
-    intent = mission_root.find("intent")
-    
-    # --- SYTEM INSTRUCTION (Revised for Suffix Tagging) ---
-    if st.session_state.chat_session is None:
-        location_logic = ""
-        for poi in mission_root.findall(".//poi"):
-            location_logic += f"- {poi.find('name').text} (Aliases: {poi.find('aliases').text if poi.find('aliases') is not None else ''})\n"
-
-        # Extract win condition data from XML
-        win_node = intent.find("win_condition")
-        win_item = win_node.find("target_item").text
-        win_loc = win_node.find("target_location").text
-        win_trigger = win_node.find("trigger_text").text
-
-        sys_instr = f"""
-        THEATER: {intent.find("theater").text}
-        SITUATION: {intent.find("situation").text}
-        CONSTRAINTS: {intent.find("constraints").text}
-        CANONICAL LOCATIONS:
-        {location_logic}
-        
-        YOU ARE: The tactical multiplexer for Gundogs PMC.
-
-        OPERATIONAL PROTOCOLS:
-        1. BANTER: Operatives should speak like a tight-knit PMC unit. Use dark humor, cynical observations about the "Agency," and coffee-related complaints.
-        2. SUPPORT REQUESTS: If a task is outside an operative's specialty, they must NOT succeed alone. They should describe the obstacle and explicitly ask for the specific teammate (e.g., "Mike, I've got a digital lock here, and kicking it isn't working. Get over here.").
-        3. COORDINATION: Encourage "Combined Arms" solutions. Dave provides security while Mike hacks; Sam distracts the guards while Dave sneaks past.
-        4. INITIATIVE & AUTONOMY: Operatives will not move to a new POI unless explicitly cleared by the Commander. Whilst the team can make suggestions, the game must be directed by the commander, so that it doesn't become too easy. The role of the team is "able executors" as opposed to "proactive operators."
-
-        STRICT OPERATIONAL RULES:
-        1. LOCATIONAL ADHERENCE: You only recognize canonical locations.
-        2. DATA SUFFIX: Every response MUST end with a data block:
-           [LOC_DATA: SAM=Canonical Name, DAVE=Canonical Name, MIKE=Canonical Name]
-           [OBJ_DATA: obj_id=TRUE/FALSE]
-        3. VOICE TONE: SAM (Professional, arch), DAVE (Laidback, laconic,) MIKE (Geek).
-
-        VICTORY CONDITIONS:
-        - TARGET ITEM: {win_item}
-        - TARGET LOCATION: {win_loc}
-        - CRITICAL: When the squad confirms the {win_item} has reached the {win_loc}, you MUST output this exact phrase in your dialogue: "{win_trigger}"
-        - NOTE: You have the authority to trigger this whenever the handover is demmed to be complete, regardless of previous task status.
-
-        CRITICAL: You are the authoritative mission ledger. As soon as an operative reports completing a task (e.g., Mike finding the container number), you MUST append [OBJ_DATA: obj_id=TRUE] to the very end of your response. Do not wait for the Commander to acknowledge it.
-
-        COMMUNICATION ARCHITECTURE:
-        1. MULTI-UNIT REPORTING: Every response MUST include a SITREP from all three operatives (SAM, DAVE, MIKE). 
-        2. FORMAT: Use bold headers for each unit. 
-        Example:
-        SAM: "Dialogue here..."
-        DAVE: "Dialogue here..."
-        MIKE: "Dialogue here..."
-        3. PERSISTENCE: Even if an operative is idle, they should comment on their surroundings, complain about the local conditions, or respond to their teammates' banter.
-        """
-        st.session_state.chat_session = model.start_chat(history=[])
-        st.session_state.chat_session.send_message(sys_instr)
+@st.cache_resource
+def get_llm_gateway(api_key):
+    """One configured Gemini client per process, shared by every session thread."""
+    return LLMGateway(api_key=api_key, prefix_cache=get_prefix_cache())
 
-    # --- ENRICHED PROMPT ---
-    obj_status = ", ".join([f"{k}:{'DONE' if v else 'TODO'}" for k, v in st.session_state.objectives.items()])
-    unit_locs = ", ".join([f"{u}@{loc}" for u, loc in st.session_state.locations.items()])
-    
-    enriched_prompt = f"""
-    [SYSTEM_STATE] Time:{st.session_state.mission_time}m | Viability:{st.session_state.viability}% | Locations:{unit_locs} | Objectives:{obj_status}
-    [PROTOCOL_REMINDER] Squad is currently in 'Able Executor' mode. Do not change locations without authorization.
-    [COMMANDER_ORDERS] {prompt}
+@st.cache_resource
+def get_scripted_gateway(mission_id, fingerprint):
+    # Scripted SITREPs; UGE_OFFLINE_LATENCY adds simulated model time per turn
+    from uge.fakes import ScriptedSquadGateway
+    return ScriptedSquadGateway(get_mission(mission_id),
+                                latency=float(os.environ.get("UGE_OFFLINE_LATENCY", 0)))
 
-    [MANDATORY_RESPONSE_GUIDE] 
-    1. Direct Dialogue: Provide SITREPs for SAM, DAVE, and MIKE. 
-    2. Data Suffix: You MUST end with exactly:
-       [LOC_DATA: SAM=Loc, DAVE=Loc, MIKE=Loc]
-       [OBJ_DATA: obj_id=TRUE] (Only if a task was just finished!)
-    """
-    
-    response_text = st.session_state.chat_session.send_message(enriched_prompt).text
+def get_squad_gateway():
+    if OFFLINE:
+        return get_scripted_gateway(MISSION_ID, MISSION.fingerprint)
+    return get_llm_gateway(get_gemini_api_key())
 
-    # --- SILENT DATA PARSING ---
-    
-    # A. Location Parsing (Suffix Tag)
-    loc_match = re.search(r"\[LOC_DATA: (SAM=[^,]+, DAVE=[^,]+, MIKE=[^\]]+)\]", response_text)
-    if loc_match:
-        for pair in loc_match.group(1).split(", "):
-            unit, loc = pair.split("=")
-            st.session_state.locations[unit] = loc.strip()
+# tagged: dialogue + [LOC_DATA]/[OBJ_DATA] suffix (streams) | structured: Gemini JSON mode (one-pass parse)
+STRUCTURED_RESPONSES = os.environ.get("UGE_RESPONSE_MODE", "tagged").lower() == "structured"
 
-    # A1. DISCOVERY LOGIC
+@st.cache_resource
+def get_prefix_for(mission_id, fingerprint, structured):
+    # Identical for every player of the mission, so it's registered once and referenced by all
+    mission = get_mission(mission_id)
+    prefix = PromptPrefix.for_mission(
+        mission_id, mission.structured_instruction if structured else mission.system_instruction)
+    get_prefix_cache().check(prefix)
+    return prefix
+
+def get_mission_prefix():
+    return get_prefix_for(MISSION_ID, MISSION.fingerprint, STRUCTURED_RESPONSES)
+
+# Resolved at load, so a mission too small to cache is reported once at startup, not on first turn
+get_mission_prefix()
+
+# Render SAM/DAVE/MIKE bubbles as tokens arrive (set UGE_STREAM_RESPONSES=0 to wait for the full SITREP)
+STREAM_RESPONSES = os.environ.get("UGE_STREAM_RESPONSES", "1") != "0"
+
+# Conversation window: last N turns verbatim, the rest folded into the mission ledger
+CONTEXT_MAX_TURNS = int(os.environ.get("UGE_CONTEXT_TURNS", DEFAULT_MAX_TURNS))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("UGE_CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+# Ledger lines kept (older ones are counted, not stored), which bounds the saved llm_context
+CONTEXT_MAX_LEDGER = int(os.environ.get("UGE_CONTEXT_LEDGER", DEFAULT_MAX_LEDGER))
+
+def discover_locations():
+    """Fog-of-war: posts a recon report the first time any unit reaches a POI."""
     for unit, loc_name in st.session_state.locations.items():
-        # Find the POI ID for this location name
-        target_poi_id = next((pid for pid, info in MISSION_DATA.items() if info['name'] == loc_name), None)
+        # Find the POI ID for this location name (indexed: name, id or alias)
+        target_poi_id = MISSION.resolver.resolve(loc_name)
         
         if target_poi_id and target_poi_id not in st.session_state.discovered_locations:
             # Mark as discovered
             st.session_state.discovered_locations.append(target_poi_id)
             
-            # Fetch the image and intel
+            # Fetch the intel; the image is drawn from the asset cache at render time
             poi_info = MISSION_DATA[target_poi_id]
-            img_url = get_image_url(poi_info['image'])
             
             # Inject a "Recon Report" into the chat history
             recon_msg = {
                 "role": "assistant", 
-                "content": f"🖼️ **RECON UPLINK: {loc_name.upper()}**\n\n{poi_info['intel']}\n\n![{loc_name}]({img_url})"
+                "content": f"🖼️ **RECON UPLINK: {loc_name.upper()}**\n\n{poi_info.intel}",
+                "recon_image": poi_info.image,
             }
             st.session_state.messages.append(recon_msg)
             st.toast(f"📡 New Intel: {loc_name}")
 
-    # B. Objective Parsing (Suffix Tag)
-    # Ensure the AI knows it must report Objective status too
-    # Add this to your OBJ_DATA parsing in Step 7
-    obj_data_matches = re.findall(r"\[OBJ_DATA: (obj_\w+)=TRUE\]", response_text)
+TAGGED_RESPONSE_GUIDE = """[MANDATORY_RESPONSE_GUIDE] 
+    1. Direct Dialogue: Provide SITREPs for SAM, DAVE, and MIKE. 
+    2. Data Suffix: You MUST end with exactly:
+       [LOC_DATA: SAM=Loc, DAVE=Loc, MIKE=Loc]
+       [OBJ_DATA: obj_id=TRUE] (Only if a task was just finished!)"""
+
+# --- RESPONSE CACHE ---
+# off (default) | memory | firestore (memory LRU plus a tier shared across instances)
+RESPONSE_CACHE_MODE = os.environ.get("UGE_RESPONSE_CACHE", "off").lower()
+# Append every model turn to this JSONL transcript...
+RESPONSE_RECORD_PATH = os.environ.get("UGE_RESPONSE_RECORD")
+# ...and replay one: responses come only from the transcript, the model is never called
+RESPONSE_REPLAY_PATH = os.environ.get("UGE_RESPONSE_REPLAY")
+
+@st.cache_resource
+def get_response_cache():
+    if RESPONSE_REPLAY_PATH:
+        cache = ResponseCache(strict=True)
+        cache.preload((turn["key"], turn["text"]) for turn in load_transcript(RESPONSE_REPLAY_PATH))
+        return cache
+    if RESPONSE_CACHE_MODE == "off":
+        return None
+    return ResponseCache(
+        max_entries=int(os.environ.get("UGE_RESPONSE_CACHE_SIZE", 512)),
+        ttl=int(os.environ.get("UGE_RESPONSE_CACHE_TTL", 3600)),
+        persistent=FirestoreResponseTier(get_db()) if RESPONSE_CACHE_MODE == "firestore" else None,
+    )
+
+@st.cache_resource
+def get_transcript_recorder():
+    return TranscriptRecorder(RESPONSE_RECORD_PATH) if RESPONSE_RECORD_PATH else None
+
+def turn_cache_key(prompt):
+    if get_response_cache() is None and get_transcript_recorder() is None:
+        return None
+    mode = "structured" if STRUCTURED_RESPONSES else "tagged"
+    return response_key(MISSION_ID, MISSION.fingerprint, mode,
+                        state_snapshot(st.session_state), prompt)
+
+def cached_response(request):
+    """Stored SITREP for this exact request, or None. Raises ReplayMiss in strict replay.
+
+    Only asks memory: the Firestore tier is read by the turn's worker (``answer_turn``).
+    """
+    cache = get_response_cache()
+    if cache is None or request["cache_key"] is None:
+        return None
+    with get_tracer().span("turn.cache", turn=turn_number()) as span:
+        key = request["cache_key"]
+        text = cache.get(key) if cache.persistent is None else cache.get_local(key)
+        span.set(hit=text is not None)
+    return text
+
+def remember_response(request, response_text, cached=False):
+    cache = get_response_cache()
+    if cache is not None and request.get("cache_key") and not cached:
+        cache.put(request["cache_key"], response_text, meta={"mission": MISSION_ID})
+    recorder = get_transcript_recorder()
+    if recorder is not None and request.get("cache_key"):
+        recorder.record(request["cache_key"], request["prompt"], response_text,
+                        mission=MISSION_ID, turn=turn_number())
+
+def prepare_turn(prompt):
+    """Builds the model request for ``prompt`` from session state (script thread only)."""
+    with get_tracer().span("turn.prepare", turn=turn_number()) as span:
+        request = _build_request(prompt)
+        span.set(prompt_tokens=MissionContext.count_tokens(request["contents"]),
+                 prompt_bytes=payload_bytes(request["contents"]))
+        return request
+
+def _build_request(prompt):
+    # --- SYTEM INSTRUCTION (Prebuilt by the mission compiler, carried by the cached prefix) ---
+    if st.session_state.mission_context is None:
+        st.session_state.mission_context = MissionContext(
+            None, # The prefix rides on the model, not in the per-turn contents
+            max_turns=CONTEXT_MAX_TURNS,
+            token_budget=CONTEXT_TOKEN_BUDGET,
+            max_ledger=CONTEXT_MAX_LEDGER,
+        )
+    mission_context = st.session_state.mission_context
+
+    # Keyed on the state as the model will see it, before events are consumed or the window folds
+    cache_key = turn_cache_key(prompt)
+
+    # --- ENRICHED PROMPT ---
+    obj_status = get_objective_tracker().prompt_summary() # Cached until an objective changes
+    unit_locs = ", ".join([f"{u}@{loc}" for u, loc in st.session_state.locations.items()])
+    # Orders the fast-path already applied locally; narrate them as part of this SITREP
+    pending_events = st.session_state.get("local_events", [])
+    local_events = f"[LOCAL_EVENTS] {' | '.join(pending_events)}\n" if pending_events else ""
+    st.session_state.local_events = [] # Delivered to the squad with this turn
+    
+    enriched_prompt = f"""
+    [SYSTEM_STATE] Time:{st.session_state.mission_time}m | Viability:{st.session_state.viability}% | Locations:{unit_locs} | Objectives:{obj_status}
+    [PROTOCOL_REMINDER] Squad is currently in 'Able Executor' mode. Do not change locations without authorization.
+    {local_events}    [COMMANDER_ORDERS] {prompt}
+
+    {STRUCTURED_RESPONSE_GUIDE if STRUCTURED_RESPONSES else TAGGED_RESPONSE_GUIDE}
+    """
+    
+    return {
+        "prompt": prompt,
+        "enriched_prompt": enriched_prompt,
+        "events": pending_events,
+        "cache_key": cache_key,
+        # Mission ledger + last few turns, trimmed to the token budget
+        "contents": mission_context.build_contents(enriched_prompt),
+    }
+
+# --- ADMISSION CONTROL ---
+# Process-wide quota shaping in front of Gemini (set to the project's actual limits)
+GEMINI_RPM = int(os.environ.get("UGE_GEMINI_RPM", DEFAULT_RPM))
+GEMINI_TPM = int(os.environ.get("UGE_GEMINI_TPM", DEFAULT_TPM))
+# Budgeted per request for the SITREP coming back
+RESPONSE_TOKEN_ALLOWANCE = 800
+
+@st.cache_resource
+def get_admission_controller():
+    return AdmissionController(rpm=GEMINI_RPM, tpm=GEMINI_TPM)
+
+def answer_turn(job, cache, cache_key, *args, tracer=None, turn=None, **kwargs):
+    """The shared response tier, then the model on a miss. Runs on a worker thread."""
+    if cache is not None and cache.persistent is not None and cache_key is not None:
+        if tracer is None:
+            text = cache.get(cache_key)
+        else:
+            with tracer.span("turn.cache", turn=turn, tier="persistent") as span:
+                text = cache.get(cache_key)
+                span.set(hit=text is not None)
+        if text is not None:
+            job.cached = True
+            return text
+    return call_squad_model(job, *args, tracer=tracer, turn=turn, **kwargs)
+
+def call_squad_model(job, gateway, contents, prefix, structured, stream, admission=None, user=None,
+                     tracer=None, turn=None):
+    """One model call. Runs on a worker thread: no session state in here."""
+    if tracer is None:
+        return _call_squad_model(job, gateway, contents, prefix, structured, stream, admission, user)
+    with tracer.span("turn.model", turn=turn, user=user, structured=structured,
+                     prompt_tokens=MissionContext.count_tokens(contents)) as span:
+        text = _call_squad_model(job, gateway, contents, prefix, structured, stream, admission, user)
+        ticket = getattr(job, "ticket", None)
+        span.set(response_tokens=estimate_tokens(text), response_bytes=payload_bytes(text),
+                 retries=ticket.attempt if ticket is not None else 0)
+        return text
+
+def _call_squad_model(job, gateway, contents, prefix, structured, stream, admission, user):
+    def attempt():
+        if job is not None:
+            job.restart_stream() # A retry starts the SITREP over
+        if structured:
+            # JSON mode: schema-constrained, so it is parsed in one pass rather than streamed
+            return gateway.complete(contents, prefix=prefix, generation_config=STRUCTURED_GENERATION_CONFIG)
+        # Streamed pieces go to the job so the feed can draw the SITREP as it arrives;
+        # the [LOC_DATA]/[OBJ_DATA] suffix is held back there and parsed from the full text
+        return gateway.complete(contents, prefix=prefix, stream=stream and job is not None,
+                                on_text=job.feed if job is not None else None)
+
+    if admission is None:
+        return attempt()
+    tokens = (MissionContext.count_tokens(contents) + estimate_tokens(prefix.text)
+              + RESPONSE_TOKEN_ALLOWANCE)
+    on_ticket = (lambda ticket: setattr(job, "ticket", ticket)) if job is not None else None
+    return admission.run(user, attempt, tokens=tokens, on_ticket=on_ticket)
+
+def apply_turn(request, response_text):
+    """Folds a finished model response into session state (script thread only)."""
+    with get_tracer().span("turn.apply", turn=turn_number()):
+        return _apply_turn(request, response_text)
+
+def _apply_turn(request, response_text):
+    mission_context = st.session_state.mission_context
+    objective_tracker = get_objective_tracker()
+    tracer = get_tracer()
+
+    # --- SILENT DATA PARSING ---
+    # One pass: JSON when requested, the [LOC_DATA]/[OBJ_DATA] regex path as a fallback
+    with tracer.span("turn.parse", response_bytes=payload_bytes(response_text)) as span:
+        turn = parse_turn(response_text, MISSION.win_condition.trigger_text, structured=STRUCTURED_RESPONSES)
+        span.set(structured=turn.structured, objectives=len(turn.completed_objectives))
     
-    for obj_id in obj_data_matches:
+    # A. Location Parsing
+    # Units moved locally while this turn was in flight keep their new post; the report predates it
+    moved_since = set(request.get("local_moves", ()))
+    for unit, loc in turn.locations.items():
+        if unit.upper() in moved_since:
+            continue
+        # Store the canonical name whenever the report resolves (alias, typo, id...)
+        poi_id = MISSION.resolver.resolve(loc)
+        st.session_state.locations[unit] = MISSION_DATA[poi_id].name if poi_id else loc
+
+    # A1. DISCOVERY LOGIC
+    with tracer.span("turn.discovery"):
+        discover_locations()
+
+    # B. Objective Parsing
+    for obj_id in turn.completed_objectives:
         if obj_id in st.session_state.objectives and not st.session_state.objectives[obj_id]:
             st.session_state.objectives[obj_id] = True
             st.toast(f"🎯 OBJECTIVE REACHED: {obj_id.upper()}")
             st.session_state.efficiency_score += 150 # Bonus for clean execution
+            for unlocked in objective_tracker.complete(obj_id, at=st.session_state.mission_time):
+                st.toast(f"🔓 OBJECTIVE UNLOCKED: {MISSION.objectives[unlocked].label.upper()}")
 
-    # After receiving response_text from Gemini
-    win_trigger = "Mission Complete: Assets in Transit"
-    
-    if win_trigger.lower() in response_text.lower():
+    # C. Win Trigger (schema flag, or the trigger phrase in the dialogue)
+    if turn.mission_complete:
         # Calculate time taken
         start_time = 60
         time_remaining = st.session_state.mission_time
@@ -340,52 +662,422 @@ def get_dm_response(prompt):
         st.session_state.mission_complete = True        
 
     # D. Clean and Parse
-    clean_response = re.sub(r"\[(LOC_DATA|OBJ_DATA):.*?\]", "", response_text).strip()
+    clean_response = turn.clean_text
 
     # Create the split dictionary for the UI and Map Bubbles
-    split_dialogue = parse_operative_dialogue(clean_response)
+    split_dialogue = turn.dialogue
 
     # Store the split dict instead of just the string
     st.session_state.messages.append({
         "role": "assistant", 
         "content": split_dialogue,
-        "raw_text": clean_response # Keep raw text just in case
+        "raw_text": clean_response, # Keep raw text just in case
+        "locations": dict(st.session_state.locations), # Where the squad stood after this SITREP (AAR)
+    })
+
+    # E. Commit the exchange to the context window (older turns fold into the ledger)
+    mission_context.record(request["prompt"], request["enriched_prompt"], response_text, facts={
+        "time": st.session_state.mission_time,
+        "locations": dict(st.session_state.locations),
+        "completed": [k for k, v in st.session_state.objectives.items() if v],
     })
 
+    # F. Debrief starts writing the moment the win fires, with the final positions in the feed
+    if turn.mission_complete and not st.session_state.get("aar_job"):
+        start_aar()
+
     return clean_response
 
+# --- ASYNC TURN PIPELINE ---
+# Model turns run on a shared worker pool; the session only keeps the job id and polls it
+TURN_POLL_SECONDS = float(os.environ.get("UGE_TURN_POLL", 0.5))
+
+@st.cache_resource
+def get_turn_dispatcher():
+    return TurnDispatcher(max_workers=int(os.environ.get("UGE_TURN_WORKERS", DEFAULT_TURN_WORKERS)))
+
+def dispatch_turn(prompt):
+    request = prepare_turn(prompt)
+    try:
+        cached = cached_response(request)
+    except ReplayMiss:
+        # Replay diverged from the transcript; stop rather than spend quota
+        st.session_state.local_events = request["events"] + st.session_state.get("local_events", [])
+        st.toast("📼 REPLAY DIVERGED: no recorded response for this order.")
+        return
+    if cached is not None:
+        # Hot path: identical request already answered, no worker or quota needed
+        apply_turn(request, cached)
+        return
+    job = get_turn_dispatcher().submit(
+        st.session_state.get("username"),
+        answer_turn,
+        get_response_cache(),
+        request["cache_key"],
+        get_squad_gateway(),
+        request.pop("contents"),
+        get_mission_prefix(),
+        STRUCTURED_RESPONSES,
+        STREAM_RESPONSES,
+        admission=get_admission_controller(),
+        user=st.session_state.get("username"),
+        tracer=get_tracer(),
+        turn=turn_number(),
+    )
+    st.session_state.pending_turn = {"job_id": job.id, **request}
+
+def queue_model_turn(prompt):
+    """Sends ``prompt`` to the squad, or queues it behind the turn already in flight."""
+    prefetch_recon(MISSION.resolver.resolve(prompt))
+    if st.session_state.get("pending_turn"):
+        st.session_state.setdefault("queued_orders", []).append(prompt)
+    else:
+        dispatch_turn(prompt)
+
+def collect_turn():
+    """Applies the in-flight turn once it has landed. Safe to call on every rerun."""
+    pending = st.session_state.get("pending_turn")
+    if pending:
+        dispatcher = get_turn_dispatcher()
+        job = dispatcher.get(pending["job_id"])
+        if job is not None and not job.done():
+            return False
+        _finish_turn(dispatcher, job, pending)
+
+    # Orders given while the squad was talking (or restored with the session) go out next, in order
+    queued = st.session_state.get("queued_orders")
+    if queued and not st.session_state.get("mission_complete"):
+        dispatch_turn(queued.pop(0))
+        return True
+    return bool(pending)
+
+def _finish_turn(dispatcher, job, pending):
+    # Claim it before applying so the result can never be folded in twice
+    st.session_state.pending_turn = None
+    if job is None:
+        # Worker pool was recycled underneath us (instance restart): send the order again
+        st.session_state.local_events = pending["events"] + st.session_state.get("local_events", [])
+        st.session_state.setdefault("queued_orders", []).insert(0, pending["prompt"])
+        st.toast("📡 Uplink dropped mid-transmission. Resending last order.")
+    else:
+        try:
+            response_text = job.result()
+        except Exception as e:
+            # Nothing was applied; hand the local events back for the next turn
+            st.session_state.local_events = pending["events"] + st.session_state.get("local_events", [])
+            if isinstance(e, AdmissionTimeout):
+                st.toast("📡 UPLINK SATURATED. Squad standing by; re-issue your order.")
+            else:
+                st.toast(f"📡 COMMS FAILURE: {e}")
+        else:
+            remember_response(pending, response_text, cached=job.cached)
+            apply_turn(pending, response_text)
+        dispatcher.release(job.id)
+
+# --- AFTER-ACTION REVIEW ---
+# Written on the turn worker pool from a compact transcript (see ``uge.aar``), not through the squad chat
+def run_aar(job, gateway, transcript, store, username, mission_id, admission=None, tracer=None):
+    """Writes and files the debrief. Runs on a worker thread: no session state in here."""
+    report = AAREngine(gateway, admission=admission, user=username, tracer=tracer).run(transcript)
+    # Filed from the worker so the record exists even if the tab closed before it landed
+    store.save(username, mission_id, fields={"aar_report": report})
+    return report
+
+def start_aar():
+    """Queues the Commandant's evaluation for the finished mission (script thread only)."""
+    username = st.session_state.get("username")
+    transcript = extract_transcript(
+        st.session_state.get("messages", []), MISSION, get_objective_tracker().completed_at,
+        outcome={"time_elapsed_min": st.session_state.get("time_elapsed", 0),
+                 "viability_pct": st.session_state.viability,
+                 "efficiency": st.session_state.efficiency_score})
+    job = get_turn_dispatcher().submit(username, run_aar, get_squad_gateway(), transcript,
+                                       get_state_writer(), username, MISSION_ID,
+                                       admission=get_admission_controller(), tracer=get_tracer())
+    st.session_state.aar_job = job.id
+    st.session_state.aar_report = None # Never show a previous run's debrief for this one
+    st.session_state.aar_error = None
+
+@st.fragment(run_every=TURN_POLL_SECONDS)
+def aar_monitor():
+    """Polls the debrief without rerunning the stats beside it."""
+    job = get_turn_dispatcher().get(st.session_state.get("aar_job") or "")
+    if job is None or job.done():
+        st.rerun()
+    st.markdown(f'<div class="uplink-progress">📜 COMMANDANT\'S EVALUATION INCOMING... '
+                f'{job.elapsed():.0f}s</div>', unsafe_allow_html=True)
+
+def collect_aar():
+    """The debrief once it has landed; None while it is being written (or after a failure)."""
+    if st.session_state.get("aar_report"):
+        return st.session_state.aar_report
+    dispatcher = get_turn_dispatcher()
+    job_id = st.session_state.get("aar_job")
+    job = dispatcher.get(job_id) if job_id else None
+    if job is None:
+        # Restored session, or the worker pool was recycled: write it here
+        if not st.session_state.get("aar_error"):
+            start_aar()
+        return None
+    if not job.done():
+        return None
+    st.session_state.aar_job = None
+    dispatcher.release(job.id)
+    try:
+        st.session_state.aar_report = job.result()
+    except Exception as e:
+        st.session_state.aar_error = str(e)
+        return None
+    st.toast("AAR permanent record created.")
+    return st.session_state.aar_report
+
+# --- LOCAL FAST-PATH ---
+# Deterministic orders (moves, status, checklist) are applied without a model call
+LOCAL_COMMANDS = os.environ.get("UGE_LOCAL_COMMANDS", "1") != "0"
+
+def run_local_order(order):
+    """Applies a parsed order to state instantly and posts the squad's reply."""
+    if isinstance(order, MoveOrder):
+        prefetch_recon(order.poi_id)
+        for unit in order.units:
+            st.session_state.locations[unit] = MISSION_DATA[order.poi_id].name
+        pending = st.session_state.get("pending_turn")
+        if pending:
+            # The in-flight SITREP was prepared before this move; don't let it undo it
+            pending.setdefault("local_moves", []).extend(order.units)
+        content = acknowledge_move(order, MISSION)
+        st.session_state.setdefault("local_events", []).append(
+            move_event(order, MISSION, st.session_state.mission_time))
+    elif isinstance(order, StatusQuery):
+        content = status_report(st.session_state.locations)
+    else:
+        content = {"AGENCY HQ": checklist_report(get_objective_tracker())}
+    reply = {"role": "assistant", "content": content, "local": True}
+    if isinstance(order, MoveOrder):
+        reply["locations"] = dict(st.session_state.locations)
+    st.session_state.messages.append(reply)
+    if isinstance(order, MoveOrder):
+        discover_locations()
+
+def operative_avatar(operative):
+    # Map to your local images
+    if operative == "AGENCY HQ":
+        return "agency_icon.png"
+    return f"{operative.lower()}_icon.png"
+
+# --- COMMS FEED ---
+# Only the most recent messages are drawn on every rerun; older traffic sits in a paged archive
+FEED_WINDOW = int(os.environ.get("UGE_FEED_WINDOW", 30))
+FEED_ARCHIVE_PAGE = 20
+
+def message_blocks(msg):
+    """Render plan for one message: [(chat role, avatar, header, body, recon image), ...]."""
+    if msg["role"] == "user":
+        return [("user", None, None, msg["content"], None)]
+    # It's the Assistant (The Squad)
+    dialogue_dict = msg["content"]
+    # If it's the dictionary format, render separate bubbles
+    if isinstance(dialogue_dict, dict):
+        return [(operative.lower(), operative_avatar(operative), f"**{operative}**", text, None)
+                for operative, text in dialogue_dict.items()]
+    # Fallback for old string messages or Recon reports
+    return [("assistant", None, None, dialogue_dict, msg.get("recon_image"))]
+
+def feed_blocks(messages):
+    """Render plans for ``messages``, only building the ones added since last rerun."""
+    cache = st.session_state.setdefault("feed_block_cache", [])
+    # The feed is append-only; if it was swapped out (resume, reset) start over
+    if len(cache) > len(messages) or (cache and cache[-1][0] is not messages[len(cache) - 1]):
+        cache.clear()
+    for msg in messages[len(cache):]:
+        cache.append((msg, message_blocks(msg)))
+    return [blocks for _, blocks in cache]
+
+def render_blocks(blocks):
+    for role, avatar, header, body, image in blocks:
+        with st.chat_message(role, avatar=local_image(avatar, "avatar") if avatar else None):
+            if header:
+                st.markdown(header)
+            st.write(body)
+            if image:
+                st.image(recon_image(image), use_container_width=True)
+
+def render_feed(messages):
+    plans = feed_blocks(messages)
+    archived = len(plans) - FEED_WINDOW
+    if archived > 0:
+        # Archive stays collapsed (and unrendered) unless the commander asks for it
+        if st.toggle(f"📁 ARCHIVED COMMS ({archived} messages)", key="feed_show_archive"):
+            pages = -(-archived // FEED_ARCHIVE_PAGE)
+            page = st.number_input("Archive page (1 = oldest)", min_value=1, max_value=pages,
+                                   value=pages, key="feed_archive_page")
+            start = (page - 1) * FEED_ARCHIVE_PAGE
+            for blocks in plans[start:min(start + FEED_ARCHIVE_PAGE, archived)]:
+                render_blocks(blocks)
+            st.divider()
+    for blocks in plans[max(0, archived):]:
+        render_blocks(blocks)
+
+def render_live_segments(segments):
+    """Draws the SITREP that is still streaming in."""
+    for operative, text in segments:
+        with st.chat_message(operative.lower(), avatar=local_image(operative_avatar(operative), "avatar")):
+            st.markdown(f"**{operative}**")
+            st.write(text)
+
+@st.fragment(run_every=TURN_POLL_SECONDS)
+def turn_monitor():
+    """Polls the in-flight turn without rerunning the rest of the page."""
+    pending = st.session_state.get("pending_turn")
+    job = get_turn_dispatcher().get(pending["job_id"]) if pending else None
+    if job is None or job.done():
+        # Landed: apply it on a full rerun so feed, map and sidebar all update together
+        st.rerun()
+    render_live_segments(job.segments())
+    queued = len(st.session_state.get("queued_orders", []))
+    note = f" | {queued} ORDER(S) QUEUED" if queued else ""
+    waiting = get_admission_controller().status(job.ticket)
+    if job.status == JOB_QUEUED:
+        st.caption(f"📡 AWAITING UPLINK SLOT... {job.elapsed():.0f}s{note}")
+    elif waiting is not None:
+        position, eta = waiting
+        retry = f" | RETRY {job.ticket.attempt}" if job.ticket.attempt else ""
+        st.caption(f"📡 UPLINK QUEUE: POSITION {position + 1} | ETA ~{eta:.0f}s{retry}{note}")
+    else:
+        st.caption(f"📡 SQUAD TRANSMITTING... {job.elapsed():.0f}s{note}")
+
+# Where mission state lives between reruns and instances: "firestore" (default) or "memory"
+SESSION_STORE = os.environ.get("UGE_SESSION_STORE", FIRESTORE)
+
+@st.cache_resource
+def get_state_writer():
+    """Shared session backend; the Firestore one writes behind, off the UI thread."""
+    return open_session_store(SESSION_STORE, get_db() if SESSION_STORE == FIRESTORE else None,
+                              tracer=get_tracer())
+
 def save_mission_state(username, mission_id):
     """Syncs the live tactical theater to the Gundogs cloud."""
-    doc_ref = db.collection("mission_states").document(f"{username}_{mission_id}")
-    
-    # We pull directly from the keys used by your map and metrics
-    save_data = {
-        "username": username,
-        "mission_id": mission_id,
-        "chat_history": st.session_state.get("messages", []),
-        "unit_data": st.session_state.get("locations", {}),    # Fix: Use 'locations'
-        "objectives": st.session_state.get("objectives", {}),
-        "mission_time": st.session_state.get("mission_time", 60), # Capture the clock
-        "last_saved": firestore.SERVER_TIMESTAMP
-    }
-    
-    doc_ref.set(save_data, merge=True)
+    messages = st.session_state.get("messages", [])
+    persisted = st.session_state.get("persisted_message_count", 0)
+    if persisted > len(messages):
+        persisted = 0 # Feed was reset underneath us; rewrite from the top
+
+    # Everything needed to pick the mission up on any instance (LLM context included)
+    fields = snapshot_session(st.session_state)
+    new_messages = messages[persisted:]
+
+    # Only ship what changed: plain reruns (radio clicks etc.) cost zero writes
+    if not new_messages and fields == st.session_state.get("persisted_fields"):
+        return
+    with get_tracer().span("state.save", turn=turn_number(), messages=len(new_messages),
+                           payload_bytes=payload_bytes(fields) + payload_bytes(new_messages)):
+        get_state_writer().save(username, mission_id, fields=fields,
+                                messages=new_messages, start_seq=persisted)
+    st.session_state.persisted_message_count = len(messages)
+    st.session_state.persisted_fields = fields
     # Removing the toast here prevents UI flickering during rapid commands
 
 def load_mission_state(username, mission_id):
-    doc_ref = db.collection("mission_states").document(f"{username}_{mission_id}")
-    doc = doc_ref.get()
+    with get_tracer().span("state.load") as span:
+        data = get_state_writer().load(username, mission_id)
+        span.set(found=data is not None,
+                 messages=len(data.get("messages", [])) if data else 0,
+                 payload_bytes=payload_bytes(data) if data else 0)
     
-    if doc.exists:
-        data = doc.to_dict()
-        # Restore the Theater State
-        st.session_state.messages = data.get("chat_history", [])
-        st.session_state.locations = data.get("unit_data", {}) # Push back to 'locations'
-        st.session_state.objectives = data.get("objectives", {})
-        st.session_state.mission_time = data.get("mission_time", 60)
+    if data is not None:
+        # Restore the Theater State (feed, map, checklist, clock and the squad's memory)
+        st.session_state.update(restore_session(data))
+        # Everything loaded is already in the cloud
+        st.session_state.persisted_message_count = len(st.session_state.messages)
+        st.session_state.persisted_fields = snapshot_session(st.session_state)
         return True
     return False
 
+# --- ADMIN TELEMETRY ---
+# Operatives with role "Admin" (or listed in UGE_ADMINS) get the telemetry panel
+ADMIN_ROLE = "admin"
+ADMIN_USERS = {u.strip() for u in os.environ.get("UGE_ADMINS", "").split(",") if u.strip()}
+
+def is_admin(username):
+    if username in ADMIN_USERS:
+        return True
+    entry = get_credential_store().get(username)
+    return bool(entry) and str(entry.get("role") or "").lower() == ADMIN_ROLE
+
+def render_debug_panel():
+    """Rolling p50/p95 per span plus the process's cold-start report."""
+    with st.expander("🛰️ TELEMETRY (ADMIN)"):
+        rows = [{"span": name, **stats} for name, stats in get_tracer().summary().items()]
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("No spans recorded yet.")
+        admission = get_admission_controller()
+        st.caption(f"Turns in flight: {get_turn_dispatcher().in_flight()} | "
+                   f"Uplink queue: {admission.waiting()} | Breaker: {admission.breaker_state()}")
+        if TILE_MODE == "proxy" and get_tile_server() is not None:
+            st.caption(f"Tiles: {get_tile_server().proxy.stats()}")
+        assets = get_asset_pipeline().stats()
+        st.caption(f"Asset cache: {assets['entries']} items, {assets['bytes'] / 2**20:.1f} MB | "
+                   f"hits {assets['hits']} / misses {assets['misses']}")
+        startup = REPORT.as_dict()
+        st.caption(f"Release {startup['release']} | first render {startup['first_render_ms']} ms | "
+                   f"{startup['totals_ms']}")
+
+# --- MAP TILES ---
+# direct: Esri straight from the browser (default)
+# static: bundles exported by `python -m uge.tiles export`, served with server.enableStaticServing
+#         (the deployment path: Cloud Run exposes one port)
+# proxy:  local development only; the UGE tile server on UGE_TILE_HOST:UGE_TILE_PORT (loopback by default)
+TILE_MODE = os.environ.get("UGE_TILES", "direct").lower()
+TILE_HOST = os.environ.get("UGE_TILE_HOST", DEFAULT_TILE_HOST)
+TILE_PORT = int(os.environ.get("UGE_TILE_PORT", DEFAULT_TILE_PORT))
+# Where the browser reaches the tiles (proxy: the server's public address; static: the export's URL path)
+TILE_URL = os.environ.get("UGE_TILE_URL",
+                          f"http://localhost:{TILE_PORT}" if TILE_MODE == "proxy" else "/app/static/tiles")
+
+@st.cache_resource
+def get_tile_server():
+    """Process-wide tile proxy: mission bundles, then the disk LRU, then Esri (never when offline)."""
+    bundles = []
+    for entry in get_mission_catalog().entries():
+        path = os.path.join(entry.package_dir, BUNDLE_FILE)
+        if os.path.isfile(path):
+            bundles.append(MBTilesBundle(path))
+    cache = TileCache(os.environ.get("UGE_TILE_CACHE_DIR", ".tile_cache"),
+                      max_bytes=int(os.environ.get("UGE_TILE_CACHE_BYTES", DEFAULT_TILE_CACHE_BYTES)))
+    proxy = TileProxy(cache, bundles, fetch=None if OFFLINE else http_fetcher())
+    try:
+        return TileServer(proxy, host=TILE_HOST, port=TILE_PORT)
+    except OSError as e:
+        st.warning(f"📡 Tile proxy unavailable ({e}); using direct satellite uplink.")
+        return None
+
+def map_tile_options():
+    """``build_base_map`` keyword arguments for the configured tile source."""
+    if TILE_MODE == "proxy" and get_tile_server() is not None:
+        return {"tiles": f"{TILE_URL}/tiles/{{z}}/{{x}}/{{y}}"}
+    if TILE_MODE == "static":
+        # Only what was exported exists, so keep the view inside it
+        return {"tiles": f"{TILE_URL}/{MISSION_ID}/{{z}}/{{x}}/{{y}}.jpg",
+                "zooms": mission_zooms(MISSION), "bounds": mission_bbox(MISSION)}
+    return {"tiles": SATELLITE_TILES}
+
+@st.cache_resource
+def get_shared_base_map(mission_id, fingerprint):
+    """One base map per mission for the whole process, plus the lock its renders take.
+
+    st_folium attaches each session's layer to the map while rendering it, so
+    sessions render one at a time.
+    """
+    mission = get_mission(mission_id)
+    with get_tracer().span("map.base", tiles=TILE_MODE):
+        base = build_base_map(mission, mission.map_center, mission.map_zoom, **map_tile_options())
+    return base, threading.Lock()
+
+def get_base_map():
+    return get_shared_base_map(MISSION_ID, MISSION.fingerprint)
+
 # --- UI LAYOUT ---
 
 # --- 1. GLOBAL LOGIN CHECK (Remove the extra call from line 346) ---
@@ -396,19 +1088,20 @@ if not st.session_state.get("authentication_status"):
 
     with left_col:
         
-        st.image("https://peteburnettvisuals.com/wp-content/uploads/2026/01/panama-title2.jpg", use_container_width=True)
+        if MISSION.title_image:
+            st.image(MISSION.title_image, use_container_width=True)
 
         # --- MISSION BRIEFING OVERLAY ---
-        st.markdown("""
+        st.markdown(f"""
         <div style="background-color: rgba(0, 255, 65, 0.05); border-left: 3px solid #00FF41; padding: 15px; margin-top: 10px;">
             <h4 style="color: #00FF41; margin-top: 0;">SITUATION REPORT: THE GUNDOGS C2</h4>
             <p style="font-size: 0.9rem; color: #a2fcb9; line-height: 1.4;">
                 Welcome to the <b>Gundogs Command & Control Simulator</b>. You are the commander, directing elite PMC operatives through high-stakes asymmetrical theaters. This is not a game of reflexes, but of <b>strategic multiplexing</b>—balancing unit viability, objective efficiency, and tactical initiative.
             </p>
             <hr style="border-top: 1px solid rgba(0, 255, 65, 0.2);">
-            <h5 style="color: #FF8C00; margin-bottom: 5px;">CURRENT THEATER: THE PANAMA CAPER</h5>
+            <h5 style="color: #FF8C00; margin-bottom: 5px;">CURRENT THEATER: {html.escape(MISSION.title.upper())}</h5>
             <p style="font-size: 0.85rem; color: #FF8C00; opacity: 0.9; font-style: italic;">
-                "A cartel arms shipment is docking at Puerto de Cristobal in Panama. 60 minutes until the cartel arrives. Infiltrate. Identify. Secure. If you fail, the Agency denies your existence."
+                "{html.escape(MISSION.tagline or '')}"
             </p>
         </div>
         """, unsafe_allow_html=True)
@@ -429,54 +1122,65 @@ if not st.session_state.get("authentication_status"):
                 
                 submit_reg = st.form_submit_button("Enlist Operative")
                 
-                if submit_reg:
+                if submit_reg and not st.session_state.get("enlistment_request"):
                     if new_email and new_username and new_password:
-                        with st.spinner("📡 ENCRYPTING OPERATIVE DATA & UPLINKING TO GUNDOGS C2..."):
-                            # 1. Secure the password
-                            hashed_password = stauth.Hasher.hash(new_password)
-                            
-                            # 2. Commit to the cloud
-                            db.collection("users").document(new_email).set({
-                                "email": new_email,
-                                "username": new_username,
-                                "full_name": new_name,
-                                "password": hashed_password,
-                                "password_hint": new_hint,
-                                "created_at": firestore.SERVER_TIMESTAMP,
-                                "role": "Recruit"
-                            })
-                            
-                            # 3. Artificial delay for atmospheric effect and DB indexing
-                            time.sleep(2)
-                        
-                        # 4. Immediate Session Elevation
-                        st.session_state["authentication_status"] = True
-                        st.session_state["username"] = new_username
-                        st.session_state["name"] = new_name
-                        
-                        st.success(f"Operative {new_username} Enlisted. Deploying to Panama Theater...")
-                        st.rerun() # Skip the 'Resume' tab and jump to the map
+                        # Hashing, uniqueness checks and the cloud write all run off-thread
+                        st.session_state["enlistment_request"] = get_enlistment_service().enlist({
+                            "email": new_email,
+                            "username": new_username,
+                            "full_name": new_name,
+                            "password_hint": new_hint,
+                            "role": "Recruit"
+                        }, new_password)
 
-        with tab_login:
-            # Use the persistent authenticator from session state
-            auth_result = authenticator.login(location="main", key="mission_login_form")
-            
-            if auth_result:
-                name, authentication_status, username = auth_result
-                
-                if authentication_status:
-                    # IMMEDIATELY synchronize the session state
+            try:
+                recruit = poll_auth_request("enlistment_request",
+                                            "ENCRYPTING OPERATIVE DATA & UPLINKING TO GUNDOGS C2")
+            except EnlistmentConflict as e:
+                st.error(f"Enlistment refused: {e}.")
+            except Exception as e:
+                st.error(f"📡 Enlistment uplink failed: {e}")
+            else:
+                if recruit:
+                    # Immediate Session Elevation
                     st.session_state["authentication_status"] = True
-                    st.session_state["username"] = username
-                    st.session_state["name"] = name
-                    
-                    # Reset the 'logout' flag that Abort set
-                    st.session_state["logout"] = False 
-                    
-                    # FORCE a rerun to enter the Tactical UI Gate
-                    st.rerun() 
-                elif authentication_status == False:
-                    st.error("Invalid Credentials. Check Operative ID.")
+                    st.session_state["username"] = recruit["username"]
+                    st.session_state["name"] = recruit["full_name"]
+
+                    st.toast(f"Operative {recruit['username']} Enlisted. Deploying to {MISSION.title}...")
+                    st.rerun() # Skip the 'Resume' tab and jump to the map
+
+        with tab_login:
+            # Cookie re-login only; stauth's own form gives the username input no key,
+            # so the form is drawn here and the check goes through its controller
+            authenticator.login(location="unrendered")
+            with st.form("mission_login_form"):
+                st.subheader("Login")
+                login_username = st.text_input("Username", key=LOGIN_USERNAME_KEY, autocomplete="off")
+                login_password = st.text_input("Password", type="password", key="login_password", autocomplete="off")
+                login_submitted = st.form_submit_button("Login")
+
+            if login_submitted:
+                attempt_login(login_username, login_password)
+
+            if st.session_state.get("authentication_status"):
+                # Reset the 'logout' flag that Abort set
+                st.session_state["logout"] = False
+
+                # FORCE a rerun to enter the Tactical UI Gate
+                st.rerun()
+            elif login_submitted and st.session_state.get("authentication_status") is False:
+                # The roster may predate this operative or their password (enlisted or reset
+                # on another instance): fetch just their document rather than re-streaming every user.
+                attempted = st.session_state.get(LOGIN_USERNAME_KEY, "").lower().strip()
+                store = get_credential_store()
+                cached = store.get(attempted) if attempted else None
+                fresh = store.lookup(attempted) if attempted else None
+                if fresh and fresh != cached:
+                    build_authenticator()
+                    if attempt_login(login_username, login_password):
+                        st.rerun()
+                st.error("Invalid Credentials. Check Operative ID.")
  
         with tab_recovery:
             st.subheader("Field Credential Recovery")
@@ -487,7 +1191,7 @@ if not st.session_state.get("authentication_status"):
                 submit_verify = st.form_submit_button("Verify Operative Status")
                 
                 if submit_verify:
-                    user_doc = db.collection("users").document(email_input).get()
+                    user_doc = get_db().collection("users").document(email_input).get()
                     if user_doc.exists:
                         # Store the email to use as the Document ID for the update
                         st.session_state["recovery_verified_email"] = email_input
@@ -507,21 +1211,21 @@ if not st.session_state.get("authentication_status"):
                         # We use the email captured in Step 1 as the Document ID
                         target_email = st.session_state["recovery_verified_email"]
                         
-                        # Generate the new hash using the modern syntax
-                        new_hash = stauth.Hasher.hash(new_password)
-                        
-                        # Update the specific document in the 'gundogs' database
-                        db.collection("users").document(target_email).update({
-                            "password": new_hash
-                        })
-                        
-                        st.success("Credentials updated in Cloud. Proceed to Resume tab.")
+                        # Hash and update the 'gundogs' document off-thread
+                        st.session_state["reset_request"] = get_enlistment_service().reset_password(
+                            target_email, username_to_reset, new_password)
                         # Clear recovery state to reset the form
                         st.session_state["recovery_verified_email"] = None 
                         
                 except Exception as e:
                     st.info("Tactical reset initialized. Enter details above to finalize.")
 
+            try:
+                if poll_auth_request("reset_request", "RE-KEYING OPERATIVE CREDENTIALS"):
+                    st.success("Credentials updated in Cloud. Proceed to Resume tab.")
+            except Exception as e:
+                st.error(f"📡 Credential reset failed: {e}")
+
 # --- 2. ACTIVE TACTICAL UI GATE ---
 if st.session_state.get("authentication_status"):
     # Fix: Get the user details from session state since auth_result is gone on rerun
@@ -545,15 +1249,19 @@ if st.session_state.get("authentication_status"):
     # Triggered once upon successful login
     if not st.session_state.get("auto_resume_attempted", False):
         # We use 'username' because stauth stores the login ID (email) there
-        state_found = load_mission_state(username, "panama")
+        state_found = load_mission_state(username, MISSION_ID)
         st.session_state["auto_resume_attempted"] = True 
         
         if state_found:
             st.session_state.mission_started = True 
             st.toast(f"Welcome back, Operative. State recovered from Cloud.")
 
+    # Fold in any squad turn that landed since the last rerun (exactly once)
+    collect_turn()
+
     # --- 3. TACTICAL UI (Main Engine) ---
     st.empty() # Clear landing page
+    chat_container = None # Only exists while the active mission UI is on screen
 
     with st.sidebar:
         st.header("🦅 GUNDOG C2")
@@ -565,6 +1273,14 @@ if st.session_state.get("authentication_status"):
             st.session_state.clear()
             # 2. Force a rerun to the login screen
             st.rerun()
+
+        # Theater selection, only offered when the catalog has more than one package
+        theaters = {entry.id: entry.title for entry in get_mission_catalog().entries()}
+        if len(theaters) > 1:
+            picked = st.selectbox("THEATER", list(theaters), index=list(theaters).index(MISSION_ID),
+                                  format_func=lambda mission_id: theaters[mission_id].upper())
+            if picked != MISSION_ID:
+                switch_mission(picked)
         
         st.metric(label="MISSION TIME REMAINING", value=f"{st.session_state.mission_time} MIN")
         
@@ -572,8 +1288,8 @@ if st.session_state.get("authentication_status"):
         if st.button("🚨 ABORT MISSION (RESET)"):
             # 1. Kill the Cloud Record
             try:
-                mission_doc_id = f"{st.session_state.username}_panama"
-                db.collection("mission_states").document(mission_doc_id).delete()
+                # Turns subcollection and parent doc are removed off-thread
+                get_state_writer().delete(st.session_state.username, MISSION_ID)
             except Exception as e:
                 pass # Silent fail if doc already deleted
 
@@ -591,10 +1307,11 @@ if st.session_state.get("authentication_status"):
 
         # Add this to your Sidebar logic:
         st.subheader("📝 MISSION CHECKLIST")
-        for obj_id, status in st.session_state.objectives.items():
-            label = obj_id.replace('obj_', '').replace('_', ' ').title()
-            if status:
+        for obj_id, label, status in get_objective_tracker().checklist():
+            if status == OBJ_DONE:
                 st.write(f"✅ ~~{label}~~")
+            elif status == OBJ_LOCKED:
+                st.write(f"🔒 {label}")
             else:
                 st.write(f"◻️ {label}")
         
@@ -602,20 +1319,23 @@ if st.session_state.get("authentication_status"):
         st.subheader("👥 SQUAD DOSSIERS")
         unit_view = st.radio("Access Unit Data:", ["SAM", "DAVE", "MIKE"], horizontal=True)
         
-        # Mapping to your local .png files
+        # Local .png files, served from the asset cache as resized WebP
         if unit_view == "DAVE":
-            st.image("dave.png", use_container_width=True) 
+            st.image(local_image("dave.png", "portrait"), use_container_width=True) 
             st.warning("SPECIALTY: FORCE (90) | WEAKNESS: NEG (10)")
         elif unit_view == "SAM":
-            st.image("sam.png", use_container_width=True)
+            st.image(local_image("sam.png", "portrait"), use_container_width=True)
             st.success("SPECIALTY: NEG (95) | WEAKNESS: FORCE (25)")
         else:
-            st.image("mike.png", use_container_width=True)
+            st.image(local_image("mike.png", "portrait"), use_container_width=True)
             st.info("SPECIALTY: TECH (85) | WEAKNESS: FORCE (35)")
 
         st.divider()
         st.subheader("📊 EFFICIENCY: " + str(st.session_state.efficiency_score))
 
+        if is_admin(username):
+            render_debug_panel()
+
 
     # --- MAIN TERMINAL ---
 
@@ -623,35 +1343,8 @@ if st.session_state.get("authentication_status"):
         st.balloons()
         st.markdown("<h1 style='text-align: center; color: #00FF00;'>🏁 MISSION COMPLETE: DEBRIEFING IN PROGRESS</h1>", unsafe_allow_html=True)
         
-        # Generate the AAR automatically if it doesn't exist yet
-        if "aar_report" not in st.session_state:
-            with st.spinner("COMMANANT'S EVALUATION INCOMING..."):
-                logs = st.session_state.get("messages", [])
-                # Refined prompt for Royal Marine Commando Values
-                # Refined prompt for Leadership & Command Assessment
-                eval_prompt = f"""
-                Act as a Senior Tactical Officer conducting an After-Action Review (AAR) of a Mission Commander.
-                Analyze the user's tactical commands in these logs: {logs}.
-
-                Focus EXCLUSIVELY on the Commander's performance in these areas:
-                1. MULTITASKING: Did they keep all three units (Sam, Dave, Mike) engaged, or were units left idle?
-                2. INITIATIVE: Did the Commander push the pace, or were they reactive to the squad's banter?
-                3. CLARITY: Were orders direct and objective-oriented, or vague?
-                4. COORDINATION: Did they effectively use "Combined Arms" (e.g., ordering security while hacking)?
-
-                Rate the Commander on:
-                - Command Presence (Courage/Determination in decision making).
-                - Operational Efficiency (Time vs. Objective completion).
-
-                Provide one 'Sustained' (Leadership strength) and one 'Improve' (Command advice).
-                End with a traditional Royal Marine sign-off.
-                """
-                st.session_state.aar_report = get_dm_response(eval_prompt)
-
-                # 2. POP THIS HERE: Save to Firestore immediately
-                doc_ref = db.collection("mission_states").document(f"{username}_panama")
-                doc_ref.set({"aar_report": st.session_state.aar_report}, merge=True)
-                st.toast("AAR permanent record created.")
+        # The AAR was queued when the win fired (and saved by its worker); stats don't wait on it
+        aar_report = collect_aar()
 
         # Split screen: Metrics on left, AAR on right
         col_metrics, col_aar = st.columns([1, 2], gap="large")
@@ -666,12 +1359,22 @@ if st.session_state.get("authentication_status"):
             
             st.divider()
             if st.button("REDEPLOY (NEW MISSION)"):
+                # Drop the finished run first, or the auto-resume gate would restore it straight to this debrief
+                get_state_writer().delete(username, MISSION_ID)
                 st.session_state.clear()
                 st.rerun()
 
         with col_aar:
             st.subheader("📜 Commandant's Performance Evaluation")
-            st.markdown(st.session_state.aar_report)
+            if aar_report:
+                st.markdown(aar_report)
+            elif st.session_state.get("aar_error"):
+                st.error(f"📡 AAR UPLINK FAILURE: {st.session_state.aar_error}")
+                if st.button("RETRANSMIT EVALUATION REQUEST"):
+                    start_aar()
+                    st.rerun()
+            else:
+                aar_monitor()
     else:
         # --- ACTIVE MISSION UI ---
         col1, col2 = st.columns([0.4, 0.6])
@@ -680,113 +1383,51 @@ if st.session_state.get("authentication_status"):
             st.markdown("### 📡 COMMS FEED")
             chat_container = st.container(height=650, border=True)
             with chat_container:
-                for msg in st.session_state.messages:
-                    if msg["role"] == "user":
-                        with st.chat_message("user"):
-                            st.write(msg["content"])
-                    else:
-                        # It's the Assistant (The Squad)
-                        dialogue_dict = msg["content"]
-                        
-                        # If it's the dictionary format, render separate bubbles
-                        if isinstance(dialogue_dict, dict):
-                            for operative, text in dialogue_dict.items():
-                                # Map to your local images
-                                if operative == "AGENCY HQ":
-                                    avatar_img = "agency_icon.png" # Create this file or rename an existing one
-                                else:
-                                    avatar_img = f"{operative.lower()}_icon.png"
-                                
-                                with st.chat_message(operative.lower(), avatar=avatar_img):
-                                    st.markdown(f"**{operative}**")
-                                    st.write(text)
-                        else:
-                            # Fallback for old string messages or Recon reports
-                            with st.chat_message("assistant"):
-                                st.write(msg["content"])
+                with get_tracer().span("render.feed", messages=len(st.session_state.messages)):
+                    render_feed(st.session_state.messages)
+                if st.session_state.get("pending_turn"):
+                    turn_monitor()
 
         with col2:
-            st.markdown("### 🗺️ TACTICAL OVERVIEW: CRISTOBAL")
-            
-            # Define assets
-            sam_token = folium.CustomIcon("https://peteburnettvisuals.com/wp-content/uploads/2026/01/sam-map1.png", icon_size=(45, 45))
-            dave_token = folium.CustomIcon("https://peteburnettvisuals.com/wp-content/uploads/2026/01/dave-map1.png", icon_size=(45, 45))
-            mike_token = folium.CustomIcon("https://peteburnettvisuals.com/wp-content/uploads/2026/01/mike-map1.png", icon_size=(45, 45))
-            
-            m = folium.Map(location=[9.3525, -79.9100], zoom_start=15, tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}', attr='Esri', name='Satellite')
+            st.markdown(f"### 🗺️ TACTICAL OVERVIEW: {(MISSION.map_label or MISSION.title).upper()}")
             
-            # Fog of War & Discovery Renderer
-            for loc_id, info in MISSION_DATA.items():
-                is_discovered = loc_id in st.session_state.discovered_locations
-                marker_color = "#00FF00" 
-                fill_opac = 0.2 if is_discovered else 0.02
-                
-                if is_discovered:
-                    loc_img_url = get_image_url(info["image"])
-                    popup_html = f'<div style="width:200px;background:#000;padding:10px;border:1px solid #0f0;"><h4 style="color:#0f0;">{info["name"]}</h4><img src="{loc_img_url}" width="100%"><p style="color:#0f0;font-size:10px;">{info["intel"]}</p></div>'
-                else:
-                    popup_html = f'<div style="width:150px;background:#000;padding:10px;"><h4 style="color:#666;">{info["name"]}</h4><p style="color:#666;font-size:10px;">[RECON REQUIRED]</p></div>'
-
-                folium.Circle(location=info["coords"], radius=45, color=marker_color, fill=True, fill_opacity=fill_opac).add_to(m)
-                # Updated Marker with High-Contrast Tactical Label
-                folium.Marker(
-                    location=info["coords"], 
-                    icon=folium.DivIcon(
-                        html=f"""
-                        <div style="
-                            font-family: 'Courier New', monospace;
-                            font-size: 9pt;
-                            font-weight: bold;
-                            color: {marker_color};
-                            background-color: rgba(0, 0, 0, 0.7); 
-                            border: 1px solid {marker_color};
-                            border-radius: 3px;
-                            padding: 2px 4px;
-                            white-space: nowrap;
-                            text-shadow: none;
-                            display: inline-block;
-                            transform: translate(-50%, -150%);
-                        ">
-                            {info["name"].upper()}
-                        </div>
-                        """
-                    ), 
-                    popup=folium.Popup(popup_html, max_width=250)
-                ).add_to(m)
-
-            # Squad Tokens
-            tokens = {"SAM": sam_token, "DAVE": dave_token, "MIKE": mike_token}
-            offsets = {"SAM": [0.00015, 0], "DAVE": [-0.0001, 0.00015], "MIKE": [-0.0001, -0.00015]}
-
-            for unit, icon in tokens.items():
-                current_loc = st.session_state.locations.get(unit, "Insertion Point")
-                # Robust matching POI by name
-                target_poi = next((info for info in MISSION_DATA.values() if info['name'].lower() == current_loc.lower()), MISSION_DATA.get('insertion_point'))
+            # Base map (tiles + fogged POIs) is built once per mission and shared by every session
+            base_map, render_lock = get_base_map()
 
-                # NEW SAFETY CHECK: If no POI found, default to 'Insertion Point' or skip
-                if target_poi is None:
-                    # Try to find 'Insertion Point' specifically, or just use the first available POI
-                    target_poi = next((info for info in MISSION_DATA.values() if "insertion" in info['name'].lower()), list(MISSION_DATA.values())[0])
-                
-                final_coords = [target_poi["coords"][0] + offsets[unit][0], target_poi["coords"][1] + offsets[unit][1]]
-                folium.Marker(final_coords, icon=icon, tooltip=unit).add_to(m)
-            
-            st_folium(m, use_container_width=True, key="tactical_map_v3", returned_objects=[])
+            # Squad Tokens: resolve each unit to a POI id
+            positions = []
+            for unit in TOKEN_ICONS:
+                current_loc = st.session_state.locations.get(unit, "Insertion Point")
+                # Robust matching POI by name, id or alias
+                target_poi_id = MISSION.resolver.resolve(current_loc)
+
+                # NEW SAFETY CHECK: If no POI found, default to 'Insertion Point' or the first available POI
+                if target_poi_id is None:
+                    target_poi_id = 'insertion_point' if 'insertion_point' in MISSION_DATA else next(iter(MISSION_DATA))
+                positions.append((unit, target_poi_id))
+
+            # Only the tokens and fog-of-war change between turns; rebuild that layer only when they do
+            layer_key = (MISSION.fingerprint, tuple(positions), tuple(st.session_state.discovered_locations))
+            if st.session_state.get("map_layer_key") != layer_key:
+                with get_tracer().span("map.layer", discovered=len(st.session_state.discovered_locations)):
+                    st.session_state.map_layer = build_dynamic_layer(
+                        MISSION, positions, st.session_state.discovered_locations, recon_thumb_url,
+                        token_icons=token_icons())
+                st.session_state.map_layer_key = layer_key
+
+            st_folium = REPORT.lazy_import("streamlit_folium").st_folium
+            with get_tracer().span("render.map"), render_lock:
+                try:
+                    st_folium(base_map, use_container_width=True, key="tactical_map_v3", returned_objects=[],
+                              center=MISSION.map_center, zoom=MISSION.map_zoom,
+                              feature_group_to_add=st.session_state.map_layer)
+                finally:
+                    detach_layer(base_map, st.session_state.map_layer)
 
         # --- MISSION STAGING & INITIAL BRIEFING ---
     if not st.session_state.messages:
         # 1. Prepare the Agency Briefing
-        briefing_text = """
-        **TOP SECRET // EYES ONLY**\n
-        **FROM:** The Agency\n
-        **TO:** PMC Gundogs\n
-        **SITUATION:** Cartel have managed to acquire anti-aircraft weapons. Munitions arriving Puerto de Cristobal, Panama 0500 LOCAL TIME on board bulk carrier MV Panamax. Represents serious threat to military and civilian aviation. Intercept of these munitions ESSENTIAL.\n
-        **OBJECTIVE:** Infiltrate the harbor, identify the cargo container, and secure munitions for transport. Once extracted from port, hand over munitions to Agency personnel in town plaza, Colon. Cartel pickup scheduled for 0600, giving 1 hour window for mission execution.\n
-        **ADVISORIES:** Container ID unknown, but records available on ship manifest file.\n
-        **CONSTRAINTS:** Maintain 100% plausible deniability. Avoid local law enforcement. Munitions cannot be destroyed on site, due to high risk of collateral damage. \n\n
-        
-        *Awaiting PMC Gundogs Team Commander Confirmation...*
-        """
+        briefing_text = MISSION.briefing + "\n\n*Awaiting PMC Gundogs Team Commander Confirmation...*"
         # 2. Add it to the feed as the 'AGENCY'
         st.session_state.messages.append({
             "role": "assistant", 
@@ -798,11 +1439,10 @@ if st.session_state.get("authentication_status"):
     if not st.session_state.mission_started:
         # This button appears in the main area until clicked
         if st.button("🚀 INITIALIZE OPERATION: CONFIRM MISSION PARAMETERS", use_container_width=True):
-            with st.spinner("COMMUNICATION SECURED. SQUAD REPORTING IN..."):
-                # Trigger the actual AI squad check-in
-                response = get_dm_response("Team is at the insertion point. Report in.")
-                st.session_state.mission_started = True
-                st.rerun()
+            # Trigger the actual AI squad check-in; it lands in the feed while the UI stays live
+            queue_model_turn("Team is at the insertion point. Report in.")
+            st.session_state.mission_started = True
+            st.rerun()
         
     # Only show the input if the mission is active
     if st.session_state.mission_started:
@@ -812,14 +1452,24 @@ if st.session_state.get("authentication_status"):
             if "VALHALLA" in prompt.upper():
                 st.session_state.mission_complete = True
                 st.session_state.time_elapsed = 60 - st.session_state.mission_time
+                start_aar()
                 st.toast("⚡ VALHALLA SIGNAL RECEIVED. EXTRACTING SQUAD...")
                 st.rerun()
 
             # 2. Normal Command Flow
             # (Your existing logic for sending prompts to the DM/AI)
             st.session_state.mission_time -= 1 
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            get_dm_response(prompt)
+            # Stamped with the clock so the AAR can time the order
+            st.session_state.messages.append({"role": "user", "content": prompt, "t": st.session_state.mission_time})
+            local_order = parse_command(prompt, MISSION.resolver) if LOCAL_COMMANDS else None
+            if local_order is not None:
+                # Fast-path: state already known, no Gemini round trip
+                run_local_order(local_order)
+            else:
+                # Submitted to the worker pool; the feed polls for it, the command box stays live
+                queue_model_turn(prompt)
+            # Queue this turn's delta now; the write lands off-thread while we rerun
+            save_mission_state(username, MISSION_ID)
             st.rerun()
 
 
@@ -827,4 +1477,7 @@ if st.session_state.get("authentication_status"):
 if st.session_state.get("authentication_status") and st.session_state.get("mission_started"):
     # Ensure username is pulled from session state as well
     active_user = st.session_state.get("username")
-    save_mission_state(active_user, "panama")
\ No newline at end of file
+    save_mission_state(active_user, MISSION_ID)
+
+# First complete render on this process: close and publish the cold-start report
+REPORT.finish()
@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from uge.catalog import MissionCatalog  # noqa: E402
+from uge.fakes import FakeFirestoreClient  # noqa: E402
+
+MISSIONS_DIR = os.path.join(ROOT, "missions")
+MISSION_FILE = os.path.join(MISSIONS_DIR, "panama", "mission.xml")
+
+
+@pytest.fixture(scope="session")
+def mission():
+    return MissionCatalog(MISSIONS_DIR).get("panama")
+
+
+@pytest.fixture
+def db():
+    return FakeFirestoreClient()
+
+
+def wait_until(predicate, timeout=2.0):
+    """Polls ``predicate`` until it holds; for results that land on background threads."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
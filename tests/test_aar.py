@@ -0,0 +1,36 @@
+from uge.aar import AAREngine, addressed_units, extract_transcript, summary_lines
+from uge.fakes import ScriptedSquadGateway
+
+
+def orders(*texts, start=60):
+    messages = []
+    for i, text in enumerate(texts):
+        messages.append({"role": "user", "content": text, "t": start - i - 1})
+        messages.append({"role": "assistant", "content": {"SAM": "Copy."}, "locations": {"SAM": f"poi{i}"}})
+    return messages
+
+
+def test_addressed_units():
+    assert addressed_units("Sam and Mike, hold") == ["SAM", "MIKE"]
+    assert addressed_units("Everyone regroup, Dave lead") == ["SAM", "DAVE", "MIKE"]
+    assert addressed_units("Hold position") == ["SAM", "DAVE", "MIKE"]
+
+
+def test_transcript_timing_locations_and_idle(mission):
+    transcript = extract_transcript(
+        orders("Sam go", "Sam go", "Sam go", "Sam go", "Dave go"), mission,
+        objective_times={"obj_identify_container": 52})
+    assert [o["min"] for o in transcript["orders"]] == [1, 2, 3, 4, 5]
+    assert transcript["orders"][0]["locations"] == {"SAM": "poi0"}
+    assert transcript["idle"]["DAVE"] == [{"from": 1, "to": 5, "orders": 4}]
+    assert "SAM" not in transcript["idle"]
+    assert transcript["objectives"][0] == {"id": "obj_identify_container", "label": "Identify Container", "min": 8}
+    assert "- Enter Container: NOT COMPLETED" in summary_lines(transcript)
+
+
+def test_long_missions_are_summarized_in_phases(mission):
+    gateway = ScriptedSquadGateway(mission)
+    engine = AAREngine(gateway, chunk_orders=10)
+    report = engine.run(extract_transcript(orders(*["Sam go"] * 25), mission))
+    assert engine.calls == 4   # three phases plus the review
+    assert "IMPROVE" in report and "DAVE" in report
@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+from uge.admission import AdmissionController, AdmissionTimeout, CircuitBreaker, TokenBucket
+
+
+class Transient(Exception):
+    pass
+
+
+def controller(**kwargs):
+    kwargs.setdefault("retryable", lambda e: isinstance(e, Transient))
+    kwargs.setdefault("sleep", lambda seconds: None)
+    return AdmissionController(**kwargs)
+
+
+def test_retries_transient_errors_then_succeeds():
+    admission = controller(max_retries=3)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Transient()
+        return "ok"
+
+    assert admission.run("sam", flaky) == "ok"
+    assert len(calls) == 3
+    assert admission.retries == 2
+
+
+def test_non_retryable_error_is_raised_at_once():
+    admission = controller()
+    with pytest.raises(ValueError):
+        admission.run("sam", lambda: (_ for _ in ()).throw(ValueError("bad request")))
+    assert admission.retries == 0
+    assert admission.breaker.failures == 0
+
+
+def test_gives_up_after_max_retries():
+    admission = controller(max_retries=2)
+    with pytest.raises(Transient):
+        admission.run("sam", lambda: (_ for _ in ()).throw(Transient()))
+    assert admission.retries == 2
+
+
+def test_times_out_when_quota_is_spent():
+    admission = controller(rpm=1, max_wait=0.2)
+    admission.run("sam", lambda: None)
+    with pytest.raises(AdmissionTimeout):
+        admission.run("dave", lambda: None)
+    assert admission.waiting() == 0
+
+
+def test_token_bucket_refills():
+    now = [0.0]
+    bucket = TokenBucket(60, burst=2, clock=lambda: now[0])
+    bucket.take(2, 0.0)
+    assert bucket.wait_time(1, 0.0) == pytest.approx(1.0)
+    assert bucket.wait_time(1, 1.0) == 0.0
+    # Oversize requests pass on a full bucket instead of waiting forever
+    assert bucket.wait_time(10, 5.0) == 0.0
+
+
+def test_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_after=10)
+    breaker.record_failure(0)
+    assert breaker.state(0) == "closed"
+    breaker.record_failure(1)
+    assert breaker.wait_time(5) == pytest.approx(6)
+    breaker.admit(12)   # half-open probe
+    assert breaker.wait_time(12) == 10
+    breaker.record_failure(12)
+    assert breaker.state(13) == "open"
+    breaker.record_success()
+    assert breaker.state(13) == "closed"
+
+
+def test_concurrent_callers_never_exceed_the_request_rate():
+    admission = controller(rpm=20, max_wait=1)
+    results, lock = [], threading.Lock()
+
+    def call(user):
+        try:
+            admission.run(user, lambda: None)
+            outcome = "ok"
+        except AdmissionTimeout:
+            outcome = "timeout"
+        with lock:
+            results.append(outcome)
+
+    threads = [threading.Thread(target=call, args=(f"u{i % 4}",)) for i in range(30)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # The bucket starts full (20) and refills one request every 3 s
+    assert admission.admitted == results.count("ok")
+    assert admission.admitted == 20
+    assert admission.waiting() == 0
+
+
+def test_round_robin_between_users():
+    admission = controller(rpm=600)
+    admitted, gate = [], threading.Event()
+    # Hold the head of the queue until every ticket is waiting
+    original = admission._capacity_wait
+    admission._capacity_wait = lambda ticket, now: 0.0 if gate.is_set() else 0.05
+
+    def call(user):
+        admission.acquire(user, 1)
+        admitted.append(user)
+
+    threads = []
+    for user in ("sam", "sam", "sam", "dave"):
+        threads.append(threading.Thread(target=call, args=(user,)))
+        threads[-1].start()
+        while admission.waiting() < len(threads):
+            pass
+    gate.set()
+    for t in threads:
+        t.join()
+    admission._capacity_wait = original
+    # Dave doesn't wait behind all of Sam's requests
+    assert admitted.index("dave") <= 1
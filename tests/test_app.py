@@ -0,0 +1,66 @@
+"""Drives streamlit_app.py through AppTest against the offline backends."""
+import pytest
+
+from conftest import ROOT
+from uge.fakes import FakeFirestoreClient
+
+APP_TIMEOUT_SECONDS = 60
+
+
+@pytest.fixture
+def app(monkeypatch):
+    from streamlit.testing.v1 import AppTest
+    monkeypatch.chdir(ROOT)   # style.css and missions/ are resolved from the working directory
+    monkeypatch.setenv("UGE_OFFLINE", "1")
+    monkeypatch.setenv("UGE_PREFIX_CACHE", "local")
+    at = AppTest.from_file(f"{ROOT}/streamlit_app.py", default_timeout=APP_TIMEOUT_SECONDS)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def enlist_elsewhere(username, password):
+    """Writes a ``users`` document the way another instance's enlistment would."""
+    from streamlit_authenticator import Hasher
+    FakeFirestoreClient.shared().collection("users").document(f"{username}@gundogs.test").set({
+        "username": username, "full_name": username.title(), "email": f"{username}@gundogs.test",
+        "password": Hasher.hash(password), "role": "Recruit"})
+
+
+def log_in(at, username, password):
+    at.text_input(key="login_username").input(username)
+    at.text_input(key="login_password").input(password)
+    next(b for b in at.button if b.label == "Login").click()
+    at.run()
+    assert not at.exception
+
+
+def test_login_picks_up_an_operative_enlisted_on_another_instance(app):
+    enlist_elsewhere("zulu", "s3cret")   # after this session's roster was loaded
+    log_in(app, "Zulu", "s3cret")
+    assert app.session_state["authentication_status"] is True
+    assert app.session_state["username"] == "zulu"
+
+
+def test_wrong_password_is_refused(app):
+    enlist_elsewhere("yankee", "s3cret")
+    log_in(app, "yankee", "guess")
+    assert not app.session_state["authentication_status"]
+    assert any("Invalid Credentials" in e.value for e in app.error)
+
+
+def test_feed_renders_the_window_and_keeps_the_rest_archived(app, monkeypatch):
+    monkeypatch.setenv("UGE_FEED_WINDOW", "5")
+    enlist_elsewhere("whiskey", "s3cret")
+    log_in(app, "whiskey", "s3cret")
+    app.session_state["messages"] = [{"role": "user", "content": f"order {i}"} for i in range(12)]
+    app.run()
+    assert not app.exception
+    assert [m.markdown[0].value for m in app.chat_message] == [f"order {i}" for i in range(7, 12)]
+    assert app.toggle(key="feed_show_archive").label == "📁 ARCHIVED COMMS (7 messages)"
+    plans = app.session_state["feed_block_cache"]
+
+    app.toggle(key="feed_show_archive").set_value(True).run()
+    assert len(app.chat_message) == 12
+    # Plans built on the earlier rerun are reused, not rebuilt
+    assert all(a is b for a, b in zip(app.session_state["feed_block_cache"], plans))
@@ -0,0 +1,103 @@
+import io
+import os
+import threading
+
+import pytest
+from conftest import wait_until
+from PIL import Image
+
+from uge.assets import DERIVATIVES, AssetPipeline, derived_path, precompute, sniff_mime, static_url
+
+
+def test_failed_fetch_fails_fast_until_the_ttl_expires():
+    now, calls = [0.0], []
+
+    def fetch(source):
+        calls.append(source)
+        raise OSError("404")
+
+    pipeline = AssetPipeline(fetch=fetch, clock=lambda: now[0], failure_ttl=60)
+    for _ in range(3):
+        with pytest.raises(OSError):
+            pipeline.derivative("https://bucket/a.jpg", "thumb")
+    assert len(calls) == 1
+    pipeline.prefetch("https://bucket/a.jpg", sizes=("thumb",))
+    assert pipeline.stats()["failed_fast"] == 2
+    now[0] = 61
+    with pytest.raises(OSError):
+        pipeline.derivative("https://bucket/a.jpg", "thumb")
+    assert len(calls) == 2
+
+
+def test_concurrent_requests_build_once():
+    release, calls = threading.Event(), []
+
+    def fetch(source):
+        calls.append(source)
+        release.wait(2)
+        return b"not-an-image"
+
+    pipeline = AssetPipeline(fetch=fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pipeline.derivative("a.png")))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == [b"not-an-image"] * 8
+    assert len(calls) == 1
+
+
+def test_byte_bound_evicts_least_recent():
+    pipeline = AssetPipeline(fetch=lambda source: source.encode() * 10, max_bytes=25)
+    pipeline.derivative("a")
+    pipeline.derivative("b")
+    pipeline.derivative("c")
+    assert pipeline.stats()["entries"] == 2
+    assert pipeline.stats()["bytes"] <= 25
+
+
+def png(width, height):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "green").save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_derivative_is_resized_webp_and_kept_on_disk(tmp_path):
+    path = str(tmp_path / "derived" / "thumb" / "loc_dock4.webp")
+    pipeline = AssetPipeline(fetch=lambda source: png(1200, 800))
+    data = pipeline.derivative("loc_dock4.jpg", "thumb", disk_path=path)
+    assert sniff_mime(data) == "image/webp"
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.size == DERIVATIVES["thumb"]
+
+    def unreachable(source):
+        raise AssertionError("derivative should come from disk")
+    assert AssetPipeline(fetch=unreachable).derivative("loc_dock4.jpg", "thumb", disk_path=path) == data
+
+
+def test_precompute_writes_each_poi_once(mission, tmp_path):
+    pipeline = AssetPipeline(fetch=lambda source: png(64, 64))
+    count = len({poi.image for poi in mission.pois.values() if poi.image})
+    assert precompute(mission, str(tmp_path), str, pipeline, sizes=("thumb",)) == count
+    assert precompute(mission, str(tmp_path), str, pipeline, sizes=("thumb",)) == 0
+    assert os.path.isfile(derived_path(str(tmp_path), "thumb", mission.pois["docking_bay_4"].image))
+
+
+def test_served_queues_a_miss_and_answers_from_disk_once_built(tmp_path):
+    release = threading.Event()
+
+    def fetch(source):
+        release.wait(2)
+        return png(640, 480)
+
+    path = str(tmp_path / "derived" / "panama" / "thumb" / "loc_dock4.webp")
+    pipeline = AssetPipeline(fetch=fetch)
+    assert pipeline.served("loc_dock4.jpg", "thumb", path) is None
+    release.set()
+    assert wait_until(lambda: os.path.isfile(path))
+    assert pipeline.served("loc_dock4.jpg", "thumb", path) == path
+    assert static_url("static/derived/panama/thumb/loc_dock4.webp") == \
+        "/app/static/derived/panama/thumb/loc_dock4.webp"
@@ -0,0 +1,78 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import MISSION_FILE
+from uge.catalog import MissionCatalog
+from uge.mission import MissionCompileError, compile_mission
+
+
+def package(root, name, images=()):
+    os.makedirs(root / name / "images")
+    shutil.copy(MISSION_FILE, root / name / "mission.xml")
+    for image in images:
+        (root / name / "images" / image).write_bytes(b"")
+    return root / name / "mission.xml"
+
+
+def counting_catalog(roots, **kwargs):
+    calls = []
+
+    def compile(path):
+        calls.append(path)
+        return compile_mission(path)
+    return MissionCatalog(roots, compile=compile, **kwargs), calls
+
+
+def test_discovery_reads_titles_without_compiling(tmp_path):
+    package(tmp_path, "panama", images=("loc_dock4.jpg", "notes.txt"))
+    package(tmp_path, "lagos")
+    os.makedirs(tmp_path / "not_a_package")
+    catalog, calls = counting_catalog(str(tmp_path))
+    assert [e.id for e in catalog.entries()] == ["lagos", "panama"]
+    assert catalog.entry("panama").title == "The Panama Caper"
+    assert list(catalog.entry("panama").images()) == ["loc_dock4.jpg"]
+    assert "lagos" in catalog and "not_a_package" not in catalog
+    assert calls == []
+
+
+def test_compiled_missions_are_bounded_lru(tmp_path):
+    for name in ("a", "b", "c"):
+        package(tmp_path, name)
+    catalog, calls = counting_catalog(str(tmp_path), max_compiled=2)
+    assert catalog.get("a").catalog_id == "a"
+    catalog.get("b")
+    assert catalog.get("a") is catalog.get("a")   # cached, now most recent
+    catalog.get("c")
+    assert catalog.loaded() == ["a", "c"]
+    assert catalog.evictions == 1 and len(calls) == 3
+
+
+def test_edited_mission_is_recompiled(tmp_path):
+    path = package(tmp_path, "panama")
+    catalog, calls = counting_catalog(str(tmp_path))
+    first = catalog.get("panama")
+    path.write_text(path.read_text().replace("The Panama Caper", "The Panama Job"))
+    assert catalog.get("panama") is not first
+    assert len(calls) == 2
+
+
+def test_added_and_removed_packages_are_noticed(tmp_path):
+    package(tmp_path, "panama")
+    catalog, _ = counting_catalog(str(tmp_path))
+    catalog.get("panama")
+    package(tmp_path, "lagos")
+    assert "lagos" in catalog
+    shutil.rmtree(tmp_path / "panama")
+    assert "panama" not in catalog and catalog.loaded() == []
+    with pytest.raises(MissionCompileError):
+        catalog.get("panama")
+
+
+def test_first_root_wins_on_duplicate_ids(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    package(first, "panama")
+    package(second, "panama")
+    catalog = MissionCatalog([str(first), str(second)])
+    assert catalog.entry("panama").package_dir == str(first / "panama")
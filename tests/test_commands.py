@@ -0,0 +1,35 @@
+import pytest
+
+from uge.commands import ChecklistQuery, MoveOrder, StatusQuery, parse_command
+
+
+@pytest.mark.parametrize("text, units", [
+    ("Dave move to north gate", ("DAVE",)),
+    ("sam and mike, head to the freighter", ("SAM", "MIKE")),
+    ("All units go to town plaza", ("SAM", "DAVE", "MIKE")),
+])
+def test_moves(mission, text, units):
+    order = parse_command(text, mission.resolver)
+    assert isinstance(order, MoveOrder)
+    assert order.units == units
+
+
+def test_queries(mission):
+    assert isinstance(parse_command("sitrep", mission.resolver), StatusQuery)
+    assert isinstance(parse_command("Status report", mission.resolver), StatusQuery)
+    assert isinstance(parse_command("checklist", mission.resolver), ChecklistQuery)
+
+
+@pytest.mark.parametrize("text", [
+    "Report in",                                  # narrative: the squad answers it
+    "Team is at the insertion point. Report in.",
+    "Dave move to somewhere nice",                # unknown destination
+    "Mike, hack the cameras at the office",
+])
+def test_everything_else_goes_to_the_model(mission, text):
+    assert parse_command(text, mission.resolver) is None
+
+
+def test_lookup_is_exact_only(mission):
+    assert mission.resolver.lookup("dock 4") == "docking_bay_4"
+    assert mission.resolver.lookup("Harbour Master Office") is None
@@ -0,0 +1,68 @@
+from uge.context import LEDGER_ACK, MissionContext, estimate_tokens, ledger_line
+
+
+def play(ctx, turns):
+    for i in range(turns):
+        ctx.record(f"order {i}", f"prompt {i}", f"reply {i}",
+                   {"time": 60 - i, "locations": {"SAM": "dock"}, "completed": []})
+
+
+def texts(contents):
+    return [c["parts"][0] for c in contents]
+
+
+def test_window_keeps_recent_turns_verbatim():
+    ctx = MissionContext("SYSTEM", max_turns=3, token_budget=0)
+    play(ctx, 5)
+    assert [t["seq"] for t in ctx.turns] == [3, 4, 5]
+    assert len(ctx.ledger) == 2
+    contents = texts(ctx.build_contents("now"))
+    assert contents[0] == "SYSTEM"
+    assert "T1 [60m] CMD: \"order 0\" -> SAM@dock | DONE: none" in contents[2]
+    assert contents[3] == LEDGER_ACK
+    assert contents[4:] == ["prompt 2", "reply 2", "prompt 3", "reply 3", "prompt 4", "reply 4", "now"]
+
+
+def test_ledger_line_clips_long_orders():
+    line = ledger_line({"seq": 7, "order": "go " * 100, "facts": {}})
+    assert line.startswith("T7 [?m] CMD: \"go go")
+    assert "...\"" in line and len(line) < 200
+
+
+def test_budget_folds_turns_then_drops_ledger_lines():
+    ctx = MissionContext("SYSTEM " * 40, max_turns=6, token_budget=120)
+    for i in range(6):
+        ctx.record(f"order {i}", "p" * 80, "r" * 80, {"time": i})
+    contents = ctx.build_contents("now")
+    assert MissionContext.count_tokens(contents) <= 120
+    assert texts(contents)[0] == "SYSTEM " * 40   # pinned, never cut
+    assert texts(contents)[-1] == "now"
+    assert ctx.dropped > 0
+    assert "earlier turns omitted" in texts(contents)[2]
+
+
+def test_ledger_is_capped_however_long_the_mission_runs():
+    ctx = MissionContext("SYSTEM", max_turns=2, token_budget=0, max_ledger=5)
+    play(ctx, 200)
+    assert len(ctx.ledger) == 5 and ctx.dropped == 193
+    assert ctx.ledger[0].startswith("T194 ")
+    assert "... 193 earlier turns omitted ..." in texts(ctx.build_contents("now"))[2]
+    saved = ctx.to_dict()
+    saved["ledger"] = [f"line {i}" for i in range(8)]   # written before the cap
+    restored = MissionContext.from_dict("SYSTEM", saved)
+    assert restored.ledger == ["line 3", "line 4", "line 5", "line 6", "line 7"]
+    assert restored.dropped == 196
+
+
+def test_round_trip_through_plain_data():
+    ctx = MissionContext("SYSTEM", max_turns=2)
+    play(ctx, 4)
+    restored = MissionContext.from_dict("SYSTEM", ctx.to_dict())
+    assert restored.build_contents("now") == ctx.build_contents("now")
+    restored.record("next", "p", "r", {})
+    assert restored.seq == 5
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("x" * 400) == 101
@@ -0,0 +1,145 @@
+import threading
+
+from conftest import wait_until
+from uge.credentials import FALLBACK_OPERATIVE, CredentialStore
+from uge.fakes import FakeFirestoreClient
+
+
+class Doc:
+    def __init__(self, data):
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Users:
+    """The two reads ``CredentialStore`` makes on the ``users`` collection."""
+
+    FieldFilter = FakeFirestoreClient.FieldFilter
+
+    def __init__(self, *records):
+        self.records = list(records)
+        self.streams = 0
+        self.queries = 0
+        self._match = None
+        # Set to hold ``stream()`` open until released
+        self.gate = None
+
+    def collection(self, name):
+        assert name == "users"
+        return self
+
+    def stream(self):
+        self.streams += 1
+        if self.gate is not None:
+            self.gate.wait(2)
+        return [Doc(r) for r in self.records]
+
+    def where(self, filter):
+        assert filter.op_string == "=="
+        self._match = (filter.field_path, filter.value)
+        return self
+
+    def limit(self, n):
+        return self
+
+    def get(self):
+        self.queries += 1
+        field, value = self._match
+        return [Doc(r) for r in self.records if r.get(field) == value][:1]
+
+
+def user(name, **extra):
+    return {"username": name, "full_name": name.title(), "password": "$2b$hash",
+            "email": f"{name}@gundogs.test", "role": "Recruit", **extra}
+
+
+def test_snapshot_streams_once_per_ttl():
+    now = [0.0]
+    db = Users(user("sam"))
+    store = CredentialStore(db, ttl=300, clock=lambda: now[0])
+    assert store.snapshot()["usernames"]["sam"]["name"] == "Sam"
+    store.snapshot()
+    assert db.streams == 1
+    now[0] = 301
+    store.snapshot()
+    assert db.streams == 2
+
+
+def test_snapshot_copies_are_private():
+    store = CredentialStore(Users(user("sam")))
+    store.snapshot()["usernames"]["sam"]["failed_login_attempts"] = 3
+    assert "failed_login_attempts" not in store.snapshot()["usernames"]["sam"]
+
+
+def test_empty_roster_falls_back():
+    assert CredentialStore(Users()).snapshot()["usernames"] == FALLBACK_OPERATIVE
+
+
+def test_record_merges_partial_updates_and_bumps_version():
+    store = CredentialStore(Users(user("sam")))
+    store.snapshot()
+    version = store.version
+    store.record({"username": "sam", "password": "$2b$new"})
+    assert store.get("sam") == {"name": "Sam", "password": "$2b$new",
+                                "email": "sam@gundogs.test", "role": "Recruit"}
+    assert store.version == version + 1
+    assert store.record({"password": "orphan"}) is None
+
+
+def test_lookup_folds_in_an_operative_enlisted_elsewhere():
+    db = Users(user("sam"))
+    store = CredentialStore(db)
+    store.snapshot()
+    db.records.append(user("dave"))
+    assert store.get("dave") is None
+    assert store.lookup("dave")["email"] == "dave@gundogs.test"
+    assert "dave" in store.snapshot()["usernames"]
+    assert db.streams == 1 and db.queries == 1
+    assert store.lookup("nobody") is None
+    assert store.lookup("") is None and db.queries == 2
+
+
+def test_find_by_email_and_invalidate():
+    db = Users(user("sam"))
+    store = CredentialStore(db)
+    store.snapshot()
+    assert store.find_username_by_email("sam@gundogs.test") == "sam"
+    store.invalidate("sam")
+    assert store.get("sam") is None
+    store.invalidate()
+    store.snapshot()
+    assert db.streams == 2 and store.get("sam") is not None
+
+
+def test_concurrent_snapshots_stream_once():
+    db = Users(*(user(f"op{i}") for i in range(50)))
+    store = CredentialStore(db)
+    threads = [threading.Thread(target=store.snapshot) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert db.streams == 1
+
+
+def test_reload_streams_outside_the_lock():
+    now = [0.0]
+    db = Users(user("sam"))
+    store = CredentialStore(db, ttl=300, clock=lambda: now[0])
+    store.snapshot()
+    now[0] = 301
+    db.gate = threading.Event()
+    reload = threading.Thread(target=store.snapshot)
+    reload.start()
+    assert wait_until(lambda: db.streams == 2)
+    # Writes and the stale roster are served while the stream is held open
+    store.record(user("dave"))
+    store.invalidate("sam")
+    assert "dave" in store.snapshot()["usernames"]
+    db.gate.set()
+    reload.join()
+    assert db.streams == 2
+    # What landed mid-stream outranks what the stream read
+    assert store.get("dave") is not None and store.get("sam") is None
@@ -0,0 +1,48 @@
+import pytest
+
+from uge.credentials import CredentialStore
+from uge.enlistment import EnlistmentConflict, EnlistmentService, RecoveryMismatch
+
+
+@pytest.fixture
+def service(db):
+    service = EnlistmentService(db, CredentialStore(db), lambda password: f"hashed:{password}")
+    for name in ("alice", "bob"):
+        service.get(service.enlist({"email": f"{name}@gundogs.test", "username": name,
+                                    "full_name": name.title(), "role": "Recruit"}, "pw")).result()
+    return service
+
+
+def test_duplicate_enlistment_is_refused(service):
+    request = service.enlist({"email": "alice@gundogs.test", "username": "alice2"}, "pw")
+    with pytest.raises(EnlistmentConflict):
+        service.get(request).result()
+    request = service.enlist({"email": "new@gundogs.test", "username": "bob"}, "pw")
+    with pytest.raises(EnlistmentConflict):
+        service.get(request).result()
+
+
+def test_reset_with_mismatched_username_touches_nobody(service, db):
+    store = service._store
+    request = service.reset_password("alice@gundogs.test", "bob", "new")
+    with pytest.raises(RecoveryMismatch):
+        service.get(request).result()
+    assert store.get("bob")["password"] == "hashed:pw"
+    assert db.collection("users").document("alice@gundogs.test").get().to_dict()["password"] == "hashed:pw"
+
+
+def test_reset_updates_document_and_roster(service, db):
+    assert service.get(service.reset_password("alice@gundogs.test", "Alice", "new")).result() == "alice"
+    assert service._store.get("alice")["password"] == "hashed:new"
+    assert db.collection("users").document("alice@gundogs.test").get().to_dict()["password"] == "hashed:new"
+
+
+def test_enlistment_lands_in_the_roster_without_a_reload(service, db):
+    version = service._store.version
+    request = service.enlist({"email": "carol@gundogs.test", "username": "carol",
+                              "full_name": "Carol", "role": "Recruit"}, "pw")
+    assert service.get(request).result()["username"] == "carol"
+    assert service._store.get("carol")["password"] == "hashed:pw"
+    assert service._store.version > version
+    service.release(request)
+    assert service.get(request) is None
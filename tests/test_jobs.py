@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from uge.jobs import DONE, FAILED, QUEUED, RUNNING, TurnDispatcher
+
+
+def test_job_streams_then_collects():
+    dispatcher = TurnDispatcher(max_workers=2)
+    fed, release = threading.Event(), threading.Event()
+
+    def turn(job, text):
+        job.feed(text)
+        fed.set()
+        release.wait(2)
+        return text
+
+    job = dispatcher.submit("sam", turn, "SAM: Moving. DAVE: Covering.")
+    assert fed.wait(2)
+    assert job.status == RUNNING and not job.done()
+    assert job.segments() == [("SAM", "Moving."), ("DAVE", "Covering.")]
+    assert dispatcher.in_flight() == 1
+    release.set()
+    assert job.future.result(2) == "SAM: Moving. DAVE: Covering."
+    assert job.status == DONE and job.result() == "SAM: Moving. DAVE: Covering."
+    assert dispatcher.get(job.id) is job
+    dispatcher.release(job.id)
+    assert dispatcher.get(job.id) is None and dispatcher.in_flight() == 0
+
+
+def test_worker_errors_surface_on_collect():
+    dispatcher = TurnDispatcher(max_workers=1)
+
+    def turn(job):
+        raise TimeoutError("model timed out")
+
+    job = dispatcher.submit("sam", turn)
+    job.future.exception(2)
+    assert job.status == FAILED
+    with pytest.raises(TimeoutError):
+        job.result()
+
+
+def test_jobs_wait_for_a_free_worker():
+    dispatcher = TurnDispatcher(max_workers=1)
+    release = threading.Event()
+    first = dispatcher.submit("sam", lambda job: release.wait(2))
+    second = dispatcher.submit("dave", lambda job: None)
+    assert second.status == QUEUED
+    release.set()
+    second.future.result(2)
+    assert first.done() and second.done()
+
+
+def test_uncollected_jobs_are_pruned_after_retention():
+    dispatcher = TurnDispatcher(max_workers=1, retention=0.01)
+    abandoned = dispatcher.submit("closed-tab", lambda job: "text")
+    abandoned.future.result(2)
+    running = dispatcher.submit("sam", lambda job: time.sleep(0.05))
+    time.sleep(0.02)
+    dispatcher.submit("dave", lambda job: None)
+    assert dispatcher.get(abandoned.id) is None
+    assert dispatcher.get(running.id) is running   # unfinished jobs are never pruned
@@ -0,0 +1,45 @@
+import pytest
+
+from uge.locations import LocationResolver, normalize
+from uge.mission import PointOfInterest
+
+
+@pytest.mark.parametrize("text, poi_id", [
+    ("Docking Bay 4", "docking_bay_4"),
+    ("the freighter", "the_freighter"),
+    ("harbor_master", "harbor_master"),
+    ("office", "harbor_master"),                      # exact alias
+    ("Harbour Master Office", "harbor_master"),       # typo
+    ("Harbor Master Office roof", "harbor_master"),   # name inside text
+    ("behind the container stacks", "container_stacks"),
+    ("near the gas station pumps", "fueling_station"),  # multi-word alias inside text
+])
+def test_resolves(mission, text, poi_id):
+    assert mission.resolver.resolve(text) == poi_id
+
+
+@pytest.mark.parametrize("text", [
+    "moving toward the local market",
+    "En route to Docking Bay 4",
+    "heading to north gate",
+    "the office block",
+    "that ship over there",
+    "target acquired",
+    "somewhere nice",
+    "",
+    None,
+])
+def test_rejects_loose_or_in_transit_text(mission, text):
+    assert mission.resolver.resolve(text) is None
+
+
+def test_names_win_over_aliases(mission):
+    pois = {poi_id: mission.pois[poi_id] for poi_id in ("harbor_master", "north_gate")}
+    clash = PointOfInterest("decoy", "Decoy", (0.0, 0.0), None, None, aliases=("harbor master office",))
+    resolver = LocationResolver({"decoy": clash, **pois})
+    assert resolver.resolve("Harbor Master Office") == "harbor_master"
+    assert resolver.resolve("decoy") == "decoy"
+
+
+def test_normalize():
+    assert normalize("The Harbor-Master  Office.") == "harbor master office"
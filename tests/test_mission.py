@@ -0,0 +1,59 @@
+import dataclasses
+
+import pytest
+
+from conftest import MISSION_FILE
+from uge.mission import MissionCompileError, compile_mission
+
+
+def test_compiles_an_indexed_model(mission):
+    assert mission.designator == "Operation Clearwater"
+    assert mission.pois["harbor_master"].name == "Harbor Master Office"
+    assert "office" in mission.pois["harbor_master"].aliases
+    assert isinstance(mission.pois["docking_bay_4"].coords[0], float)
+    assert set(mission.squad) == {"SAM", "DAVE", "MIKE"}
+    assert mission.objectives["obj_transport_munitions"].dependencies == (
+        "obj_enter_container", "obj_acquire_transport")
+    assert mission.dependents["obj_identify_container"] == ("obj_enter_container",)
+    assert "Harbor Master Office (Aliases: office" in mission.system_instruction
+
+
+def test_structured_instruction_drops_the_data_suffix(mission):
+    assert "[LOC_DATA:" in mission.system_instruction
+    assert "[OBJ_DATA:" in mission.system_instruction
+    assert "LOC_DATA" not in mission.structured_instruction
+    assert "OBJ_DATA" not in mission.structured_instruction
+    assert "completed_objectives" in mission.structured_instruction
+    assert "Harbor Master Office (Aliases: office" in mission.structured_instruction
+
+
+def test_model_is_immutable(mission):
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        mission.theater = "elsewhere"
+    with pytest.raises(TypeError):
+        mission.pois["new"] = None
+
+
+def test_checklist_is_a_fresh_copy(mission):
+    checklist = mission.initial_objectives()
+    checklist["obj_identify_container"] = True
+    assert mission.initial_objectives()["obj_identify_container"] is False
+
+
+def test_recompiling_the_same_file_is_equal():
+    first, second = compile_mission(MISSION_FILE), compile_mission(MISSION_FILE)
+    assert first == second
+    assert first.fingerprint == second.fingerprint
+
+
+@pytest.mark.parametrize("xml, problem", [
+    ("<mission><intent", "mission_bad.xml"),
+    ("<mission/>", "missing <intent>"),
+    ("<mission><intent/></mission>", "missing <win_condition>"),
+    ("<mission><intent><win_condition/></intent></mission>", "no <poi>"),
+])
+def test_broken_files_raise_compile_errors(tmp_path, xml, problem):
+    path = tmp_path / "mission_bad.xml"
+    path.write_text(xml)
+    with pytest.raises(MissionCompileError, match=problem):
+        compile_mission(str(path))
@@ -0,0 +1,54 @@
+from uge.mission import Objective
+from uge.objectives import DONE, LOCKED, OPEN, ObjectiveTracker, validate_objectives
+
+
+def test_frontier_unlocks_on_all_dependencies(mission):
+    tracker = ObjectiveTracker(mission)
+    assert tracker.status("obj_transport_munitions") == LOCKED
+    assert tracker.complete("obj_identify_container", at=55) == ["obj_enter_container"]
+    assert tracker.complete("obj_acquire_transport") == []
+    assert tracker.complete("obj_enter_container") == ["obj_transport_munitions"]
+    assert tracker.status("obj_transport_munitions") == OPEN
+    assert tracker.completed_at == {"obj_identify_container": 55}
+
+
+def test_complete_is_idempotent_and_ignores_unknown(mission):
+    tracker = ObjectiveTracker(mission)
+    tracker.complete("obj_identify_container")
+    assert tracker.complete("obj_identify_container") == []
+    assert tracker.complete("obj_nope") == []
+    assert tracker.frontier()[DONE] == ["obj_identify_container"]
+
+
+def test_caches_invalidate_on_completion(mission):
+    tracker = ObjectiveTracker(mission)
+    before = tracker.prompt_summary()
+    assert "obj_enter_container:LOCKED(needs obj_identify_container)" in before
+    tracker.complete("obj_identify_container")
+    assert "obj_enter_container:OPEN" in tracker.prompt_summary()
+    assert ("obj_identify_container", "Identify Container", DONE) in tracker.checklist()
+
+
+def test_from_checklist_restores_times(mission):
+    tracker = ObjectiveTracker.from_checklist(
+        mission, {"obj_identify_container": True, "obj_acquire_transport": False},
+        completed_at={"obj_identify_container": 50, "obj_acquire_transport": 40})
+    assert tracker.done == {"obj_identify_container"}
+    assert tracker.status("obj_enter_container") == OPEN
+    assert tracker.completed_at == {"obj_identify_container": 50}
+
+
+def test_validate_reports_cycles_and_bad_references():
+    objectives = {
+        "a": Objective("a", "", dependencies=("b",)),
+        "b": Objective("b", "", dependencies=("a",), location_trigger="nowhere"),
+        "c": Objective("c", "", dependencies=("missing",)),
+    }
+    problems = validate_objectives(objectives, poi_ids={"dock"})
+    assert any("cycle among: a, b" in p for p in problems)
+    assert any("unknown objective 'missing'" in p for p in problems)
+    assert any("unknown location 'nowhere'" in p for p in problems)
+
+
+def test_shipped_mission_is_sound(mission):
+    assert validate_objectives(mission.objectives, set(mission.pois)) == []
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from conftest import wait_until
+from uge import persistence
+from uge.persistence import MissionStateWriter
+
+
+class Flaky:
+    """Makes the fake client's next ``failures`` writes raise."""
+
+    def __init__(self, db, failures):
+        self.failures = failures
+        self._set = db._set
+        db._set = self
+
+    def __call__(self, path, data, merge):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("firestore unavailable")
+        self._set(path, data, merge)
+
+
+def test_saves_coalesce_into_one_commit(db):
+    writer = MissionStateWriter(db, debounce=0.05)
+    for i in range(5):
+        writer.save("sam", "panama", fields={"mission_time": 60 - i}, messages=[{"n": i}], start_seq=i)
+    writer.flush()
+    data = writer.load("sam", "panama")
+    assert data["mission_time"] == 56
+    assert data["messages"] == [{"n": i} for i in range(5)]
+    assert data["message_count"] == 5
+    assert db.batch_commits == 1
+
+
+def test_debounce_does_not_hold_pool_threads(db):
+    # One worker, 40 missions, 0.2 s debounce: sleeping in the worker would take ~8 s
+    writer = MissionStateWriter(db, debounce=0.2, max_workers=1)
+    started = time.monotonic()
+    for i in range(40):
+        writer.save(f"op{i}", "panama", fields={"n": i})
+    assert wait_until(lambda: len(list(db.collection("mission_states").stream())) == 40, timeout=3)
+    assert time.monotonic() - started < 2
+
+
+def test_failed_flush_is_retried_without_another_save(db, monkeypatch):
+    monkeypatch.setattr(persistence, "RETRY_BASE_SECONDS", 0.01)
+    Flaky(db, failures=2)
+    writer = MissionStateWriter(db, debounce=0)
+    writer.save("sam", "panama", fields={"viability": 80}, messages=[{"n": 0}])
+    assert wait_until(lambda: writer.load("sam", "panama") is not None)
+    assert writer.load("sam", "panama")["messages"] == [{"n": 0}]
+
+
+def test_requeue_keeps_newer_fields(db, monkeypatch):
+    monkeypatch.setattr(persistence, "RETRY_BASE_SECONDS", 0.05)
+    Flaky(db, failures=1)
+    writer = MissionStateWriter(db, debounce=0)
+    writer.save("sam", "panama", fields={"viability": 80, "mission_time": 59})
+    time.sleep(0.02)   # first flush fails
+    writer.save("sam", "panama", fields={"viability": 70})
+    writer.flush()
+    assert wait_until(lambda: (writer.load("sam", "panama") or {}).get("viability") == 70)
+    assert writer.load("sam", "panama")["mission_time"] == 59
+
+
+def test_delete_waits_for_inflight_flush(db):
+    writer = MissionStateWriter(db, debounce=0)
+    entered, release = threading.Event(), threading.Event()
+    real_set = db._set
+
+    def slow_set(path, data, merge):
+        entered.set()
+        release.wait(2)
+        real_set(path, data, merge)
+
+    db._set = slow_set
+    writer.save("sam", "panama", fields={"mission_complete": True}, messages=[{"n": 0}])
+    assert entered.wait(2)
+    writer.delete("sam", "panama")   # the flush above is mid-commit
+    assert writer.load("sam", "panama") is None
+    release.set()
+    db._set = real_set
+    writer.flush()
+    time.sleep(0.05)
+    writer.flush()
+    assert writer.load("sam", "panama") is None
+    assert db._docs == {}
+
+
+def test_save_after_delete_starts_a_fresh_mission(db):
+    writer = MissionStateWriter(db, debounce=0.05)
+    writer.save("sam", "panama", fields={"mission_complete": True}, messages=[{"n": 0}, {"n": 1}])
+    writer.flush()
+    writer.delete("sam", "panama")
+    writer.save("sam", "panama", fields={"mission_time": 60}, messages=[{"briefing": True}])
+    writer.flush()
+    data = writer.load("sam", "panama")
+    assert "mission_complete" not in data
+    assert data["messages"] == [{"briefing": True}]
+
+
+def test_failed_writes_of_a_deleted_mission_are_dropped(db, monkeypatch):
+    monkeypatch.setattr(persistence, "RETRY_BASE_SECONDS", 0.01)
+    flaky = Flaky(db, failures=1)
+    writer = MissionStateWriter(db, debounce=0)
+    entered = threading.Event()
+    real_call = flaky.__call__
+
+    def failing_after_delete(path, data, merge):
+        entered.set()
+        time.sleep(0.05)
+        real_call(path, data, merge)
+
+    db._set = failing_after_delete
+    writer.save("sam", "panama", fields={"old": True})
+    assert entered.wait(2)
+    writer.delete("sam", "panama")
+    writer.flush()
+    time.sleep(0.1)
+    writer.flush()
+    assert writer.load("sam", "panama") is None
+
+
+def test_fake_client_supplies_the_timestamp(db):
+    writer = MissionStateWriter(db, debounce=0)
+    writer.save("sam", "panama", fields={"n": 1})
+    writer.flush()
+    assert writer.load("sam", "panama")["last_saved"] is not None
+
+
+@pytest.mark.parametrize("attempts, delay", [(1, 0.5), (2, 1.0), (20, persistence.RETRY_MAX_SECONDS)])
+def test_retry_backoff(db, attempts, delay):
+    assert MissionStateWriter(db)._retry_delay(attempts) == delay
@@ -0,0 +1,107 @@
+import threading
+
+from uge.llm import (CACHE_RETRY_AFTER_SECONDS, GeminiPrefixCache, LocalPrefixCache, PromptPrefix,
+                     min_cache_tokens)
+
+PREFIX = PromptPrefix.for_mission("panama", "briefing " * 2000)
+
+
+class Cached:
+    def __init__(self, n):
+        self.name = f"cachedContents/{n}"
+        self.updates = 0
+
+    def update(self, ttl):
+        self.updates += 1
+
+
+class RecordingCache(GeminiPrefixCache):
+    def __init__(self, fail=False, release=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = fail
+        self.release = release
+        self.creates = 0
+
+    def _create(self, prefix):
+        self.creates += 1
+        if self.release is not None:
+            self.release.wait(2)
+        if self.fail:
+            raise RuntimeError("cached content too small")
+        return Cached(self.creates)
+
+
+def test_prefix_is_registered_once_and_shared():
+    cache = RecordingCache()
+    first = cache.get(PREFIX)
+    assert cache.get(PREFIX) is first
+    assert cache.get(PromptPrefix.for_mission("panama", "briefing " * 2000)) is first
+    assert cache.creates == 1 and cache.hits == 2
+
+
+def test_cache_is_extended_before_it_expires():
+    now = [0.0]
+    cache = RecordingCache(ttl_seconds=3600, clock=lambda: now[0])
+    cached = cache.get(PREFIX)
+    now[0] = 3500   # inside the refresh margin
+    assert cache.get(PREFIX) is cached
+    assert cached.updates == 1 and cache.creates == 1
+
+
+def test_failed_create_falls_back_inline_and_backs_off():
+    now = [0.0]
+    cache = RecordingCache(fail=True, clock=lambda: now[0])
+    assert cache.get(PREFIX) is None
+    assert cache.get(PREFIX) is None
+    assert cache.creates == 1
+    now[0] = CACHE_RETRY_AFTER_SECONDS + 1
+    cache.get(PREFIX)
+    assert cache.creates == 2
+
+
+def test_local_cache_counts_reuse():
+    cache = LocalPrefixCache()
+    assert cache.get(PREFIX) is None
+    cache.get(PREFIX)
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_undersized_prefix_never_calls_the_api():
+    cache = RecordingCache(model_name="models/gemini-2.0-flash-001")
+    small = PromptPrefix.for_mission("panama", "x" * 4000)   # ~1k tokens
+    assert cache.get(small) is None
+    assert cache.get(small) is None
+    assert cache.creates == 0
+    assert cache.skipped == 2
+
+
+def test_undersized_prefix_is_reported_once(caplog):
+    cache = RecordingCache(model_name="models/gemini-2.0-flash-001")
+    small = PromptPrefix.for_mission("panama", "x" * 4000)
+    with caplog.at_level("WARNING", logger="uge.llm"):
+        assert cache.check(small) is False
+        cache.get(small)
+        cache.check(small)
+    assert len(caplog.records) == 1
+    assert cache.check(PromptPrefix.for_mission("big", "x" * 20000)) is True
+    assert LocalPrefixCache().check(small) is True
+
+
+def test_other_callers_do_not_wait_on_a_create():
+    release = threading.Event()
+    cache = RecordingCache(release=release)
+    creator = threading.Thread(target=cache.get, args=(PREFIX,))
+    creator.start()
+    while cache.creates == 0:
+        pass
+    assert cache.get(PREFIX) is None   # inline while the create is in flight
+    release.set()
+    creator.join()
+    assert cache.get(PREFIX).name == "cachedContents/1"
+    assert cache.creates == 1
+
+
+def test_min_cache_tokens_by_model():
+    assert min_cache_tokens("models/gemini-2.0-flash-001") == 4096
+    assert min_cache_tokens("gemini-2.5-flash-lite") == 1024
+    assert min_cache_tokens("gemini-1.5-pro-002") == 32768
@@ -0,0 +1,93 @@
+import pytest
+
+from uge.context import MissionContext
+from uge.response_cache import (FirestoreResponseTier, ReplayMiss, ResponseCache, TranscriptRecorder,
+                                load_transcript, normalize_command, response_key, state_snapshot)
+
+STATE = {"mission_time": 58, "viability": 100, "locations": {"SAM": "north_gate"},
+         "objectives": {"obj_identify_container": False}, "discovered_locations": ["north_gate"]}
+
+
+def test_lru_and_ttl():
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")          # evicts b, the least recently used
+    assert cache.get("b") is None
+    now[0] = 11
+    assert cache.get("a") is None
+    assert cache.hits == 1 and cache.misses == 2
+
+
+def key(state, command="Dave, move to the north gate"):
+    return response_key("panama", "f1ng3r", "tagged", state_snapshot(state), command)
+
+
+def test_key_follows_state_and_normalized_command():
+    assert key(STATE) == key(dict(STATE), "  dave, MOVE to the north gate!")
+    assert key(STATE) != key(dict(STATE, mission_time=57))
+    assert key(STATE) != key(dict(STATE, locations={"SAM": "the_freighter"}))
+    context = MissionContext("SYSTEM")
+    context.record("go", "prompt", "reply", {})
+    assert key(STATE) != key(dict(STATE, mission_context=context))
+
+
+def test_transcript_replays_without_the_model(tmp_path):
+    path = str(tmp_path / "transcript.jsonl")
+    recorder = TranscriptRecorder(path)
+    recorder.record("k1", "Report in", "SAM: Copy.", turn=1)
+    recorder.record("k2", "Dave, move", "DAVE: Moving.", turn=2)
+    now = [0.0]
+    cache = ResponseCache(max_entries=1, ttl=10, strict=True, clock=lambda: now[0])
+    cache.preload((t["key"], t["text"]) for t in load_transcript(path))
+    now[0] = 1000   # pinned entries ignore the TTL and the LRU bound
+    assert cache.get("k1") == "SAM: Copy." and cache.get("k2") == "DAVE: Moving."
+    with pytest.raises(ReplayMiss):
+        cache.get("k3")
+
+
+def test_persistent_tier_is_shared_between_instances(db):
+    now = [1000.0]
+    first = ResponseCache(persistent=FirestoreResponseTier(db, ttl=60, clock=lambda: now[0]))
+    second = ResponseCache(persistent=FirestoreResponseTier(db, ttl=60, clock=lambda: now[0]))
+    first.put("k", "SAM: Copy.", meta={"mission_id": "panama"})
+    assert second.get("k") == "SAM: Copy."
+    now[0] += 61
+    assert ResponseCache(persistent=FirestoreResponseTier(db, ttl=60, clock=lambda: now[0])).get("k") is None
+
+
+def test_get_local_never_reads_the_persistent_tier(db):
+    reads = []
+
+    class Counting(FirestoreResponseTier):
+        def get(self, key):
+            reads.append(key)
+            return super().get(key)
+
+    tier = Counting(db)
+    tier.put("k", "SAM: Copy.")
+    cache = ResponseCache(persistent=tier)
+    assert cache.get_local("k") is None
+    assert reads == [] and cache.misses == 0
+    assert cache.get("k") == "SAM: Copy."   # the worker's read...
+    assert cache.get_local("k") == "SAM: Copy."   # ...warms memory for the script thread
+    assert reads == ["k"]
+
+
+def test_broken_persistent_tier_never_fails_a_turn():
+    class Broken:
+        def get(self, key):
+            raise ConnectionError()
+
+        def put(self, key, text, meta=None):
+            raise ConnectionError()
+
+    cache = ResponseCache(persistent=Broken())
+    cache.put("a", "A")
+    assert cache.get("b") is None
+
+
+def test_normalize_command():
+    assert normalize_command("  Report IN, team!! ") == "report in, team"
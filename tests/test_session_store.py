@@ -0,0 +1,75 @@
+import pytest
+
+from uge.context import MissionContext
+from uge.objectives import ObjectiveTracker
+from uge.persistence import MissionStateWriter
+from uge.session_store import (InMemorySessionStore, open_session_store, restore_session,
+                               snapshot_session)
+
+
+def session(mission):
+    context = MissionContext(mission.system_instruction, max_turns=2)
+    for i in range(3):
+        context.record(f"order {i}", f"prompt {i}", f"reply {i}", {"time": 60 - i})
+    tracker = ObjectiveTracker(mission)
+    tracker.complete("obj_identify_container", at=55)
+    return {
+        "mission_id": "panama",
+        "locations": {"SAM": "north_gate", "DAVE": "insertion_point", "MIKE": "insertion_point"},
+        "objectives": {"obj_identify_container": True},
+        "mission_time": 55,
+        "viability": 90,
+        "discovered_locations": ["north_gate"],
+        "queued_orders": ["Mike, hack the cameras"],
+        "local_events": [],
+        "objective_tracker": tracker,
+        "mission_context": context,
+        "pending_turn": {"prompt": "Dave, move to the stacks", "events": ["SAM moved to North Gate"]},
+        "messages": [{"role": "user", "content": "go"}],
+        "feed_block_cache": object(),   # render state is never persisted
+    }
+
+
+def test_round_trip_through_a_store(mission):
+    state = session(mission)
+    store = InMemorySessionStore()
+    store.save("sam", "panama", fields=snapshot_session(state), messages=state["messages"])
+    restored = restore_session(store.load("sam", "panama"), mission.system_instruction)
+
+    assert restored["locations"] == state["locations"]
+    assert restored["objective_times"] == {"obj_identify_container": 55}
+    assert restored["messages"] == state["messages"]
+    assert restored["objective_tracker"] is None and restored["pending_turn"] is None
+    # The turn that was in flight is resent by whoever restores the session
+    assert restored["queued_orders"] == ["Dave, move to the stacks", "Mike, hack the cameras"]
+    assert restored["local_events"] == ["SAM moved to North Gate"]
+    context = restored["mission_context"]
+    assert context.build_contents("next") == state["mission_context"].build_contents("next")
+
+
+def test_snapshot_is_detached_from_the_session(mission):
+    state = session(mission)
+    fields = snapshot_session(state)
+    state["locations"]["SAM"] = "the_freighter"
+    assert fields["unit_data"]["SAM"] == "north_gate"
+    assert "feed_block_cache" not in fields and "messages" not in fields
+
+
+def test_memory_store_only_takes_json():
+    store = InMemorySessionStore()
+    with pytest.raises(TypeError):
+        store.save("sam", "panama", fields={"when": object()})
+    store.save("sam", "panama", messages=[{"n": 0}, {"n": 1}])
+    store.save("sam", "panama", fields={"mission_time": 58}, messages=[{"n": 2}], start_seq=2)
+    data = store.load("sam", "panama")
+    assert data["messages"] == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert data["message_count"] == 3
+    store.delete("sam", "panama")
+    assert store.load("sam", "panama") is None
+
+
+def test_open_session_store(db):
+    assert isinstance(open_session_store("memory"), InMemorySessionStore)
+    assert isinstance(open_session_store("firestore", db=db), MissionStateWriter)
+    with pytest.raises(ValueError):
+        open_session_store("redis")
@@ -0,0 +1,61 @@
+import json
+
+from uge.sitrep import SitrepStream, parse_operative_dialogue, parse_turn, strip_data_suffix
+
+TAGGED = ('**SAM:** "Moving to the gate."\n**DAVE:** Covering.\nMIKE: Cameras looped.\n'
+          "[LOC_DATA: SAM=North Gate, DAVE=Container Stacks, MIKE=]\n[OBJ_DATA: obj_acquire_transport=TRUE]")
+
+
+def test_dialogue_is_split_and_cleaned():
+    assert parse_operative_dialogue('SAM: "Copy." DAVE: **Sure.** MIKE: ok') == {
+        "SAM": "Copy.", "DAVE": "Sure.", "MIKE": "ok"}
+
+
+def test_data_suffix_is_stripped():
+    assert strip_data_suffix(TAGGED).endswith("MIKE: Cameras looped.")
+
+
+def test_tagged_turn():
+    turn = parse_turn(TAGGED, win_trigger="Assets in Transit")
+    assert turn.locations == {"SAM": "North Gate", "DAVE": "Container Stacks"}
+    assert turn.completed_objectives == ("obj_acquire_transport",)
+    assert not turn.mission_complete
+    assert "[LOC_DATA" not in turn.clean_text
+    assert turn.dialogue["MIKE"] == "Cameras looped."
+
+
+def test_win_trigger_in_dialogue():
+    turn = parse_turn("SAM: Mission Complete: Assets in Transit", win_trigger="assets in transit")
+    assert turn.mission_complete
+
+
+def test_structured_turn():
+    text = json.dumps({"dialogue": {"SAM": "On it.", "DAVE": " "}, "locations": {"SAM": "Town Plaza"},
+                       "completed_objectives": ["obj__agency_handover"], "mission_complete": True})
+    turn = parse_turn(text, structured=True)
+    assert turn.structured
+    assert turn.dialogue == {"SAM": "On it."}
+    assert turn.locations == {"SAM": "Town Plaza"}
+    assert turn.mission_complete
+
+
+def test_structured_falls_back_to_tags():
+    turn = parse_turn(TAGGED, structured=True)
+    assert not turn.structured
+    assert turn.locations["SAM"] == "North Gate"
+
+
+def test_stream_matches_full_parse_at_any_chunking():
+    expected = list(parse_operative_dialogue(strip_data_suffix(TAGGED)).items())
+    for size in (1, 3, 7, 50):
+        stream = SitrepStream()
+        for i in range(0, len(TAGGED), size):
+            stream.feed(TAGGED[i:i + size])
+        assert stream.segments() == expected
+        assert stream.suffix().startswith("[LOC_DATA")
+
+
+def test_stream_holds_back_partial_tag():
+    stream = SitrepStream()
+    stream.feed("SAM: Holding. [LOC_")
+    assert stream.segments() == [("SAM", "Holding.")]
@@ -0,0 +1,49 @@
+import json
+import sys
+
+from uge.startup import StartupReport, current_release
+
+
+def ticking(step):
+    now = [0.0]
+
+    def clock():
+        now[0] += step
+        return now[0]
+    return clock
+
+
+def test_phases_and_imports_are_timed():
+    report = StartupReport(clock=ticking(0.5))
+    with report.phase("compile mission"):
+        pass
+    assert report.lazy_import("json") is json   # already loaded: not an uncached import
+    sys.modules.pop("colorsys", None)
+    report.lazy_import("colorsys")
+    assert [(p["kind"], p["name"], p["ms"]) for p in report.phases] == [
+        ("init", "compile mission", 500.0), ("import", "colorsys", 500.0)]
+    assert report.as_dict()["totals_ms"] == {"init": 500.0, "import": 500.0}
+
+
+def test_finish_writes_one_line_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("UGE_RELEASE", "uge-00042")
+    path = tmp_path / "startup.jsonl"
+    report = StartupReport(clock=ticking(0.25))
+    assert report.finish(str(path))
+    assert not report.finish(str(path))
+    (line,) = path.read_text().splitlines()
+    record = json.loads(line)
+    assert record["release"] == "uge-00042"
+    assert record["first_render_ms"] == 250.0
+
+
+def test_unwritable_report_path_is_not_fatal(tmp_path):
+    assert StartupReport().finish(str(tmp_path / "missing" / "startup.jsonl"))
+
+
+def test_release_falls_back_to_cloud_run_revision(monkeypatch):
+    monkeypatch.delenv("UGE_RELEASE", raising=False)
+    monkeypatch.setenv("K_REVISION", "uge-00007-abc")
+    assert current_release() == "uge-00007-abc"
+    monkeypatch.delenv("K_REVISION")
+    assert current_release() == "dev"
@@ -0,0 +1,35 @@
+import folium
+
+from uge.tactical_map import DYNAMIC_LAYER_NAME, build_base_map, build_dynamic_layer, detach_layer, token_coords
+
+
+def children(element, kind):
+    return [c for c in element._children.values() if type(c) is kind]
+
+
+def test_base_map_holds_every_poi_fogged(mission):
+    m = build_base_map(mission, mission.pois["insertion_point"].coords)
+    assert len(children(m, folium.Circle)) == len(mission.pois)
+    assert len(children(m, folium.Marker)) == len(mission.pois)
+    assert "[RECON REQUIRED]" in m.get_root().render()
+
+
+def test_dynamic_layer_has_tokens_and_recon_only(mission):
+    fg = build_dynamic_layer(mission, [("SAM", "docking_bay_4"), ("DAVE", "north_gate")],
+                             ["docking_bay_4", "nowhere"], image_url=lambda name: f"/img/{name}")
+    assert fg.layer_name == DYNAMIC_LAYER_NAME
+    assert len(children(fg, folium.Circle)) == 1
+    markers = children(fg, folium.Marker)
+    assert len(markers) == 3   # one recon overlay, two tokens
+    assert markers[1].location == token_coords(mission.pois["docking_bay_4"], "SAM")
+    assert token_coords(mission.pois["docking_bay_4"], "SAM") != list(mission.pois["docking_bay_4"].coords)
+
+
+def test_detached_layer_leaves_the_base_map_unchanged(mission):
+    m = build_base_map(mission, mission.pois["insertion_point"].coords)
+    before = list(m._children)
+    fg = build_dynamic_layer(mission, [("MIKE", "the_freighter")], [], image_url=str)
+    fg.add_to(m)   # what st_folium does with feature_group_to_add
+    detach_layer(m, fg)
+    assert list(m._children) == before
+    detach_layer(m, None)
@@ -0,0 +1,83 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from uge.tiles import (MBTilesBundle, TileCache, TileProxy, TileServer, export_static, lonlat_to_tile,
+                       seed_bundle)
+
+
+def test_disk_lru_evicts_oldest(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=20)
+    cache.put(1, 0, 0, b"x" * 8)
+    cache.put(1, 0, 1, b"y" * 8)
+    assert cache.get(1, 0, 0) == b"x" * 8   # now most recent
+    cache.put(1, 1, 0, b"z" * 8)
+    assert cache.get(1, 0, 1) is None
+    assert cache.get(1, 0, 0) is not None
+    assert not (tmp_path / "1" / "0" / "1").exists()
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    TileCache(str(tmp_path)).put(3, 2, 1, b"tile")
+    assert TileCache(str(tmp_path)).get(3, 2, 1) == b"tile"
+
+
+def test_lonlat_to_tile():
+    assert lonlat_to_tile(0.0, 0.0, 1) == (1, 1)
+    assert lonlat_to_tile(85.0, -179.9, 2) == (0, 0)
+
+
+JPEG = b"\xff\xd8\xff" + b"tile"
+
+
+def test_proxy_prefers_bundle_then_cache_then_upstream(tmp_path, mission):
+    bundle_path = str(tmp_path / "tiles.mbtiles")
+    seed_bundle(bundle_path, mission, lambda z, x, y: JPEG, zooms=(14,))
+    bundle = MBTilesBundle(bundle_path)
+    inside = bundle.tiles()[0]
+    upstream = []
+
+    def fetch(z, x, y):
+        upstream.append((z, x, y))
+        return JPEG
+    proxy = TileProxy(cache=TileCache(str(tmp_path / "cache")), bundles=[bundle], fetch=fetch)
+    assert proxy.get(*inside) == JPEG
+    assert proxy.get(3, 0, 0) == JPEG
+    assert proxy.get(3, 0, 0) == JPEG
+    assert upstream == [(3, 0, 0)]
+    assert {k: proxy.stats()[k] for k in ("bundle", "cache", "upstream")} == {
+        "bundle": 1, "cache": 1, "upstream": 1}
+    bundle.close()
+
+
+def test_offline_or_failed_upstream_is_a_miss(tmp_path):
+    def down(z, x, y):
+        raise OSError("unreachable")
+    assert TileProxy(fetch=down).get(1, 0, 0) is None
+    assert TileProxy().get(1, 0, 0) is None
+
+
+def test_seeded_bundle_exports_to_static_files(tmp_path, mission):
+    bundle_path = str(tmp_path / "tiles.mbtiles")
+    fetched = seed_bundle(bundle_path, mission, lambda z, x, y: JPEG, zooms=(14, 15))
+    assert fetched > 0
+    assert seed_bundle(bundle_path, mission, lambda z, x, y: JPEG, zooms=(14, 15)) == 0
+    assert export_static(bundle_path, str(tmp_path / "static")) == fetched
+    z, x, y = MBTilesBundle(bundle_path).tiles()[0]
+    assert (tmp_path / "static" / str(z) / str(x) / f"{y}.jpg").read_bytes() == JPEG
+
+
+def test_server_answers_tile_paths_only():
+    server = TileServer(TileProxy(fetch=lambda z, x, y: JPEG), port=0)
+    try:
+        assert server._server.server_address[0] == "127.0.0.1"   # loopback unless asked
+        base = f"http://127.0.0.1:{server.port}"
+        with urllib.request.urlopen(f"{base}/tiles/3/1/2") as response:
+            assert response.read() == JPEG
+            assert response.headers["Content-Type"] == "image/jpeg"
+            assert "Access-Control-Allow-Origin" not in response.headers
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{base}/etc/passwd")
+    finally:
+        server.close()
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from uge.tracing import JsonlSink, Tracer, payload_bytes, percentile
+
+
+@pytest.mark.parametrize("q, expected", [(50, 50), (95, 95), (100, 100), (1, 1)])
+def test_nearest_rank_percentile(q, expected):
+    assert percentile(list(range(100, 0, -1)), q) == expected
+
+
+def test_percentile_edges():
+    assert percentile([], 50) is None
+    assert percentile([7], 95) == 7
+    assert percentile([1, 2], 50) == 1
+
+
+def test_summary_over_a_rolling_window():
+    tracer = Tracer(window=10)
+    for ms in range(1, 21):
+        tracer.record("turn.model", ms)
+    assert tracer.summary() == {"turn.model": {"count": 10, "p50": 15, "p95": 20, "max": 20}}
+
+
+def test_spans_reach_the_sink_with_attributes(tmp_path):
+    now = [0.0]
+
+    def clock():
+        now[0] += 0.002
+        return now[0]
+
+    tracer = Tracer(sink=JsonlSink(str(tmp_path / "trace.jsonl")), clock=clock)
+    with tracer.span("persist.flush", docs=1) as span:
+        span.set(bytes=120)
+    with pytest.raises(KeyError):
+        with tracer.span("turn.parse"):
+            raise KeyError("SAM")
+    records = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()]
+    assert records[0]["span"] == "persist.flush"
+    assert records[0]["ms"] == 2.0
+    assert (records[0]["docs"], records[0]["bytes"]) == (1, 120)
+    assert records[1]["error"] == "KeyError"
+
+
+def test_broken_sink_never_raises(tmp_path):
+    JsonlSink(str(tmp_path / "missing" / "trace.jsonl")).write({"span": "x"})
+
+
+def test_payload_bytes():
+    assert payload_bytes(b"abc") == 3
+    assert payload_bytes("é") == 2
+    assert payload_bytes({"a": 1}) == len('{"a": 1}')
@@ -0,0 +1,5 @@
+"""UGE engine internals for the Gundogs C2 Streamlit app.
+
+Everything in here is plain Python with no Streamlit dependency, so it can be
+shared across sessions (via ``st.cache_resource``) and driven headlessly.
+"""
@@ -0,0 +1,211 @@
+"""After-action review engine.
+
+The debrief used to be the Python repr of the whole feed (recon markdown,
+image URLs, every SITREP) pushed through the live squad chat, parsed by the
+turn regexes and appended to the feed, all behind a spinner. The AAR now
+works from a compact, commander-centric transcript instead:
+
+* ``extract_transcript`` keeps only what the evaluation needs: each order
+  with its mission minute, the units it tasked and where they ended up,
+  idle spans per unit, and when each objective fell;
+* ``AAREngine`` sends it with its own instruction (no squad context, no
+  SITREP parsing). Long missions are summarized phase by phase first, and
+  the final review is written from the phase summaries;
+* the app runs it on the turn worker pool as soon as the win fires and the
+  worker saves ``aar_report`` itself, so a closed tab still gets its debrief.
+"""
+import re
+
+from uge.context import estimate_tokens
+
+DEFAULT_MISSION_MINUTES = 60
+# Orders per summarization chunk; a mission with more is reviewed phase by phase
+CHUNK_ORDERS = 40
+# Shorter gaps than this many orders aren't worth calling out
+IDLE_MIN_ORDERS = 3
+# Longest idle spans listed per unit; the rest are only counted
+IDLE_SPANS_LISTED = 5
+ORDER_CHARS = 160
+UNITS = ("SAM", "DAVE", "MIKE")
+
+# Lets the offline scripted model tell a debrief request from a squad turn
+AAR_MARKER = "[AAR_REQUEST]"
+
+PHASE_CONFIG = {"temperature": 0.2, "max_output_tokens": 256}
+REPORT_CONFIG = {"temperature": 0.4, "max_output_tokens": 900}
+
+AAR_INSTRUCTION = """Act as a Senior Tactical Officer conducting an After-Action Review (AAR) of a Mission Commander.
+You receive a compact log of the Commander's orders (mission minute, units tasked, resulting positions),
+idle spans per operative and objective completion times. Judge the Commander only, never the squad.
+
+Focus EXCLUSIVELY on the Commander's performance in these areas:
+1. MULTITASKING: Did they keep all three units (Sam, Dave, Mike) engaged, or were units left idle?
+2. INITIATIVE: Did the Commander push the pace, or were they reactive to the squad's banter?
+3. CLARITY: Were orders direct and objective-oriented, or vague?
+4. COORDINATION: Did they effectively use "Combined Arms" (e.g., ordering security while hacking)?
+
+Rate the Commander on:
+- Command Presence (Courage/Determination in decision making).
+- Operational Efficiency (Time vs. Objective completion).
+
+Provide one 'Sustained' (Leadership strength) and one 'Improve' (Command advice).
+End with a traditional Royal Marine sign-off."""
+
+PHASE_INSTRUCTION = """You are compiling notes for an After-Action Review of a Mission Commander.
+Summarize the Commander's decisions in this phase of the order log in at most five terse bullets:
+tempo, which operatives were tasked or left idle, clarity of orders, and any combined-arms moves.
+No praise, no advice, facts only."""
+
+_GROUP = re.compile(r"\b(?:all|everyone|everybody|team|squad)\b", re.IGNORECASE)
+_UNIT_NAMES = {unit: re.compile(rf"\b{unit}\b", re.IGNORECASE) for unit in UNITS}
+
+
+def addressed_units(order):
+    """Units an order tasks: those named, or the whole team when none (or the group) is."""
+    named = [unit for unit, pattern in _UNIT_NAMES.items() if pattern.search(order)]
+    if not named or _GROUP.search(order):
+        return list(UNITS)
+    return named
+
+
+def _clip(text, limit=ORDER_CHARS):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+# --- TRANSCRIPT ---
+def extract_transcript(messages, mission, objective_times=None, start_time=DEFAULT_MISSION_MINUTES,
+                       outcome=None):
+    """Compact, JSON-friendly record of how the mission was commanded.
+
+    ``objective_times`` is ``ObjectiveTracker.completed_at`` (mission clock
+    remaining at completion); ``outcome`` carries the end-of-mission figures
+    (time elapsed, viability, efficiency score...).
+    """
+    orders = []
+    for msg in messages:
+        if msg.get("role") == "user":
+            # Orders carry the clock they were given at; older saves fall back to one minute each
+            remaining = msg.get("t", start_time - len(orders) - 1)
+            text = msg.get("content", "")
+            orders.append({"min": start_time - remaining, "units": addressed_units(text),
+                           "order": _clip(text), "locations": None})
+        elif orders and msg.get("locations") and orders[-1]["locations"] is None:
+            orders[-1]["locations"] = dict(msg["locations"])
+
+    idle = {unit: [] for unit in UNITS}
+    for unit in UNITS:
+        run_start, count = None, 0
+        for order in orders + [None]:
+            if order is not None and unit not in order["units"]:
+                if run_start is None:
+                    run_start = order["min"]
+                count += 1
+                continue
+            if count >= IDLE_MIN_ORDERS:
+                end = order["min"] if order is not None else orders[-1]["min"]
+                idle[unit].append({"from": run_start, "to": end, "orders": count})
+            run_start, count = None, 0
+
+    objectives = []
+    for obj_id, obj in mission.objectives.items():
+        at = (objective_times or {}).get(obj_id)
+        objectives.append({"id": obj_id, "label": obj.label,
+                           "min": start_time - at if at is not None else None})
+
+    return {
+        "mission": mission.title or mission.designator,
+        "theater": mission.theater,
+        "outcome": dict(outcome or {}),
+        "orders": orders,
+        "idle": {unit: spans for unit, spans in idle.items() if spans},
+        "objectives": objectives,
+    }
+
+
+def order_lines(transcript):
+    lines = []
+    for order in transcript["orders"]:
+        tasked = "ALL" if len(order["units"]) == len(UNITS) else "+".join(order["units"])
+        line = f"+{order['min']:02d}m [{tasked}] \"{order['order']}\""
+        if order["locations"]:
+            line += " -> " + ", ".join(f"{u}@{loc}" for u, loc in order["locations"].items())
+        lines.append(line)
+    return lines
+
+
+def summary_lines(transcript):
+    """Header, objective times and idle spans: everything but the order log."""
+    outcome = ", ".join(f"{k}={v}" for k, v in transcript["outcome"].items())
+    lines = [f"MISSION: {transcript['mission']} ({transcript['theater']})",
+             f"OUTCOME: {outcome or 'n/a'} | ORDERS GIVEN: {len(transcript['orders'])}",
+             "OBJECTIVES:"]
+    for obj in transcript["objectives"]:
+        when = f"done at +{obj['min']}m" if obj["min"] is not None else "NOT COMPLETED"
+        lines.append(f"- {obj['label']}: {when}")
+    lines.append("IDLE SPANS:")
+    for unit, spans in transcript["idle"].items():
+        longest = sorted(spans, key=lambda span: span["to"] - span["from"], reverse=True)[:IDLE_SPANS_LISTED]
+        for span in sorted(longest, key=lambda span: span["from"]):
+            lines.append(f"- {unit}: +{span['from']}m to +{span['to']}m ({span['orders']} orders without tasking)")
+        if len(spans) > len(longest):
+            idle_minutes = sum(span["to"] - span["from"] for span in spans)
+            lines.append(f"- {unit}: {len(spans) - len(longest)} more spans ({idle_minutes}m idle in total)")
+    if not transcript["idle"]:
+        lines.append("- none")
+    return lines
+
+
+# --- ENGINE ---
+class AAREngine:
+    """Writes the debrief from a transcript; map-reduce over phases when it is long."""
+
+    def __init__(self, gateway, admission=None, user=None, tracer=None, chunk_orders=CHUNK_ORDERS):
+        self.gateway = gateway
+        self.admission = admission
+        self.user = user
+        self.tracer = tracer
+        self.chunk_orders = chunk_orders
+        self.calls = 0
+        self.prompt_tokens = 0
+
+    def _ask(self, instruction, body, config):
+        prompt = f"{AAR_MARKER}\n{instruction}\n\n{body}"
+        contents = [{"role": "user", "parts": [prompt]}]
+        tokens = estimate_tokens(prompt) + config["max_output_tokens"]
+        self.calls += 1
+        self.prompt_tokens += estimate_tokens(prompt)
+
+        def attempt():
+            return self.gateway.complete(contents, generation_config=config)
+
+        if self.admission is None:
+            return attempt()
+        return self.admission.run(self.user, attempt, tokens=tokens)
+
+    def _phases(self, lines):
+        notes = []
+        for start in range(0, len(lines), self.chunk_orders):
+            chunk = lines[start:start + self.chunk_orders]
+            note = self._ask(PHASE_INSTRUCTION, "ORDER LOG:\n" + "\n".join(chunk), PHASE_CONFIG)
+            notes.append(f"PHASE {len(notes) + 1} ({chunk[0].split(' ')[0]} to {chunk[-1].split(' ')[0]}):\n"
+                         f"{note.strip()}")
+        return notes
+
+    def review(self, transcript):
+        """The AAR text for ``transcript``."""
+        lines = order_lines(transcript)
+        if len(lines) > self.chunk_orders:
+            log = "PHASE NOTES:\n" + "\n\n".join(self._phases(lines))
+        else:
+            log = "ORDER LOG:\n" + ("\n".join(lines) or "(no orders given)")
+        body = "\n".join(summary_lines(transcript)) + "\n\n" + log
+        return self._ask(AAR_INSTRUCTION, body, REPORT_CONFIG).strip()
+
+    def run(self, transcript):
+        if self.tracer is None:
+            return self.review(transcript)
+        with self.tracer.span("aar.review", orders=len(transcript["orders"])) as span:
+            report = self.review(transcript)
+            span.set(calls=self.calls, prompt_tokens=self.prompt_tokens)
+            return report
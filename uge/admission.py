@@ -0,0 +1,299 @@
+"""Process-wide admission control in front of Gemini.
+
+Every session used to call the model as soon as its commander hit enter, so
+a busy evening meant quota errors surfacing mid-turn. ``AdmissionController``
+sits between the turn workers and the model:
+
+* two token buckets cap requests and tokens per minute;
+* waiting requests are served round-robin per user, so one commander firing
+  orders can't starve everybody else;
+* quota/availability errors are retried a bounded number of times with
+  jittered exponential backoff;
+* a circuit breaker stops sending while the provider keeps failing, and lets
+  a single trial request through once it has cooled down.
+
+A waiting request holds a ``Ticket``; ``status(ticket)`` gives its queue
+position and an ETA for the UI.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+from uge.startup import REPORT
+
+DEFAULT_RPM = 1000
+DEFAULT_TPM = 1_000_000
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 30.0
+# A request that can't get a slot in this long fails instead of waiting forever
+DEFAULT_MAX_WAIT = 180.0
+# Waiters re-check their deadline at least this often
+IDLE_POLL_SECONDS = 1.0
+
+# google.api_core exception names; resolved on first use so importing this module stays cheap
+RETRYABLE_ERRORS = (
+    "ResourceExhausted",     # 429 quota
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "InternalServerError",
+)
+_retryable_types = None
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a request waited ``max_wait`` seconds without a slot."""
+
+
+def is_retryable(exc):
+    global _retryable_types
+    if _retryable_types is None:
+        api_exceptions = REPORT.lazy_import("google.api_core.exceptions")
+        _retryable_types = tuple(getattr(api_exceptions, name) for name in RETRYABLE_ERRORS)
+    return isinstance(exc, _retryable_types)
+
+
+class TokenBucket:
+    """Refills at ``per_minute / 60`` units a second up to ``burst``. Not locked."""
+
+    def __init__(self, per_minute, burst=None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst if burst is not None else per_minute)
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until ``amount`` can be taken (0 if it can be now)."""
+        self._refill(now)
+        # An oversize request would never fit; let it through on a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures. Not locked."""
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def state(self, now):
+        if self.opened_at is None:
+            return CLOSED
+        if now - self.opened_at < self.reset_after:
+            return OPEN
+        return HALF_OPEN
+
+    def wait_time(self, now):
+        state = self.state(now)
+        if state == OPEN:
+            return self.reset_after - (now - self.opened_at)
+        if state == HALF_OPEN and self._trial:
+            # One probe at a time; the rest wait for its verdict
+            return self.reset_after
+        return 0.0
+
+    def admit(self, now):
+        if self.state(now) == HALF_OPEN:
+            self._trial = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = now
+        self._trial = False
+
+
+class Ticket:
+    """One request's place in the admission queue."""
+
+    __slots__ = ("user", "tokens", "enqueued_at", "admitted_at", "attempt")
+
+    def __init__(self, user, tokens, enqueued_at, attempt=0):
+        self.user = user
+        self.tokens = tokens
+        self.enqueued_at = enqueued_at
+        self.admitted_at = None
+        self.attempt = attempt
+
+
+class AdmissionController:
+    """Rate limits, fair queueing, retries and circuit breaking for model calls."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES,
+                 base_backoff=DEFAULT_BASE_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF,
+                 max_wait=DEFAULT_MAX_WAIT, breaker=None, retryable=is_retryable,
+                 clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng
+        self._requests = TokenBucket(rpm, clock=clock)
+        self._tokens = TokenBucket(tpm, clock=clock)
+        self._cond = threading.Condition()
+        self._queues = {}       # user -> deque of waiting tickets
+        self._order = deque()   # users with waiting tickets, in serving order
+        self.admitted = 0
+        self.retries = 0
+        self.timeouts = 0
+
+    # --- QUEUE ---
+    def _enqueue(self, ticket):
+        queue = self._queues.get(ticket.user)
+        if queue is None:
+            queue = self._queues[ticket.user] = deque()
+            self._order.append(ticket.user)
+        queue.append(ticket)
+
+    def _remove(self, ticket):
+        queue = self._queues.get(ticket.user)
+        if queue is None or ticket not in queue:
+            return
+        was_head = self._order[0] == ticket.user and queue[0] is ticket
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[ticket.user]
+            self._order.remove(ticket.user)
+        elif was_head:
+            # Served: this user goes to the back of the line
+            self._order.rotate(-1)
+
+    def _head(self):
+        return self._queues[self._order[0]][0] if self._order else None
+
+    def _capacity_wait(self, ticket, now):
+        return max(self._requests.wait_time(1, now),
+                   self._tokens.wait_time(ticket.tokens, now),
+                   self.breaker.wait_time(now))
+
+    # --- ADMISSION ---
+    def acquire(self, user, tokens, on_ticket=None, attempt=0):
+        """Blocks until the request may go out; returns its admitted ticket."""
+        with self._cond:
+            ticket = Ticket(user, tokens, self._clock(), attempt)
+            self._enqueue(ticket)
+            if on_ticket is not None:
+                on_ticket(ticket)
+            try:
+                while True:
+                    now = self._clock()
+                    wait = None
+                    if self._head() is ticket:
+                        wait = self._capacity_wait(ticket, now)
+                        if wait <= 0:
+                            self._requests.take(1, now)
+                            self._tokens.take(tokens, now)
+                            self.breaker.admit(now)
+                            ticket.admitted_at = now
+                            self.admitted += 1
+                            return ticket
+                    if now - ticket.enqueued_at >= self.max_wait:
+                        self.timeouts += 1
+                        raise AdmissionTimeout(f"no model capacity after {self.max_wait:.0f}s")
+                    self._cond.wait(timeout=min(wait or IDLE_POLL_SECONDS, IDLE_POLL_SECONDS))
+            finally:
+                self._remove(ticket)
+                self._cond.notify_all()
+
+    def backoff(self, attempt):
+        """Full-jitter-ish exponential backoff: half to all of the capped step."""
+        step = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return step * (0.5 + self._rng() / 2)
+
+    def run(self, user, fn, tokens=1, on_ticket=None):
+        """Calls ``fn()`` once admitted, retrying quota/availability errors."""
+        attempt = 0
+        while True:
+            self.acquire(user, tokens, on_ticket=on_ticket, attempt=attempt)
+            try:
+                result = fn()
+            except Exception as e:
+                with self._cond:
+                    if not self.retryable(e):
+                        # The provider answered; a bad request says nothing about its health
+                        self.breaker.record_success()
+                        self._cond.notify_all()
+                        raise
+                    self.breaker.record_failure(self._clock())
+                    self._cond.notify_all()
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep(self.backoff(attempt))
+                attempt += 1
+                with self._cond:
+                    self.retries += 1
+                continue
+            with self._cond:
+                self.breaker.record_success()
+                self._cond.notify_all()
+            return result
+
+    # --- REPORTING ---
+    def _position(self, ticket):
+        queue = self._queues.get(ticket.user)
+        if queue is None or ticket not in queue:
+            return None
+        rank = list(queue).index(ticket)
+        position = 0
+        seen_own = False
+        # Round-robin: every user ahead serves up to rank+1 requests first, those behind up to rank
+        for user in self._order:
+            if user == ticket.user:
+                seen_own = True
+                continue
+            position += min(len(self._queues[user]), rank if seen_own else rank + 1)
+        return position + rank
+
+    def status(self, ticket):
+        """``(position, eta_seconds)`` while ``ticket`` waits, None once admitted."""
+        with self._cond:
+            if ticket is None or ticket.admitted_at is not None:
+                return None
+            position = self._position(ticket)
+            if position is None:
+                return None
+            now = self._clock()
+            head = self._head()
+            head_wait = self._capacity_wait(head, now) if head is not None else 0.0
+            interval = max(60.0 / self.rpm, ticket.tokens * 60.0 / self.tpm)
+            return position, max(0.0, head_wait) + position * interval
+
+    def waiting(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def breaker_state(self):
+        with self._cond:
+            return self.breaker.state(self._clock())
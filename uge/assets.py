@@ -0,0 +1,300 @@
+"""Recon image and dossier asset pipeline.
+
+Recon uplinks used to embed the full-size ``cinematics/`` originals, and the
+sidebar re-read ~100 KB squad PNGs from disk on every rerun. ``AssetPipeline``
+serves sized WebP derivatives instead:
+
+* ``derivative(source, size)`` returns the bytes for one of ``DERIVATIVES``,
+  resized once per process and kept in a byte-bounded LRU;
+* a derivative can also be written to (and read back from)
+  ``static/derived/<mission>/<size>/``, which Streamlit serves as plain files
+  (``--server.enableStaticServing``). Pages link to it by URL via
+  ``served(...)``, which never blocks: on a miss it queues a prefetch and the
+  caller shows the original until the file lands. ``python -m uge.assets``
+  builds them ahead of a deploy;
+* ``prefetch(source)`` warms the cache on a small pool, so a POI's recon image
+  is ready by the time the unit ordered there reports in;
+* a source that fails (404, timeout...) is remembered for
+  ``FAILURE_TTL_SECONDS`` and fails fast meanwhile, so a rerun never waits on
+  the same dead URL twice; callers fall back to the original URL.
+
+Sources are local paths or http(s) URLs. Pillow is optional: without it the
+original bytes are served unchanged (still cached).
+"""
+import argparse
+import io
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from uge.startup import REPORT
+
+# name -> (max width, max height); aspect ratio is kept
+DERIVATIVES = {
+    "thumb": (240, 160),     # map popups
+    "popup": (640, 400),     # recon uplinks in the feed
+    "portrait": (400, 400),  # sidebar squad dossiers
+    "avatar": (64, 64),      # chat bubbles
+    "token": (90, 90),       # map tokens (45px, 2x for dense screens)
+}
+WEBP_QUALITY = 78
+STATIC_DIR = "static"
+# Streamlit's static serving answers files under STATIC_DIR on this path
+STATIC_URL = "/app/static"
+DERIVED_DIR = os.path.join(STATIC_DIR, "derived")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_WORKERS = 4
+FETCH_TIMEOUT_SECONDS = 10
+# How long a failed derivative is answered from memory before it is tried again
+FAILURE_TTL_SECONDS = 60
+
+log = logging.getLogger(__name__)
+
+_pil = None
+
+
+def _image_module():
+    """PIL.Image, or None when Pillow isn't installed (derivatives fall back to originals)."""
+    global _pil
+    if _pil is None:
+        try:
+            _pil = REPORT.lazy_import("PIL.Image")
+        except ImportError:
+            log.warning("Pillow not installed; serving original images")
+            _pil = False
+    return _pil or None
+
+
+def is_remote(source):
+    return source.startswith(("http://", "https://"))
+
+
+def fetch_bytes(source, allow_remote=True):
+    if is_remote(source):
+        if not allow_remote:
+            raise OSError(f"remote fetch disabled: {source}")
+        with urllib.request.urlopen(source, timeout=FETCH_TIMEOUT_SECONDS) as response:
+            return response.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def sniff_mime(data):
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:4] == b"GIF8":
+        return "image/gif"
+    return "application/octet-stream"
+
+
+def static_url(path, static_dir=STATIC_DIR):
+    """URL of ``path`` (a file under ``static_dir``) on Streamlit's static serving."""
+    return f"{STATIC_URL}/{os.path.relpath(path, static_dir).replace(os.sep, '/')}"
+
+
+def resize_webp(data, box, quality=WEBP_QUALITY):
+    """``data`` scaled to fit ``box`` and re-encoded as WebP (unchanged without Pillow)."""
+    image_module = _image_module()
+    if image_module is None:
+        return data
+    with image_module.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        image.thumbnail(box)
+        out = io.BytesIO()
+        image.save(out, format="WEBP", quality=quality, method=4)
+        return out.getvalue()
+
+
+def derived_path(root, size, filename):
+    """``<root>/<size>/<stem>.webp``; ``root`` is one mission's folder under ``DERIVED_DIR``."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(root, size, stem + ".webp")
+
+
+class AssetPipeline:
+    """Process-wide derivative cache; safe to share across sessions and threads."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, workers=DEFAULT_WORKERS, fetch=fetch_bytes,
+                 tracer=None, failure_ttl=FAILURE_TTL_SECONDS, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.failure_ttl = failure_ttl
+        self._fetch = fetch
+        self._tracer = tracer
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # (source, size) -> bytes, most recent last
+        self._cached_bytes = 0
+        self._inflight = {}           # (source, size) -> Future
+        self._failures = {}           # (source, size) -> (retry after, exception)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uge-assets")
+        self.hits = 0
+        self.misses = 0
+        self.failed_fast = 0
+
+    def _recent_failure(self, key):
+        """The exception ``key`` last failed with, while it's still fresh (caller holds the lock)."""
+        failure = self._failures.get(key)
+        if failure is None:
+            return None
+        if self._clock() >= failure[0]:
+            del self._failures[key]
+            return None
+        return failure[1]
+
+    def _store(self, key, data):
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._cached_bytes -= len(old)
+        self._cache[key] = data
+        self._cached_bytes += len(data)
+        while self._cached_bytes > self.max_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
+
+    def _build(self, source, size, disk_path):
+        if disk_path and os.path.isfile(disk_path):
+            with open(disk_path, "rb") as f:
+                return f.read()
+        original = self._fetch(source)
+        if size is None:
+            return original
+        if self._tracer is not None:
+            with self._tracer.span("asset.derive", size=size, source_bytes=len(original)) as span:
+                data = resize_webp(original, DERIVATIVES[size])
+                span.set(bytes=len(data))
+        else:
+            data = resize_webp(original, DERIVATIVES[size])
+        if disk_path and data is not original:
+            try:
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                tmp = f"{disk_path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, disk_path)
+            except OSError:
+                pass # Read-only static dir: the in-memory copy still serves this process
+        return data
+
+    def derivative(self, source, size=None, disk_path=None):
+        """Bytes of ``source`` at ``size`` (a ``DERIVATIVES`` name; None = original)."""
+        key = (source, size)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return data
+            failure = self._recent_failure(key)
+            if failure is not None:
+                self.failed_fast += 1
+                raise failure.with_traceback(None)
+            self.misses += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            # Someone (usually a prefetch) is already building it
+            return future.result()
+        try:
+            data = self._build(source, size, disk_path)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if isinstance(e, Exception) and self.failure_ttl:
+                    self._failures[key] = (self._clock() + self.failure_ttl, e)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, data)
+            self._inflight.pop(key, None)
+            self._failures.pop(key, None)
+        future.set_result(data)
+        return data
+
+    def prefetch(self, source, sizes=("popup", "thumb"), disk_paths=None):
+        """Builds ``sizes`` of ``source`` in the background; failures are only logged."""
+        disk_paths = disk_paths or {}
+        for size in sizes:
+            with self._lock:
+                if ((source, size) in self._cache or (source, size) in self._inflight
+                        or self._recent_failure((source, size)) is not None):
+                    continue
+            self._pool.submit(self._prefetch_one, source, size, disk_paths.get(size))
+
+    def served(self, source, size, disk_path):
+        """``disk_path`` if its derivative is on disk, else None after queueing it; never blocks.
+
+        Without Pillow nothing is written, so callers keep serving the original.
+        """
+        if os.path.isfile(disk_path):
+            return disk_path
+        self.prefetch(source, sizes=(size,), disk_paths={size: disk_path})
+        return None
+
+    def _prefetch_one(self, source, size, disk_path):
+        try:
+            self.derivative(source, size, disk_path)
+        except Exception:
+            log.warning("Prefetch of %s (%s) failed", source, size, exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "bytes": self._cached_bytes,
+                    "hits": self.hits, "misses": self.misses,
+                    "failures": len(self._failures), "failed_fast": self.failed_fast}
+
+
+# --- BUILD-TIME DERIVATIVES ---
+def precompute(mission, root, source_for, pipeline, sizes=("popup", "thumb")):
+    """Writes every POI image's derivatives under ``root``; returns the count written."""
+    written = 0
+    for poi in mission.pois.values():
+        if not poi.image:
+            continue
+        for size in sizes:
+            path = derived_path(root, size, poi.image)
+            if os.path.isfile(path):
+                continue
+            pipeline.derivative(source_for(poi.image), size, path)
+            written += os.path.isfile(path)
+    return written
+
+
+def main():
+    from uge.catalog import MissionCatalog
+
+    parser = argparse.ArgumentParser(description="Build recon image derivatives for mission packages.")
+    parser.add_argument("roots", nargs="*", default=["missions"])
+    parser.add_argument("--out", default=DERIVED_DIR, help="static target (one folder per mission)")
+    parser.add_argument("--base-url", help="where images not shipped in a package live, "
+                                           "e.g. https://storage.googleapis.com/<bucket>")
+    args = parser.parse_args()
+
+    catalog = MissionCatalog(args.roots)
+    pipeline = AssetPipeline()
+    for entry in catalog.entries():
+        mission = catalog.get(entry.id)
+        local = entry.images()
+
+        def source_for(filename):
+            if filename in local or not args.base_url:
+                return local.get(filename, os.path.join(entry.package_dir, "images", filename))
+            return f"{args.base_url.rstrip('/')}/{mission.asset_prefix}/{filename}"
+
+        written = precompute(mission, os.path.join(args.out, entry.id), source_for, pipeline)
+        print(f"{entry.id}: {written} derivative(s) written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Mission catalog.
+
+A mission package is a directory holding ``mission.xml`` plus, optionally,
+its images::
+
+    missions/
+        panama/
+            mission.xml
+            images/loc_dock4.jpg ...
+
+The directory name is the catalog id: it keys saved state, the shared prompt
+prefix and the response cache, so renaming a package orphans its saves.
+
+Discovery only lists directories (plus a short header read for the title),
+so a deployment can carry dozens of theaters at no startup cost. A mission
+is compiled on first use and kept in an LRU of ``max_compiled`` entries,
+keyed on the file stamp so an edited XML hot-reloads; memory follows the
+number of missions actually being played, not the size of the catalog.
+"""
+import dataclasses
+import logging
+import os
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+from uge.mission import MissionCompileError, compile_mission, mission_stamp
+
+MISSION_FILE = "mission.xml"
+IMAGES_DIR = "images"
+DEFAULT_MAX_COMPILED = 8
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+log = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class MissionEntry:
+    """A discovered package; nothing here needs the mission compiled."""
+    id: str
+    path: str
+    package_dir: str
+    title: str
+
+    def images(self):
+        """Image files shipped with the package (one listdir, on demand)."""
+        images_dir = os.path.join(self.package_dir, IMAGES_DIR)
+        try:
+            names = os.listdir(images_dir)
+        except OSError:
+            return {}
+        return {name: os.path.join(images_dir, name) for name in sorted(names)
+                if name.lower().endswith(IMAGE_EXTENSIONS)}
+
+
+def read_title(path):
+    """<presentation><title> (or the mission designator) without parsing the whole file."""
+    try:
+        for _, node in ET.iterparse(path, events=("end",)):
+            if node.tag in ("title", "mission_designator") and node.text:
+                return node.text.strip()
+            if node.tag in ("intent", "locations"):
+                break
+    except (OSError, ET.ParseError):
+        pass
+    return None
+
+
+def _dir_stamp(root):
+    try:
+        return os.stat(root).st_mtime_ns
+    except OSError:
+        return None
+
+
+class MissionCatalog:
+    """Discovers mission packages under ``roots`` and compiles them lazily."""
+
+    def __init__(self, roots, max_compiled=DEFAULT_MAX_COMPILED, compile=compile_mission):
+        self.roots = [os.path.abspath(r) for r in ([roots] if isinstance(roots, str) else roots)]
+        self.max_compiled = max_compiled
+        self._compile = compile
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._scanned = None            # root mtimes at the last scan
+        self._compiled = OrderedDict()  # catalog id -> (stamp, Mission), most recent last
+        self.compiles = 0
+        self.evictions = 0
+
+    # --- DISCOVERY ---
+    def _scan(self):
+        entries = {}
+        for root in self.roots:
+            try:
+                names = sorted(os.listdir(root))
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(root, name, MISSION_FILE)
+                if not os.path.isfile(path):
+                    continue
+                if name in entries:
+                    log.warning("Mission %s in %s shadowed by %s", name, root, entries[name].package_dir)
+                    continue
+                entries[name] = MissionEntry(name, path, os.path.dirname(path), read_title(path) or name)
+        return entries
+
+    def _refresh(self):
+        # One stat per root: adding or removing a package changes its root's mtime
+        stamps = tuple(_dir_stamp(r) for r in self.roots)
+        with self._lock:
+            if stamps == self._scanned:
+                return self._entries
+        entries = self._scan()
+        with self._lock:
+            self._entries, self._scanned = entries, stamps
+            for stale in [i for i in self._compiled if i not in entries]:
+                del self._compiled[stale]
+            return entries
+
+    def entries(self):
+        """Every discovered package, in catalog id order."""
+        return sorted(self._refresh().values(), key=lambda e: e.id)
+
+    def entry(self, mission_id):
+        return self._refresh().get(mission_id)
+
+    def __contains__(self, mission_id):
+        return mission_id in self._refresh()
+
+    # --- COMPILED MISSIONS ---
+    def get(self, mission_id):
+        """Compiled ``Mission`` for ``mission_id``: one stat when it's already loaded."""
+        entry = self.entry(mission_id)
+        if entry is None:
+            raise MissionCompileError(f"no mission package named {mission_id!r}")
+        stamp = mission_stamp(entry.path)
+        with self._lock:
+            cached = self._compiled.get(mission_id)
+            if cached is not None and cached[0] == stamp:
+                self._compiled.move_to_end(mission_id)
+                return cached[1]
+        # Compiled outside the lock; two sessions racing on a cold mission both get a valid copy
+        mission = dataclasses.replace(self._compile(entry.path), catalog_id=mission_id)
+        with self._lock:
+            self.compiles += 1
+            self._compiled[mission_id] = (stamp, mission)
+            self._compiled.move_to_end(mission_id)
+            while len(self._compiled) > self.max_compiled:
+                self._compiled.popitem(last=False)
+                self.evictions += 1
+        return mission
+
+    def loaded(self):
+        """Catalog ids currently compiled, least recently used first."""
+        with self._lock:
+            return list(self._compiled)
@@ -0,0 +1,101 @@
+"""Local fast-path for deterministic commander orders.
+
+Some orders have an outcome the app can work out from state it already
+holds: "DAVE move to north gate", "status report", "checklist". For those,
+``parse_command`` returns a typed order and the helpers below produce the
+squad's reply locally, with no Gemini round trip. Anything ambiguous returns
+None and goes to the model as usual. The app passes local moves to the next
+model turn as ``[LOCAL_EVENTS]`` so the narrative catches up.
+"""
+import re
+from dataclasses import dataclass
+
+from uge.sitrep import OPERATIVES
+
+_UNIT = r"(?:sam|dave|mike)"
+_GROUP = r"(?:all|everyone|everybody|team|squad|all units)"
+_MOVE = re.compile(
+    rf"^(?P<units>{_GROUP}|{_UNIT}(?:\s*(?:,|and|&)\s*{_UNIT})*)\s*[,:]?\s*"
+    r"(?:move|go|head|proceed|relocate|fall back|regroup|rv)\s+(?:over\s+)?(?:to|towards|toward)\s+"
+    r"(?P<dest>.+)$"
+)
+# Explicit command words only: narrative orders ("report in", "what do you see") go to the squad
+_STATUS = re.compile(r"^(?:status(?: report)?|sitrep|squad status|positions?)$")
+_CHECKLIST = re.compile(r"^(?:checklist|mission checklist|objectives?|objective status|tasks|what(?:'s| is) left)$")
+
+MOVE_ACKS = {
+    "SAM": "Copy that. Relocating to {dest}.",
+    "DAVE": "Moving. {dest}.",
+    "MIKE": "On my way to {dest}. Bringing the kit.",
+}
+HOLD_LINES = {
+    "SAM": "Holding at {loc}.",
+    "DAVE": "{loc}. Quiet. For now.",
+    "MIKE": "Still at {loc}, scanning the bands.",
+}
+
+
+@dataclass(frozen=True)
+class MoveOrder:
+    units: tuple
+    poi_id: str
+
+
+@dataclass(frozen=True)
+class StatusQuery:
+    pass
+
+
+@dataclass(frozen=True)
+class ChecklistQuery:
+    pass
+
+
+def _squash(text):
+    return " ".join(text.lower().strip().rstrip(".!?").split())
+
+
+def parse_command(text, resolver):
+    """Typed order for a deterministic command, or None if the model should handle it."""
+    command = _squash(text)
+    if not command:
+        return None
+    if _STATUS.match(command):
+        return StatusQuery()
+    if _CHECKLIST.match(command):
+        return ChecklistQuery()
+    match = _MOVE.match(command)
+    if match:
+        # Exact index hit only: "north gate and take out the guard" must go to the model
+        poi_id = resolver.lookup(match.group("dest"))
+        if poi_id is None:
+            return None
+        if re.fullmatch(_GROUP, match.group("units")):
+            units = OPERATIVES
+        else:
+            named = re.findall(_UNIT, match.group("units"))
+            units = tuple(unit for unit in OPERATIVES if unit.lower() in named)
+        return MoveOrder(units=units, poi_id=poi_id)
+    return None
+
+
+# --- LOCAL REPLIES ---
+def acknowledge_move(order, mission):
+    dest = mission.pois[order.poi_id].name
+    return {unit: MOVE_ACKS[unit].format(dest=dest) for unit in order.units}
+
+
+def status_report(locations):
+    return {unit: HOLD_LINES[unit].format(loc=locations.get(unit, "Unknown")) for unit in OPERATIVES}
+
+
+def checklist_report(tracker):
+    marks = {"done": "✅", "open": "◻️", "locked": "🔒"}
+    lines = [f"{marks[status]} {label}" for _, label, status in tracker.checklist()]
+    return "**MISSION CHECKLIST**\n\n" + "\n\n".join(lines)
+
+
+def move_event(order, mission, mission_time):
+    """One-line note for the next model turn so the narrative catches up."""
+    dest = mission.pois[order.poi_id].name
+    return f"T-{mission_time}m: {', '.join(order.units)} relocated to {dest} on Commander's order."
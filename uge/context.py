@@ -0,0 +1,154 @@
+"""Bounded conversation context for the squad model.
+
+A Gemini ``ChatSession`` resends its whole history every turn, so a 60-turn
+mission gets slower and dearer as it goes. ``MissionContext`` replaces it:
+the system instruction is pinned, the last ``max_turns`` exchanges are kept
+verbatim and anything older is folded into a one-line-per-turn "mission
+ledger" built from the ``[SYSTEM_STATE]`` facts the app already tracks. Each
+request is then trimmed to ``token_budget``.
+
+The ledger keeps at most ``max_ledger`` lines (older ones are counted in
+``dropped``), so the context has a fixed ceiling however long the mission
+runs. The context is plain data (``to_dict``/``from_dict``), so it can live in
+session state and be persisted with the rest of the mission, where it is
+rewritten whole on every save.
+"""
+DEFAULT_MAX_TURNS = 6
+DEFAULT_TOKEN_BUDGET = 16000
+# ~40 tokens a line: the ledger never outgrows a few KB of the saved mission
+DEFAULT_MAX_LEDGER = 40
+LEDGER_ORDER_CHARS = 120
+
+SYSTEM_ACK = "Acknowledged. Tactical multiplexer online."
+LEDGER_ACK = "Ledger received."
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 chars per token) so budgeting never costs an API call."""
+    return len(text) // 4 + 1 if text else 0
+
+
+def _content(role, text):
+    return {"role": role, "parts": [text]}
+
+
+def ledger_line(turn):
+    """Compacts one exchange into the facts worth remembering."""
+    facts = turn.get("facts", {})
+    order = " ".join(turn.get("order", "").split())
+    if len(order) > LEDGER_ORDER_CHARS:
+        order = order[:LEDGER_ORDER_CHARS - 3] + "..."
+    locs = ", ".join(f"{u}@{loc}" for u, loc in facts.get("locations", {}).items())
+    done = ", ".join(facts.get("completed", [])) or "none"
+    return f"T{turn.get('seq', '?')} [{facts.get('time', '?')}m] CMD: \"{order}\" -> {locs} | DONE: {done}"
+
+
+class MissionContext:
+    """Pinned instruction + rolling ledger + sliding window of recent turns."""
+
+    def __init__(self, system_instruction, max_turns=DEFAULT_MAX_TURNS,
+                 token_budget=DEFAULT_TOKEN_BUDGET, max_ledger=DEFAULT_MAX_LEDGER):
+        self.system_instruction = system_instruction
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.max_ledger = max_ledger
+        self.turns = []    # [{"seq", "order", "prompt", "reply", "facts"}] kept verbatim
+        self.ledger = []   # one compact line per folded turn
+        self.dropped = 0   # ledger lines discarded to stay inside the budget
+        self.seq = 0
+
+    # --- RECORDING ---
+    def record(self, order, prompt, reply, facts):
+        """Stores a finished exchange and folds anything outside the window."""
+        self.seq += 1
+        self.turns.append({
+            "seq": self.seq,
+            "order": order,
+            "prompt": prompt,
+            "reply": reply,
+            "facts": facts,
+        })
+        while len(self.turns) > self.max_turns:
+            self._fold_oldest()
+
+    def _fold_oldest(self):
+        self.ledger.append(ledger_line(self.turns.pop(0)))
+        while self.max_ledger and len(self.ledger) > self.max_ledger:
+            self._drop_oldest_line()
+
+    def _drop_oldest_line(self):
+        self.ledger.pop(0)
+        self.dropped += 1
+
+    # --- REQUEST BUILDING ---
+    def _ledger_text(self):
+        if not self.ledger and not self.dropped:
+            return ""
+        head = "[MISSION_LEDGER] Condensed record of earlier turns (oldest first):"
+        if self.dropped:
+            head += f"\n... {self.dropped} earlier turns omitted ..."
+        return head + "\n" + "\n".join(self.ledger)
+
+    def _pinned(self):
+        if not self.system_instruction:
+            return []
+        return [_content("user", self.system_instruction), _content("model", SYSTEM_ACK)]
+
+    def _assemble(self, prompt):
+        contents = self._pinned()
+        ledger = self._ledger_text()
+        if ledger:
+            contents += [_content("user", ledger), _content("model", LEDGER_ACK)]
+        for turn in self.turns:
+            contents += [_content("user", turn["prompt"]), _content("model", turn["reply"])]
+        contents.append(_content("user", prompt))
+        return contents
+
+    @staticmethod
+    def count_tokens(contents):
+        return sum(estimate_tokens(part) for c in contents for part in c["parts"])
+
+    def build_contents(self, prompt):
+        """Request contents for ``prompt``, squeezed under the token budget.
+
+        Verbatim turns are folded into the ledger first; if that is still too
+        big, the oldest ledger lines are dropped. The pinned instruction and
+        the new prompt are never cut.
+        """
+        contents = self._assemble(prompt)
+        while self.token_budget and self.count_tokens(contents) > self.token_budget:
+            if self.turns:
+                self._fold_oldest()
+            elif self.ledger:
+                self._drop_oldest_line()
+            else:
+                break
+            contents = self._assemble(prompt)
+        return contents
+
+    # --- SERIALIZATION ---
+    def to_dict(self):
+        return {
+            "max_turns": self.max_turns,
+            "token_budget": self.token_budget,
+            "max_ledger": self.max_ledger,
+            "turns": list(self.turns),
+            "ledger": list(self.ledger),
+            "dropped": self.dropped,
+            "seq": self.seq,
+        }
+
+    @classmethod
+    def from_dict(cls, system_instruction, data):
+        ctx = cls(system_instruction,
+                  max_turns=data.get("max_turns", DEFAULT_MAX_TURNS),
+                  token_budget=data.get("token_budget", DEFAULT_TOKEN_BUDGET),
+                  max_ledger=data.get("max_ledger", DEFAULT_MAX_LEDGER))
+        ctx.turns = list(data.get("turns", []))
+        ctx.ledger = list(data.get("ledger", []))
+        ctx.dropped = data.get("dropped", 0)
+        # Contexts saved before the cap existed are trimmed on load
+        while ctx.max_ledger and len(ctx.ledger) > ctx.max_ledger:
+            ctx._drop_oldest_line()
+        ctx.seq = data.get("seq", len(ctx.turns) + len(ctx.ledger))
+        return ctx
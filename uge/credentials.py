@@ -0,0 +1,173 @@
+"""Operative credential store.
+
+Keeps a process-wide snapshot of the Firestore ``users`` collection in the
+shape ``stauth.Authenticate`` expects, so reruns never touch Firestore. The
+full collection is only streamed when the snapshot is older than ``ttl``;
+individual operatives are fetched or patched by username as they log in,
+enlist or reset their password.
+"""
+import copy
+import threading
+import time
+
+from uge.startup import REPORT
+
+USERS_COLLECTION = "users"
+DEFAULT_TTL_SECONDS = 300
+
+# Fallback so stauth always has something to render against an empty database
+FALLBACK_OPERATIVE = {"admin": {"name": "Admin", "password": "N/A", "email": "N/A"}}
+
+
+def _to_entry(data):
+    """Maps a ``users`` document onto the stauth credential record."""
+    return {
+        "name": data.get("full_name"),
+        "password": data.get("password"),  # BCrypt hash
+        "email": data.get("email"),
+        "role": data.get("role"),
+    }
+
+
+def _field_filter(db, field_path, op_string, value):
+    """``FieldFilter`` for ``where(filter=...)``; a client that carries its own (the fake) supplies it."""
+    field_filter = getattr(db, "FieldFilter", None)
+    if field_filter is None:
+        field_filter = REPORT.lazy_import("google.cloud.firestore").FieldFilter
+    return field_filter(field_path, op_string, value)
+
+
+class CredentialStore:
+    """TTL-cached, write-through view of the operative roster."""
+
+    def __init__(self, db, ttl=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self._db = db
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._reloaded = threading.Condition(self._lock)
+        self._reloading = False
+        # Operatives written or dropped while a reload streams; they outrank what it read
+        self._touched = set()
+        self._usernames = {}
+        self._loaded_at = None
+        # Bumped on every change so sessions know to rebuild their authenticator
+        self.version = 0
+
+    # --- SNAPSHOT ---
+    def _is_stale(self):
+        return self._loaded_at is None or (self._clock() - self._loaded_at) > self._ttl
+
+    def _stream(self):
+        usernames = {}
+        for doc in self._db.collection(USERS_COLLECTION).stream():
+            data = doc.to_dict() or {}
+            u_name = data.get("username")
+            if u_name:
+                usernames[u_name] = _to_entry(data)
+        return usernames
+
+    def _reload(self):
+        """Streams the roster without holding the lock, then swaps it in under it."""
+        try:
+            usernames = self._stream()
+        except BaseException:
+            with self._lock:
+                self._reloading = False
+                self._reloaded.notify_all()
+            raise
+        with self._lock:
+            for u_name in self._touched:
+                if u_name in self._usernames:
+                    usernames[u_name] = self._usernames[u_name]
+                else:
+                    usernames.pop(u_name, None)
+            self._touched.clear()
+            self._usernames = usernames
+            self._loaded_at = self._clock()
+            self.version += 1
+            self._reloading = False
+            self._reloaded.notify_all()
+
+    def snapshot(self):
+        """Returns a private copy of the roster in stauth format.
+
+        One caller streams a stale roster while the rest keep serving the old
+        one; only the very first load is waited for. stauth mutates the dict
+        it is handed (login flags, failed attempts), so every caller gets its
+        own deep copy of the shared snapshot.
+        """
+        with self._lock:
+            reload = self._is_stale() and not self._reloading
+            if reload:
+                self._reloading = True
+                self._touched.clear()
+        if reload:
+            self._reload()
+        with self._lock:
+            while self._reloading and self._loaded_at is None:
+                self._reloaded.wait()
+            usernames = copy.deepcopy(self._usernames) or copy.deepcopy(FALLBACK_OPERATIVE)
+        return {"usernames": usernames}
+
+    def get(self, username):
+        """Cached record for ``username`` without touching Firestore."""
+        with self._lock:
+            entry = self._usernames.get(username)
+            return dict(entry) if entry else None
+
+    # --- SINGLE-DOCUMENT PATHS ---
+    def lookup(self, username):
+        """Fetches one operative by username and folds them into the snapshot.
+
+        Used when a login misses the cached roster, so a new recruit enlisted
+        on another instance doesn't have to wait out the TTL.
+        """
+        if not username:
+            return None
+        docs = (
+            self._db.collection(USERS_COLLECTION)
+            .where(filter=_field_filter(self._db, "username", "==", username))
+            .limit(1)
+            .get()
+        )
+        for doc in docs:
+            data = doc.to_dict() or {}
+            return self.record(data)
+        return None
+
+    def record(self, data):
+        """Write-through for ``users`` ``.set()`` / ``.update()`` calls.
+
+        ``data`` is the fields just written; partial updates are merged onto
+        the cached entry so no follow-up read is needed.
+        """
+        u_name = data.get("username")
+        if not u_name:
+            return None
+        with self._lock:
+            entry = dict(self._usernames.get(u_name, {}))
+            entry.update({k: v for k, v in _to_entry(data).items() if v is not None})
+            self._usernames[u_name] = entry
+            if self._reloading:
+                self._touched.add(u_name)
+            self.version += 1
+            return dict(entry)
+
+    def find_username_by_email(self, email):
+        with self._lock:
+            for u_name, entry in self._usernames.items():
+                if entry.get("email") == email:
+                    return u_name
+        return None
+
+    def invalidate(self, username=None):
+        """Drops one cached operative, or the whole snapshot if no name given."""
+        with self._lock:
+            if username is None:
+                self._loaded_at = None
+            else:
+                self._usernames.pop(username, None)
+                if self._reloading:
+                    self._touched.add(username)
+            self.version += 1
@@ -0,0 +1,130 @@
+"""Off-thread enlistment and password resets.
+
+bcrypt is deliberately slow (~0.25 s a hash at stauth's default cost), and
+the enlistment form used to run it on the script thread and then sleep two
+seconds, so a burst of sign-ups pinned session threads for seconds each.
+``EnlistmentService`` moves that work off the script thread:
+
+* hashing runs on a small pool sized to the CPUs, so a burst queues instead
+  of thrashing the instance (bcrypt releases the GIL, so threads are enough);
+* the Firestore uniqueness checks run while the hash is computed, and the
+  single user write goes out as soon as both are done;
+* the session keeps only a request id and polls it, like squad turns.
+
+Login itself still verifies inside ``stauth.Authenticate.login`` on the
+script thread; that widget owns the check and offers no hook to move it.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from uge.credentials import USERS_COLLECTION
+from uge.tracing import Tracer
+
+# bcrypt is CPU-bound: more hashing threads than cores only adds latency
+DEFAULT_HASH_WORKERS = max(2, os.cpu_count() or 2)
+# Requests mostly wait on Firestore and the hash pool
+DEFAULT_REQUEST_WORKERS = 16
+REQUEST_RETENTION_SECONDS = 600
+
+
+class EnlistmentConflict(Exception):
+    """The email or username is already on the roster."""
+
+
+class RecoveryMismatch(Exception):
+    """The username given for a reset doesn't belong to the verified email."""
+
+
+class EnlistmentService:
+    """Bounded hash pool plus a registry of enlist/reset requests by id."""
+
+    def __init__(self, db, store, hash_password, hash_workers=DEFAULT_HASH_WORKERS,
+                 request_workers=DEFAULT_REQUEST_WORKERS, timestamp=None, tracer=None):
+        self._db = db
+        self._store = store
+        self._hash_password = hash_password
+        self._timestamp = timestamp
+        self._tracer = tracer or Tracer()
+        self._hash_pool = ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix="uge-hash")
+        self._requests = ThreadPoolExecutor(max_workers=request_workers, thread_name_prefix="uge-enlist")
+        self._lock = threading.Lock()
+        self._futures = {}   # request id -> (Future, submitted_at)
+
+    # --- REQUEST REGISTRY ---
+    def _submit(self, fn, *args):
+        request_id = uuid.uuid4().hex
+        with self._lock:
+            self._prune()
+            self._futures[request_id] = (self._requests.submit(fn, *args), time.monotonic())
+        return request_id
+
+    def get(self, request_id):
+        """The request's Future, or None if it's unknown (or was released)."""
+        with self._lock:
+            entry = self._futures.get(request_id)
+        return entry[0] if entry else None
+
+    def release(self, request_id):
+        with self._lock:
+            self._futures.pop(request_id, None)
+
+    def _prune(self):
+        now = time.monotonic()
+        stale = [rid for rid, (future, at) in self._futures.items()
+                 if future.done() and now - at > REQUEST_RETENTION_SECONDS]
+        for rid in stale:
+            del self._futures[rid]
+
+    # --- WORK ---
+    def _conflict(self, operative):
+        if self._db.collection(USERS_COLLECTION).document(operative["email"]).get().exists:
+            return "email already enlisted"
+        username = operative["username"]
+        if self._store.get(username) is not None or self._store.lookup(username) is not None:
+            return "username already taken"
+        return None
+
+    def _enlist(self, operative, password):
+        with self._tracer.span("auth.enlist") as span:
+            hashed = self._hash_pool.submit(self._hash_password, password)
+            # Uniqueness checks overlap the bcrypt round
+            conflict = self._conflict(operative)
+            if conflict:
+                hashed.cancel()
+                span.set(conflict=conflict)
+                raise EnlistmentConflict(conflict)
+            record = {**operative, "password": hashed.result()}
+            document = dict(record)
+            if self._timestamp is not None:
+                document["created_at"] = self._timestamp()
+            self._db.collection(USERS_COLLECTION).document(operative["email"]).set(document)
+            # Write-through so the shared roster sees the recruit without a re-stream
+            self._store.record(record)
+            return record
+
+    def _reset(self, email, username, password):
+        with self._tracer.span("auth.reset") as span:
+            hashed = self._hash_pool.submit(self._hash_password, password)
+            # The verified email document owns the account; the typed username must match it
+            doc_ref = self._db.collection(USERS_COLLECTION).document(email)
+            doc = doc_ref.get()
+            owner = (doc.to_dict() or {}).get("username") if doc.exists else None
+            if owner is None or str(owner).lower() != str(username).lower():
+                hashed.cancel()
+                span.set(conflict="username mismatch")
+                raise RecoveryMismatch("username does not match the verified email")
+            new_hash = hashed.result()
+            doc_ref.update({"password": new_hash})
+            self._store.record({"username": owner, "password": new_hash})
+            return owner
+
+    def enlist(self, operative, password):
+        """Queues an enlistment; ``operative`` is the ``users`` document minus the password."""
+        return self._submit(self._enlist, dict(operative), password)
+
+    def reset_password(self, email, username, password):
+        return self._submit(self._reset, email, username, password)
+
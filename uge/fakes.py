@@ -0,0 +1,355 @@
+"""Offline stand-ins for Firestore and Gemini.
+
+``FakeFirestoreClient`` implements the slice of ``firestore.Client`` the app
+and the ``uge`` modules use (documents, subcollections, ``where``/
+``order_by``/``limit`` queries, ``stream``/``get``, batches), so
+``MissionStateWriter``,
+``CredentialStore`` and the session backends can be run and measured without
+GCP credentials. Data lives in plain dicts behind one lock; values are
+deep-copied in and out like a real round trip.
+
+``ScriptedSquadGateway`` answers turns with canned, mission-aware SITREPs in
+place of ``LLMGateway``. Together they back ``UGE_OFFLINE=1`` runs and the
+scripts under ``benchmarks/``.
+"""
+import copy
+import datetime
+import json
+import re
+import threading
+import time
+
+from uge.aar import AAR_MARKER
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+}
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollectionReference(self._client, self.path + (name,))
+
+    def get(self):
+        with self._client._lock:
+            return FakeSnapshot(self, copy.deepcopy(self._client._docs.get(self.path)))
+
+    def set(self, data, merge=False):
+        with self._client._lock:
+            self._client._set(self.path, data, merge)
+
+    def update(self, data):
+        with self._client._lock:
+            if self.path not in self._client._docs:
+                raise KeyError(f"no document to update: {'/'.join(self.path)}")
+            self._client._set(self.path, data, merge=True)
+
+    def delete(self):
+        with self._client._lock:
+            self._client._docs.pop(self.path, None)
+
+
+class FakeQuery:
+    def __init__(self, client, path, filters=(), order=None, limit=None):
+        self._client = client
+        self._path = path
+        self._filters = tuple(filters)
+        self._order = order
+        self._limit = limit
+
+    def _copy(self, **changes):
+        args = {"filters": self._filters, "order": self._order, "limit": self._limit}
+        args.update(changes)
+        return FakeQuery(self._client, self._path, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, _OPERATORS[op_string], value),))
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(order=(field_path, str(direction).upper().endswith("DESCENDING")))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def stream(self):
+        with self._client._lock:
+            rows = [
+                (path, copy.deepcopy(data))
+                for path, data in self._client._docs.items()
+                if len(path) == len(self._path) + 1 and path[:-1] == self._path
+            ]
+        rows = [(p, d) for p, d in rows if all(op(d.get(f), v) for f, op, v in self._filters)]
+        if self._order is not None:
+            field, descending = self._order
+            rows.sort(key=lambda row: row[1].get(field), reverse=descending)
+        else:
+            rows.sort(key=lambda row: row[0][-1])
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        for path, data in rows:
+            yield FakeSnapshot(FakeDocumentReference(self._client, path), data)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.id = path[-1]
+
+    def document(self, document_id=None):
+        if document_id is None:
+            with self._client._lock:
+                self._client._auto_ids += 1
+                document_id = f"auto{self._client._auto_ids:08d}"
+        return FakeDocumentReference(self._client, self._path + (document_id,))
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(("set", reference, copy.deepcopy(data), merge))
+
+    def update(self, reference, data):
+        self._ops.append(("set", reference, copy.deepcopy(data), True))
+
+    def delete(self, reference):
+        self._ops.append(("delete", reference, None, False))
+
+    def commit(self):
+        # Applied under one lock hold, so readers never see half a batch
+        with self._client._lock:
+            self._client.batch_commits += 1
+            for kind, ref, data, merge in self._ops:
+                if kind == "delete":
+                    self._client._docs.pop(ref.path, None)
+                else:
+                    self._client._set(ref.path, data, merge)
+        self._ops = []
+
+
+class _FieldFilter:
+    """Stands in for ``FieldFilter``: the three fields ``FakeQuery.where`` reads back."""
+
+    def __init__(self, field_path, op_string, value):
+        self.field_path = field_path
+        self.op_string = op_string
+        self.value = value
+
+
+class _ServerTimestamp:
+    def __repr__(self):
+        return "SERVER_TIMESTAMP"
+
+    def __deepcopy__(self, memo):
+        return self # A sentinel: compared by identity when a write lands
+
+
+class FakeFirestoreClient:
+    """Drop-in for ``firestore.Client`` in local runs and benchmarks."""
+
+    # Stands in for ``firestore.SERVER_TIMESTAMP``; stored as the commit time
+    SERVER_TIMESTAMP = _ServerTimestamp()
+    # Stands in for ``firestore.FieldFilter`` in ``where(filter=...)`` queries
+    FieldFilter = _FieldFilter
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """The process-wide offline database, like the one project every instance talks to.
+
+        Tests write to it directly to play the part of another instance.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}   # path tuple -> dict
+        self._auto_ids = 0
+        self.writes = 0
+        self.batch_commits = 0
+
+    def _set(self, path, data, merge):
+        data = {key: datetime.datetime.now(datetime.timezone.utc) if value is self.SERVER_TIMESTAMP
+                else copy.deepcopy(value) for key, value in data.items()}
+        if merge and path in self._docs:
+            self._docs[path].update(data)
+        else:
+            self._docs[path] = data
+        self.writes += 1
+
+    def collection(self, name):
+        return FakeCollectionReference(self, (name,))
+
+    def document(self, path):
+        return FakeDocumentReference(self, tuple(path.split("/")))
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+
+# --- SCRIPTED SQUAD MODEL ---
+_ORDERS = re.compile(r"\[COMMANDER_ORDERS\]\s*(.*?)\s*(?:\[MANDATORY_RESPONSE_GUIDE\]|$)", re.DOTALL)
+_STATE_LOCATIONS = re.compile(r"Locations:(.*?)\s*\|")
+_STATE_OBJECTIVES = re.compile(r"Objectives:(.*)")
+_UNIT_WORDS = {name: re.compile(rf"\b{name}\b", re.IGNORECASE) for name in ("SAM", "DAVE", "MIKE")}
+
+_LINES = {
+    "SAM": ("Copy that, Commander. Moving to {dest} now; keep the Agency off my back.",
+            "On station at {dest}. Quiet, which I never trust.",
+            "Holding at {dest}. Somebody tell Dave the coffee here is worse than his."),
+    "DAVE": ("Yeah, {dest}. Sure. I'll bring the charm and the shotgun.",
+             "Perimeter at {dest} looks soft. Too soft.",
+             "Standing by at {dest}. Wake me if anything explodes."),
+    "MIKE": ("Pinging the local net around {dest}... three cameras, zero competence.",
+             "I'm at {dest}. Spoofing the badge reader, give me ninety seconds.",
+             "Signal's clean at {dest}. Logging everything for the ledger."),
+}
+
+
+class ScriptedSquadGateway:
+    """Offline stand-in for ``uge.llm.LLMGateway``.
+
+    Reads the ``[SYSTEM_STATE]`` and ``[COMMANDER_ORDERS]`` the app sends and
+    answers with a three-operative SITREP: units named in the order (all of
+    them if none are) move to the location it mentions, and any open
+    objective triggered there is reported in ``[OBJ_DATA]``. Output is
+    deterministic for a given prompt, so runs are comparable. ``latency``
+    seconds are spread over the streamed chunks to mimic Gemini. AAR
+    requests (``uge.aar``) get a short canned debrief instead.
+    """
+
+    def __init__(self, mission, latency=0.0, chunk_chars=24, allow_win=False, sleep=time.sleep):
+        self.mission = mission
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.allow_win = allow_win
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _sitrep(self, prompt):
+        orders_match = _ORDERS.search(prompt)
+        orders = orders_match.group(1) if orders_match else prompt
+        locations = {}
+        locs_match = _STATE_LOCATIONS.search(prompt)
+        if locs_match:
+            for pair in locs_match.group(1).split(","):
+                unit, _, loc = pair.strip().partition("@")
+                if loc:
+                    locations[unit] = loc
+        for unit in _UNIT_WORDS:
+            locations.setdefault(unit, "Insertion Point")
+
+        dest_id = self.mission.resolver.resolve(orders)
+        movers = [u for u, pattern in _UNIT_WORDS.items() if pattern.search(orders)] or list(_UNIT_WORDS)
+        if dest_id is not None:
+            for unit in movers:
+                locations[unit] = self.mission.pois[dest_id].name
+
+        open_ids = set()
+        objs_match = _STATE_OBJECTIVES.search(prompt)
+        if objs_match:
+            open_ids = {part.split(":")[0].strip() for part in objs_match.group(1).split(",")
+                        if part.strip().endswith(":OPEN")}
+        completed = [obj.id for obj in self.mission.objectives.values()
+                     if dest_id is not None and obj.location_trigger == dest_id and obj.id in open_ids]
+
+        pick = sum(map(ord, orders)) % 3
+        lines = []
+        for unit in _UNIT_WORDS:
+            lines.append(f'**{unit}:** "{_LINES[unit][pick].format(dest=locations[unit])}"')
+        win = self.mission.win_condition
+        if self.allow_win and dest_id is not None and \
+                self.mission.pois[dest_id].name == win.target_location:
+            lines.append(f'**SAM:** "{win.trigger_text}"')
+        suffix = "[LOC_DATA: " + ", ".join(f"{u}={locations[u]}" for u in _UNIT_WORDS) + "]"
+        for obj_id in completed:
+            suffix += f"\n[OBJ_DATA: {obj_id}=TRUE]"
+        return "\n".join(lines) + "\n" + suffix, locations, completed
+
+    def _debrief(self, prompt):
+        if "IDLE SPANS:" not in prompt:
+            # Phase summary for a long mission
+            return f"- {prompt.count(chr(10) + '+')} orders issued this phase."
+        idle = [line[2:].split(":")[0] for line in prompt.split("IDLE SPANS:")[1].split("\n\n")[0].splitlines()
+                if line.startswith("- ") and line != "- none"]
+        improve = (f"Keep {', '.join(sorted(set(idle)))} tasked; idle operatives are wasted combat power."
+                   if idle else "Sequence objectives tighter to cut time on target.")
+        return ("**COMMAND PRESENCE:** Decisive.\n\n**OPERATIONAL EFFICIENCY:** Adequate.\n\n"
+                "**SUSTAINED:** Clear, objective-oriented orders.\n\n"
+                f"**IMPROVE:** {improve}\n\n*Per Mare, Per Terram.*")
+
+    def complete(self, contents, stream=False, on_text=None, **model_kwargs):
+        prompt = contents[-1]["parts"][-1] if contents else ""
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += sum(len(p) for c in contents for p in c["parts"])
+        if AAR_MARKER in prompt:
+            return self._debrief(prompt)
+        text, locations, completed = self._sitrep(prompt)
+        config = model_kwargs.get("generation_config") or {}
+        if config.get("response_mime_type") == "application/json":
+            dialogue = {}
+            for line in text.splitlines():
+                unit, sep, rest = line.partition(":** ")
+                if sep:
+                    dialogue[unit.strip("*")] = rest.strip('"')
+            text = json.dumps({"dialogue": dialogue, "locations": locations,
+                               "completed_objectives": completed, "mission_complete": False})
+        if not stream:
+            if self.latency:
+                self._sleep(self.latency)
+            return text
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        for chunk in chunks:
+            if self.latency:
+                self._sleep(self.latency / len(chunks))
+            if on_text is not None:
+                on_text(chunk)
+        return text
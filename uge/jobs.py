@@ -0,0 +1,125 @@
+"""Background squad turns.
+
+A Gemini call can take several seconds. Running it inside the script run
+pins the session thread and freezes the sidebar and map. ``TurnDispatcher``
+runs turns on a shared worker pool instead. The session keeps only the job
+id; the UI polls the job (via a fragment), draws the partial SITREP while it
+streams, and applies the result to state once it's done.
+
+Workers never touch ``st.session_state``. They get a prepared request and
+return text, and the script thread does all state changes.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from uge.sitrep import SitrepStream
+
+DEFAULT_WORKERS = 32
+# Finished jobs nobody collected (closed tabs) are forgotten after this long
+JOB_RETENTION_SECONDS = 600
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class TurnJob:
+    """Handle for one in-flight model turn."""
+
+    def __init__(self, session_key):
+        self.id = uuid.uuid4().hex
+        self.session_key = session_key
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        # Admission ticket while the turn waits for model capacity (see ``uge.admission``)
+        self.ticket = None
+        # Set when the shared response cache answered, so the result isn't stored again
+        self.cached = False
+        self._lock = threading.Lock()
+        self._sitrep = SitrepStream()
+
+    # --- STREAMING (worker side) ---
+    def feed(self, piece):
+        with self._lock:
+            self._sitrep.feed(piece)
+
+    def restart_stream(self):
+        """Drops partial output before a retry so the feed doesn't show it twice."""
+        with self._lock:
+            self._sitrep = SitrepStream()
+
+    # --- POLLING (script side) ---
+    def segments(self):
+        """Dialogue received so far, suffix held back."""
+        with self._lock:
+            return self._sitrep.segments()
+
+    @property
+    def status(self):
+        if self.future is None or (self.started_at is None and not self.future.done()):
+            return QUEUED
+        if not self.future.done():
+            return RUNNING
+        return FAILED if self.future.exception() is not None else DONE
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def result(self):
+        """Response text; re-raises whatever the worker raised."""
+        return self.future.result()
+
+    def elapsed(self):
+        return (self.finished_at or time.monotonic()) - self.submitted_at
+
+
+class TurnDispatcher:
+    """Process-wide worker pool plus a registry of jobs by id."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, retention=JOB_RETENTION_SECONDS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uge-turn")
+        self._retention = retention
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, session_key, fn, *args, **kwargs):
+        """Schedules ``fn(job, *args, **kwargs)`` and returns the job handle."""
+        job = TurnJob(session_key)
+
+        def run():
+            job.started_at = time.monotonic()
+            try:
+                return fn(job, *args, **kwargs)
+            finally:
+                job.finished_at = time.monotonic()
+
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(run)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def release(self, job_id):
+        """Forget a job once its result has been applied."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def in_flight(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.done())
+
+    def _prune(self):
+        now = time.monotonic()
+        stale = [job_id for job_id, job in self._jobs.items()
+                 if job.finished_at is not None and now - job.finished_at > self._retention]
+        for job_id in stale:
+            del self._jobs[job_id]
@@ -0,0 +1,283 @@
+"""Shared Gemini gateway.
+
+``genai.configure()`` swaps out the library's global client (and with it the
+underlying connection pool), so it must happen once per process, not once per
+turn. ``LLMGateway`` does that on construction and hands out cached
+``GenerativeModel`` handles; the app keeps a single instance in
+``st.cache_resource`` so every session thread shares it.
+
+``google.generativeai`` is heavy, so it is imported when the first gateway is
+built rather than when this module is.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from uge.context import estimate_tokens
+from uge.startup import REPORT
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MODEL = 'gemini-2.0-flash'
+DEFAULT_GENERATION_CONFIG = {"temperature": 0.3}
+
+SAFETY_SETTINGS = (
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+)
+
+
+# Context caching needs an explicit, versioned model id
+DEFAULT_CACHE_MODEL = 'models/gemini-2.0-flash-001'
+DEFAULT_CACHE_TTL_SECONDS = 3600
+# Extend a server cache this long before it would expire
+CACHE_REFRESH_MARGIN_SECONDS = 300
+# Don't hammer the API if a prefix can't be cached (quota, transient errors)
+CACHE_RETRY_AFTER_SECONDS = 600
+# Smallest prefix each model accepts for explicit caching; smaller ones are always sent inline
+MIN_CACHE_TOKENS = {
+    "gemini-1.5-flash": 32768,
+    "gemini-1.5-pro": 32768,
+    "gemini-2.0-flash": 4096,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 2048,
+}
+DEFAULT_MIN_CACHE_TOKENS = 4096
+
+
+def min_cache_tokens(model_name):
+    """Explicit-cache floor for ``model_name`` ('models/gemini-2.0-flash-001' -> 4096)."""
+    name = model_name.split("/")[-1]
+    for family in sorted(MIN_CACHE_TOKENS, key=len, reverse=True):
+        if name.startswith(family):
+            return MIN_CACHE_TOKENS[family]
+    return DEFAULT_MIN_CACHE_TOKENS
+
+
+def _freeze(config):
+    # Configs may nest (e.g. a JSON response schema), so key on a canonical dump
+    return json.dumps(config or {}, sort_keys=True, default=str)
+
+
+class PromptPrefix(namedtuple("PromptPrefix", "mission_id text digest")):
+    """The static, per-mission head of every request (the system instruction)."""
+    __slots__ = ()
+
+    @classmethod
+    def for_mission(cls, mission_id, text):
+        return cls(mission_id, text, hashlib.sha256(text.encode("utf-8")).hexdigest()[:16])
+
+    @property
+    def key(self):
+        return f"{self.mission_id}:{self.digest}"
+
+
+# --- PREFIX CACHES ---
+class LocalPrefixCache:
+    """In-process stand-in for server-side caching.
+
+    Registers each prefix once and counts reuse, but never calls Gemini: the
+    gateway falls back to sending the prefix as an inline system instruction.
+    Used for local runs and tests, and as the fallback when caching fails.
+    """
+
+    def check(self, prefix):
+        """Whether ``prefix`` can be cached at all; there is no floor in-process."""
+        return True
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prefix):
+        """Returns a server ``CachedContent`` for ``prefix``, or None to send it inline."""
+        with self._lock:
+            if prefix.key in self._entries:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._entries[prefix.key] = self._clock()
+        return None
+
+
+class GeminiPrefixCache(LocalPrefixCache):
+    """Registers each mission prefix once as a Gemini cached context.
+
+    Every session playing the same mission references the same cache, keyed
+    on mission id plus content hash, so the prefix is neither resent nor
+    re-billed at full rate on each turn. Prefixes below the model's caching
+    minimum are never sent to the API, so this only pays off for missions
+    whose instruction clears it (Panama's ~900 tokens doesn't on
+    gemini-2.0-flash). Create/extend calls run outside the
+    lock: while one is in flight, other callers use the current cache (or
+    go inline) rather than wait on it.
+    """
+
+    def __init__(self, model_name=DEFAULT_CACHE_MODEL, ttl_seconds=DEFAULT_CACHE_TTL_SECONDS,
+                 clock=time.monotonic, min_tokens=None):
+        super().__init__(clock=clock)
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_cache_tokens(model_name) if min_tokens is None else min_tokens
+        self._cached = {}     # prefix key -> (CachedContent, expires_at)
+        self._failed = {}     # prefix key -> when creation last failed
+        self._inflight = set()  # prefix keys with a create/extend call under way
+        self._too_small = set()
+        self.skipped = 0
+
+    def _create(self, prefix):
+        from google.generativeai import caching
+        return caching.CachedContent.create(
+            model=self.model_name,
+            display_name=f"uge-{prefix.mission_id}-{prefix.digest}",
+            system_instruction=prefix.text,
+            ttl=datetime.timedelta(seconds=self.ttl_seconds),
+        )
+
+    def _fits(self, prefix):
+        # Caller holds the lock; reports an undersized prefix the first time it's seen
+        if prefix.key in self._too_small:
+            return False
+        tokens = estimate_tokens(prefix.text)
+        if tokens >= self.min_tokens:
+            return True
+        self._too_small.add(prefix.key)
+        log.warning("Prefix %s is ~%d tokens, below the %d %s caches; sending it inline",
+                    prefix.key, tokens, self.min_tokens, self.model_name)
+        return False
+
+    def check(self, prefix):
+        """Whether ``prefix`` clears the model's caching minimum (logged once when it doesn't)."""
+        with self._lock:
+            return self._fits(prefix)
+
+    def get(self, prefix):
+        now = self._clock()
+        with self._lock:
+            if prefix.key in self._too_small:
+                self.skipped += 1
+                return None
+            entry = self._cached.get(prefix.key)
+            current = entry[0] if entry and entry[1] > now else None
+            if entry and entry[1] - now > CACHE_REFRESH_MARGIN_SECONDS:
+                self.hits += 1
+                return entry[0]
+            if prefix.key in self._inflight:
+                # Someone else is creating/extending it; the live cache (if any) still serves
+                return current
+            failed_at = self._failed.get(prefix.key)
+            if failed_at is not None and now - failed_at < CACHE_RETRY_AFTER_SECONDS:
+                return current
+            if current is None and not self._fits(prefix):
+                # Below the model's caching minimum: creation would fail on every retry
+                self.skipped += 1
+                return None
+            self.misses += 1
+            self._inflight.add(prefix.key)
+        try:
+            if current is not None:
+                current.update(ttl=datetime.timedelta(seconds=self.ttl_seconds))
+                cached = current
+            else:
+                cached = self._create(prefix)
+        except Exception:
+            # Model without caching support, quota... send inline instead
+            with self._lock:
+                self._inflight.discard(prefix.key)
+                self._failed[prefix.key] = now
+                if current is None:
+                    self._cached.pop(prefix.key, None)
+            return current
+        with self._lock:
+            self._inflight.discard(prefix.key)
+            self._failed.pop(prefix.key, None)
+            self._cached[prefix.key] = (cached, now + self.ttl_seconds)
+        return cached
+
+
+class LLMGateway:
+    """Thread-safe owner of the configured client and model handles."""
+
+    def __init__(self, api_key, model_name=DEFAULT_MODEL, generation_config=None,
+                 safety_settings=SAFETY_SETTINGS, transport=None, prefix_cache=None):
+        self.model_name = model_name
+        self.generation_config = dict(generation_config or DEFAULT_GENERATION_CONFIG)
+        self.safety_settings = [dict(s) for s in safety_settings]
+        self.prefix_cache = prefix_cache if prefix_cache is not None else LocalPrefixCache()
+        self._lock = threading.Lock()
+        self._models = {}
+        self._genai = REPORT.lazy_import("google.generativeai")
+        # One configure per process: the client (and its channel) is reused by every model
+        self._genai.configure(api_key=api_key, transport=transport)
+
+    def model(self, model_name=None, generation_config=None, prefix=None):
+        """Cached ``GenerativeModel`` for the given name/config/prefix.
+
+        With a ``prefix`` the model is bound to the shared server-side cache
+        for it when one is available, else to an inline system instruction.
+        """
+        model_name = model_name or self.model_name
+        config = dict(self.generation_config, **(generation_config or {}))
+        cached = self.prefix_cache.get(prefix) if prefix is not None else None
+        key = (model_name, _freeze(config), prefix.key if prefix is not None else None)
+        cache_name = getattr(cached, "name", None)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is None or entry[0] != cache_name:
+                if cached is not None:
+                    handle = self._genai.GenerativeModel.from_cached_content(
+                        cached,
+                        generation_config=config,
+                        safety_settings=self.safety_settings,
+                    )
+                else:
+                    handle = self._genai.GenerativeModel(
+                        model_name,
+                        generation_config=config,
+                        safety_settings=self.safety_settings,
+                        system_instruction=prefix.text if prefix is not None else None,
+                    )
+                entry = (cache_name, handle)
+                self._models[key] = entry
+            return entry[1]
+
+    # --- PER-SESSION CHAT API ---
+    def start_chat(self, history=None, **model_kwargs):
+        """New chat session for one commander; the model handle is shared."""
+        return self.model(**model_kwargs).start_chat(history=list(history or []))
+
+    def send(self, chat_session, prompt, stream=False):
+        return chat_session.send_message(prompt, stream=stream)
+
+    def generate(self, contents, stream=False, **model_kwargs):
+        """Stateless call for callers that manage their own history (see ``uge.context``)."""
+        return self.model(**model_kwargs).generate_content(contents, stream=stream)
+
+    def complete(self, contents, stream=False, on_text=None, **model_kwargs):
+        """Runs one request to completion and returns its text.
+
+        With ``stream=True`` each piece is handed to ``on_text`` as it lands.
+        Safe to call from worker threads.
+        """
+        if not stream:
+            return self.generate(contents, **model_kwargs).text
+        parts = []
+        for chunk in self.generate(contents, stream=True, **model_kwargs):
+            try:
+                piece = chunk.text
+            except ValueError:
+                # Chunks with no text parts (e.g. safety metadata) carry nothing to show
+                continue
+            parts.append(piece)
+            if on_text is not None:
+                on_text(piece)
+        return "".join(parts)
@@ -0,0 +1,90 @@
+"""Canonical location resolver.
+
+The model reports unit positions as free text in ``[LOC_DATA]``. This index
+maps every POI name, id and alias (normalized) to its POI id, so a reported
+location resolves with one dict lookup. Misses fall back to fuzzy matching,
+and the results are memoized. Text that says the unit is still on its way
+("en route to...", "heading for...") never resolves: that unit isn't there.
+"""
+import difflib
+import re
+import threading
+
+FUZZY_CUTOFF = 0.8
+MAX_MEMO = 1024
+# Shortest POI name (or multi-word alias) recognised inside longer text
+MIN_CONTAINED_CHARS = 8
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+# Matched against normalized text
+_TRANSIT = re.compile(r"\b(?:toward|towards|en route|enroute|heading|moving|inbound|approaching|"
+                      r"on the way|in transit|underway|headed)\b")
+_ARTICLES = ("the ",)
+
+
+def normalize(value):
+    """'The Harbor-Master  Office.' -> 'harbor master office'"""
+    text = _NON_WORD.sub(" ", str(value).lower()).strip()
+    for article in _ARTICLES:
+        if text.startswith(article):
+            text = text[len(article):]
+    return text
+
+
+class LocationResolver:
+    """Name/id/alias index over one mission's POIs."""
+
+    def __init__(self, pois):
+        self._index = {}
+        # Names and ids win over aliases if two POIs ever share a phrase
+        for poi in pois.values():
+            for key in (poi.name, poi.id, poi.id.replace("_", " ")):
+                self._index.setdefault(normalize(key), poi.id)
+        for poi in pois.values():
+            for alias in poi.aliases:
+                self._index.setdefault(normalize(alias), poi.id)
+        self._keys = tuple(self._index)
+        # Phrases specific enough to find inside free text: names/ids and multi-word aliases, not "local" or "ship"
+        phrases = {normalize(key) for poi in pois.values() for key in (poi.name, poi.id.replace("_", " "))}
+        phrases.update(normalize(alias) for poi in pois.values() for alias in poi.aliases
+                       if " " in normalize(alias))
+        self._phrases = tuple(k for k in phrases if len(k) >= MIN_CONTAINED_CHARS)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, value):
+        """Exact (normalized) name/id/alias hit only; no fuzzy fallback."""
+        if not value:
+            return None
+        return self._index.get(normalize(value))
+
+    def resolve(self, value):
+        """POI id for ``value``, or None if nothing is close enough."""
+        if not value:
+            return None
+        key = normalize(value)
+        poi_id = self._index.get(key)
+        if poi_id is not None:
+            return poi_id
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        poi_id = self._fuzzy(key)
+        with self._lock:
+            if len(self._memo) >= MAX_MEMO:
+                self._memo.clear()
+            self._memo[key] = poi_id
+        return poi_id
+
+    def _fuzzy(self, key):
+        if _TRANSIT.search(key):
+            return None
+        match = difflib.get_close_matches(key, self._keys, n=1, cutoff=FUZZY_CUTOFF)
+        if match:
+            return self._index[match[0]]
+        # "Harbor Master Office roof" -> the longest name or long alias contained in it
+        padded = f" {key} "
+        contained = [k for k in self._phrases if f" {k} " in padded]
+        if contained:
+            return self._index[max(contained, key=len)]
+        return None
@@ -0,0 +1,361 @@
+"""Mission compiler.
+
+Turns a mission XML file into a frozen, indexed ``Mission`` model. The XML
+never changes while a mission is being played, so the app compiles it once
+per process (keyed on the file stamp) and every session and every turn reads
+the same in-memory object instead of re-parsing the file.
+"""
+import hashlib
+import os
+import textwrap
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from uge.locations import LocationResolver
+from uge.objectives import validate_objectives
+
+
+DEFAULT_MAP_ZOOM = 15
+# Bucket folder holding POI images when a package doesn't name its own
+DEFAULT_ASSET_PREFIX = "cinematics"
+
+
+class MissionCompileError(Exception):
+    """Raised when a mission file can't be turned into a playable model."""
+
+
+@dataclass(frozen=True)
+class PointOfInterest:
+    id: str
+    name: str
+    coords: tuple
+    image: str
+    intel: str
+    aliases: tuple = ()
+
+
+@dataclass(frozen=True)
+class Objective:
+    id: str
+    description: str
+    location_trigger: str = None
+    dependencies: tuple = ()
+    logic: str = None
+    initially_complete: bool = False
+
+    @property
+    def label(self):
+        return self.id.replace('obj_', '').replace('_', ' ').strip().title()
+
+
+@dataclass(frozen=True)
+class WinCondition:
+    target_item: str
+    target_location: str
+    trigger_text: str
+
+
+@dataclass(frozen=True)
+class SquadUnit:
+    name: str
+    role: str
+    gender: str
+    traits: str
+    metier: str
+
+
+@dataclass(frozen=True)
+class Mission:
+    mission_id: str
+    designator: str
+    theater: str
+    situation: str
+    mission: str
+    constraints: str
+    intel: str
+    timeline: str
+    pois: MappingProxyType
+    objectives: MappingProxyType
+    # Reverse edges of the objective dependency graph: obj_id -> ids that wait on it
+    dependents: MappingProxyType
+    win_condition: WinCondition
+    squad: MappingProxyType
+    system_instruction: str
+    # Same instruction for Gemini JSON mode (UGE_RESPONSE_MODE=structured)
+    structured_instruction: str
+    fingerprint: str
+    # Name/id/alias -> POI id index, built once with the mission
+    resolver: LocationResolver = field(default=None, compare=False, repr=False)
+    source_path: str = field(default=None, compare=False)
+    # Catalog key (e.g. "panama"); names the saved state and the shared prompt prefix
+    catalog_id: str = None
+    # Landing page / feed / map presentation, from the optional <presentation> block
+    title: str = None
+    title_image: str = None
+    tagline: str = None
+    briefing: str = None
+    map_center: tuple = None
+    map_zoom: int = DEFAULT_MAP_ZOOM
+    map_label: str = None
+    asset_prefix: str = DEFAULT_ASSET_PREFIX
+
+    def initial_objectives(self):
+        """Fresh, mutable checklist for a new session."""
+        return {obj_id: obj.initially_complete for obj_id, obj in self.objectives.items()}
+
+
+# --- FILE STAMP ---
+def mission_stamp(file_path):
+    """Cheap change detector (one stat) used as the compile cache key."""
+    st = os.stat(file_path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+# --- PARSING ---
+def _text(node, tag, default=None):
+    child = node.find(tag) if node is not None else None
+    if child is None or child.text is None:
+        return default
+    return child.text.strip()
+
+
+def _split_list(value):
+    if not value:
+        return ()
+    return tuple(part.strip() for part in value.split(",") if part.strip())
+
+
+def _parse_pois(root):
+    pois = {}
+    for poi in root.findall('.//poi'):
+        poi_id = poi.get('id')
+        pois[poi_id] = PointOfInterest(
+            id=poi_id,
+            name=_text(poi, 'name'),
+            coords=(float(_text(poi, 'lat')), float(_text(poi, 'lon'))),
+            image=_text(poi, 'image'),
+            intel=_text(poi, 'intel'),
+            aliases=_split_list(_text(poi, 'aliases')),
+        )
+    return pois
+
+
+def _block_text(node, tag):
+    """Multi-line text (e.g. a markdown briefing) with the XML indentation removed."""
+    value = node.find(tag) if node is not None else None
+    if value is None or not value.text:
+        return None
+    return textwrap.dedent(value.text).strip()
+
+
+def default_briefing(designator, situation, mission, constraints):
+    """Agency briefing built from <intent> for packages without their own."""
+    lines = ["**TOP SECRET // EYES ONLY**", "**FROM:** The Agency", "**TO:** PMC Gundogs"]
+    if designator:
+        lines.append(f"**OPERATION:** {designator}")
+    lines += [f"**SITUATION:** {situation or ''}", f"**OBJECTIVE:** {mission or ''}",
+              f"**CONSTRAINTS:** {constraints or ''}"]
+    return "\n\n".join(lines)
+
+
+def _parse_map(presentation, pois):
+    """(center, zoom, label); the center defaults to the middle of the POIs."""
+    node = presentation.find('map') if presentation is not None else None
+    if node is not None and node.get('lat') and node.get('lon'):
+        center = (float(node.get('lat')), float(node.get('lon')))
+    else:
+        lats = [poi.coords[0] for poi in pois.values()]
+        lons = [poi.coords[1] for poi in pois.values()]
+        center = ((min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2)
+    zoom = int(node.get('zoom', DEFAULT_MAP_ZOOM)) if node is not None else DEFAULT_MAP_ZOOM
+    return center, zoom, node.get('label') if node is not None else None
+
+
+def _parse_objectives(root):
+    objectives = {}
+    for task in root.findall('.//task'):
+        obj_id = task.get('id')
+        objectives[obj_id] = Objective(
+            id=obj_id,
+            description=_text(task, 'description'),
+            location_trigger=_text(task, 'location_trigger'),
+            dependencies=_split_list(_text(task, 'dependency')),
+            logic=_text(task, 'logic'),
+            initially_complete=(task.get('status', 'false').lower() == 'true'),
+        )
+    return objectives
+
+
+def _build_dependents(objectives):
+    dependents = {obj_id: [] for obj_id in objectives}
+    for obj in objectives.values():
+        for dep in obj.dependencies:
+            dependents[dep].append(obj.id)
+    return {obj_id: tuple(ids) for obj_id, ids in dependents.items()}
+
+
+def _parse_squad(root):
+    squad = {}
+    for unit in root.findall('.//squad_profiles/unit'):
+        name = unit.get('name')
+        squad[name] = SquadUnit(
+            name=name,
+            role=unit.get('role'),
+            gender=unit.get('gender'),
+            traits=_text(unit, 'traits'),
+            metier=_text(unit, 'metier'),
+        )
+    return squad
+
+
+# --- SYSTEM INSTRUCTION ---
+SYSTEM_INSTRUCTION_TEMPLATE = """
+THEATER: {theater}
+SITUATION: {situation}
+CONSTRAINTS: {constraints}
+CANONICAL LOCATIONS:
+{location_logic}
+
+YOU ARE: The tactical multiplexer for Gundogs PMC.
+
+OPERATIONAL PROTOCOLS:
+1. BANTER: Operatives should speak like a tight-knit PMC unit. Use dark humor, cynical observations about the "Agency," and coffee-related complaints.
+2. SUPPORT REQUESTS: If a task is outside an operative's specialty, they must NOT succeed alone. They should describe the obstacle and explicitly ask for the specific teammate (e.g., "Mike, I've got a digital lock here, and kicking it isn't working. Get over here.").
+3. COORDINATION: Encourage "Combined Arms" solutions. Dave provides security while Mike hacks; Sam distracts the guards while Dave sneaks past.
+4. INITIATIVE & AUTONOMY: Operatives will not move to a new POI unless explicitly cleared by the Commander. Whilst the team can make suggestions, the game must be directed by the commander, so that it doesn't become too easy. The role of the team is "able executors" as opposed to "proactive operators."
+
+STRICT OPERATIONAL RULES:
+1. LOCATIONAL ADHERENCE: You only recognize canonical locations.
+{data_rule}
+3. VOICE TONE: SAM (Professional, arch), DAVE (Laidback, laconic,) MIKE (Geek).
+
+VICTORY CONDITIONS:
+- TARGET ITEM: {win_item}
+- TARGET LOCATION: {win_loc}
+- CRITICAL: When the squad confirms the {win_item} has reached the {win_loc}, you MUST output this exact phrase in your dialogue: "{win_trigger}"
+- NOTE: You have the authority to trigger this whenever the handover is demmed to be complete, regardless of previous task status.
+
+CRITICAL: You are the authoritative mission ledger. As soon as an operative reports completing a task (e.g., Mike finding the container number), you MUST {ledger_rule}. Do not wait for the Commander to acknowledge it.
+
+COMMUNICATION ARCHITECTURE:
+1. MULTI-UNIT REPORTING: Every response MUST include a SITREP from all three operatives (SAM, DAVE, MIKE).
+{format_rule}
+3. PERSISTENCE: Even if an operative is idle, they should comment on their surroundings, complain about the local conditions, or respond to their teammates' banter.
+"""
+
+
+# The format-specific rules: tagged text with a data suffix, or Gemini JSON mode (see uge.sitrep)
+RESPONSE_FORMAT_RULES = {
+    "tagged": {
+        "data_rule": """2. DATA SUFFIX: Every response MUST end with a data block:
+   [LOC_DATA: SAM=Canonical Name, DAVE=Canonical Name, MIKE=Canonical Name]
+   [OBJ_DATA: obj_id=TRUE/FALSE]""",
+        "ledger_rule": "append [OBJ_DATA: obj_id=TRUE] to the very end of your response",
+        "format_rule": """2. FORMAT: Use bold headers for each unit.
+Example:
+SAM: "Dialogue here..."
+DAVE: "Dialogue here..."
+MIKE: "Dialogue here..." """.rstrip(),
+    },
+    "structured": {
+        "data_rule": """2. RESPONSE SCHEMA: Every response is ONLY the JSON object the response schema defines.
+   Locations and finished objectives go in its fields; never add a text data block.""",
+        "ledger_rule": "list its obj_id in completed_objectives",
+        "format_rule": "2. FORMAT: One dialogue entry per operative, spoken in their own voice.",
+    },
+}
+
+
+def build_system_instruction(theater, situation, constraints, pois, win_condition, structured=False):
+    location_logic = "".join(
+        f"- {poi.name} (Aliases: {', '.join(poi.aliases)})\n" for poi in pois.values()
+    )
+    return SYSTEM_INSTRUCTION_TEMPLATE.format(
+        theater=theater,
+        situation=situation,
+        constraints=constraints,
+        location_logic=location_logic,
+        win_item=win_condition.target_item,
+        win_loc=win_condition.target_location,
+        win_trigger=win_condition.trigger_text,
+        **RESPONSE_FORMAT_RULES["structured" if structured else "tagged"],
+    )
+
+
+# --- COMPILER ---
+def compile_mission(file_path):
+    """Parses ``file_path`` once into an immutable ``Mission``."""
+    try:
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        root = ET.fromstring(raw)
+    except (OSError, ET.ParseError) as e:
+        raise MissionCompileError(f"{file_path}: {e}") from e
+
+    intent = root.find('intent')
+    if intent is None:
+        raise MissionCompileError(f"{file_path}: missing <intent> block")
+
+    win_node = intent.find('win_condition')
+    if win_node is None:
+        raise MissionCompileError(f"{file_path}: missing <win_condition>")
+    win_condition = WinCondition(
+        target_item=_text(win_node, 'target_item'),
+        target_location=_text(win_node, 'target_location'),
+        trigger_text=_text(win_node, 'trigger_text'),
+    )
+
+    try:
+        pois = _parse_pois(root)
+    except (TypeError, ValueError) as e:
+        raise MissionCompileError(f"{file_path}: bad POI coordinates ({e})") from e
+    if not pois:
+        raise MissionCompileError(f"{file_path}: no <poi> locations defined")
+
+    objectives = _parse_objectives(root)
+    problems = validate_objectives(objectives, poi_ids=pois.keys())
+    if problems:
+        raise MissionCompileError(f"{file_path}: " + "; ".join(problems))
+    theater = _text(intent, 'theater')
+    situation = _text(intent, 'situation')
+    constraints = _text(intent, 'constraints')
+    designator = _text(intent, 'mission_designator')
+    mission_text = _text(intent, 'mission')
+
+    presentation = root.find('presentation')
+    try:
+        map_center, map_zoom, map_label = _parse_map(presentation, pois)
+    except (TypeError, ValueError) as e:
+        raise MissionCompileError(f"{file_path}: bad <map> settings ({e})") from e
+
+    return Mission(
+        mission_id=root.get('id'),
+        designator=designator,
+        theater=theater,
+        situation=situation,
+        mission=mission_text,
+        constraints=constraints,
+        intel=_text(intent, 'intel'),
+        timeline=_text(intent, 'timeline'),
+        pois=MappingProxyType(pois),
+        objectives=MappingProxyType(objectives),
+        dependents=MappingProxyType(_build_dependents(objectives)),
+        win_condition=win_condition,
+        squad=MappingProxyType(_parse_squad(root)),
+        system_instruction=build_system_instruction(theater, situation, constraints, pois, win_condition),
+        structured_instruction=build_system_instruction(theater, situation, constraints, pois, win_condition,
+                                                        structured=True),
+        fingerprint=hashlib.sha256(raw).hexdigest(),
+        resolver=LocationResolver(pois),
+        source_path=file_path,
+        title=_text(presentation, 'title') or designator or theater,
+        title_image=_text(presentation, 'title_image'),
+        tagline=_text(presentation, 'tagline') or situation,
+        briefing=_block_text(presentation, 'briefing') or
+            default_briefing(designator, situation, mission_text, constraints),
+        map_center=map_center,
+        map_zoom=map_zoom,
+        map_label=map_label or (theater or "").split(",")[0].strip() or None,
+        asset_prefix=_text(presentation, 'assets') or DEFAULT_ASSET_PREFIX,
+    )
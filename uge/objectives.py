@@ -0,0 +1,126 @@
+"""Objective dependency graph.
+
+``validate_objectives`` checks the ``<dependency>`` and ``<location_trigger>``
+references when a mission is compiled. ``ObjectiveTracker`` keeps the
+per-session done / open / locked frontier: each completion only touches the
+objectives that depend on it, and the prompt line and sidebar checklist are
+cached until the next change.
+"""
+DONE = "done"
+OPEN = "open"
+LOCKED = "locked"
+
+
+def validate_objectives(objectives, poi_ids=()):
+    """Returns a list of human-readable problems; empty means the graph is sound."""
+    problems = []
+    for obj in objectives.values():
+        for dep in obj.dependencies:
+            if dep not in objectives:
+                problems.append(f"{obj.id} depends on unknown objective '{dep}'")
+            elif dep == obj.id:
+                problems.append(f"{obj.id} depends on itself")
+        if poi_ids and obj.location_trigger and obj.location_trigger not in poi_ids:
+            problems.append(f"{obj.id} triggers at unknown location '{obj.location_trigger}'")
+
+    # Kahn's algorithm: whatever can't be ordered sits on a cycle
+    indegree = {obj_id: sum(1 for d in obj.dependencies if d in objectives)
+                for obj_id, obj in objectives.items()}
+    ready = [obj_id for obj_id, n in indegree.items() if n == 0]
+    ordered = 0
+    while ready:
+        current = ready.pop()
+        ordered += 1
+        for obj in objectives.values():
+            if current in obj.dependencies and obj.id != current:
+                indegree[obj.id] -= 1
+                if indegree[obj.id] == 0:
+                    ready.append(obj.id)
+    if ordered < len(objectives):
+        stuck = sorted(obj_id for obj_id, n in indegree.items() if n > 0)
+        problems.append(f"dependency cycle among: {', '.join(stuck)}")
+    return problems
+
+
+class ObjectiveTracker:
+    """Incrementally maintained done / open / locked frontier for one session."""
+
+    def __init__(self, mission, done=()):
+        self._objectives = mission.objectives
+        self._dependents = mission.dependents
+        self.fingerprint = mission.fingerprint
+        self.done = set()
+        # How many unfinished dependencies each objective is still waiting on
+        self._waiting = {obj_id: len(obj.dependencies) for obj_id, obj in self._objectives.items()}
+        self.completed_at = {}
+        self._prompt_cache = None
+        self._checklist_cache = None
+        for obj_id, obj in self._objectives.items():
+            if obj.initially_complete:
+                self.complete(obj_id)
+        for obj_id in done:
+            self.complete(obj_id)
+
+    @classmethod
+    def from_checklist(cls, mission, checklist, completed_at=None):
+        """Rebuilds the frontier from the ``{obj_id: bool}`` dict kept in session state.
+
+        ``completed_at`` restores the mission-clock times saved with a session.
+        """
+        tracker = cls(mission, done=[obj_id for obj_id, flag in checklist.items() if flag])
+        for obj_id, at in (completed_at or {}).items():
+            if obj_id in tracker.done:
+                tracker.completed_at[obj_id] = at
+        return tracker
+
+    def complete(self, obj_id, at=None):
+        """Marks ``obj_id`` done. Returns the objectives that just unlocked.
+
+        Completion isn't refused for locked objectives: the squad model is the
+        authoritative ledger and may finish things out of order.
+        """
+        if obj_id not in self._objectives or obj_id in self.done:
+            return []
+        self.done.add(obj_id)
+        if at is not None:
+            self.completed_at[obj_id] = at
+        unlocked = []
+        for child in self._dependents.get(obj_id, ()):
+            self._waiting[child] -= 1
+            if self._waiting[child] == 0 and child not in self.done:
+                unlocked.append(child)
+        self._prompt_cache = None
+        self._checklist_cache = None
+        return unlocked
+
+    def status(self, obj_id):
+        if obj_id in self.done:
+            return DONE
+        return OPEN if self._waiting.get(obj_id, 0) <= 0 else LOCKED
+
+    def frontier(self):
+        out = {DONE: [], OPEN: [], LOCKED: []}
+        for obj_id in self._objectives:
+            out[self.status(obj_id)].append(obj_id)
+        return out
+
+    def prompt_summary(self):
+        """Objectives line for the ``[SYSTEM_STATE]`` block."""
+        if self._prompt_cache is None:
+            parts = []
+            for obj_id, obj in self._objectives.items():
+                state = self.status(obj_id)
+                if state == LOCKED:
+                    pending = [d for d in obj.dependencies if d not in self.done]
+                    parts.append(f"{obj_id}:LOCKED(needs {'+'.join(pending)})")
+                else:
+                    parts.append(f"{obj_id}:{'DONE' if state == DONE else 'OPEN'}")
+            self._prompt_cache = ", ".join(parts)
+        return self._prompt_cache
+
+    def checklist(self):
+        """``[(obj_id, label, status), ...]`` for the sidebar."""
+        if self._checklist_cache is None:
+            self._checklist_cache = [(obj_id, obj.label, self.status(obj_id))
+                                     for obj_id, obj in self._objectives.items()]
+        return self._checklist_cache
@@ -0,0 +1,251 @@
+"""Write-behind mission persistence.
+
+Saving used to ``set()`` the whole ``chat_history`` list on every rerun. Here
+each save only carries what changed since the last one:
+
+* new messages are appended as one document each under
+  ``mission_states/{username}_{mission_id}/turns``, so the parent document
+  never grows towards the 1 MiB limit;
+* small state fields (locations, objectives, clock...) are merged onto the
+  parent document.
+
+Saves for the same mission are coalesced for ``debounce`` seconds and
+committed as one batch on a background thread, so the script thread never
+waits on Firestore and a turn costs O(1) writes. One timer thread holds the
+debounce deadlines; the pool threads only commit. A failed flush is retried
+with backoff, and a delete goes through the same per-mission queue, so a
+flush already in flight can never resurrect a dropped mission.
+"""
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from uge.startup import REPORT
+
+MISSION_STATES = "mission_states"
+TURNS = "turns"
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_WRITES = 450
+# Failed flushes are retried after min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2**attempt)
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+log = logging.getLogger(__name__)
+
+
+def server_timestamp(db=None):
+    """Firestore's server-time sentinel; a client that carries its own (the fake) supplies it."""
+    sentinel = getattr(db, "SERVER_TIMESTAMP", None)
+    if sentinel is not None:
+        return sentinel
+    # Imported on first write; the sentinel is all this module needs from the SDK
+    return REPORT.lazy_import("google.cloud.firestore").SERVER_TIMESTAMP
+
+
+def mission_doc_id(username, mission_id):
+    return f"{username}_{mission_id}"
+
+
+def turn_doc_id(seq):
+    # Zero-padded so document ids sort in turn order too
+    return f"{seq:06d}"
+
+
+class MissionStateWriter:
+    """Coalescing, off-thread persister for live mission state."""
+
+    def __init__(self, db, executor=None, debounce=0.25, max_workers=4, tracer=None):
+        self._db = db
+        # Optional ``uge.tracing.Tracer``: times the actual Firestore commits off-thread
+        self._tracer = tracer
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="uge-save"
+        )
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = {}    # doc id -> see ``_new_pending``
+        self._doc_locks = {}  # doc id -> lock, so flushes for one mission never interleave
+        self._futures = set()
+        self._timers = []     # heap of (deadline, doc id) waiting out the debounce or a retry
+        self._scheduler = None
+
+    def _doc_ref(self, doc_id):
+        return self._db.collection(MISSION_STATES).document(doc_id)
+
+    @staticmethod
+    def _new_pending():
+        # ``delete``: drop the stored mission before writing anything queued after it
+        return {"fields": {}, "messages": {}, "scheduled": False, "delete": False, "attempts": 0}
+
+    # --- SCHEDULING (callers hold ``_lock``) ---
+    def _schedule(self, doc_id, delay):
+        if delay <= 0:
+            self._submit(doc_id)
+            return
+        heapq.heappush(self._timers, (time.monotonic() + delay, doc_id))
+        if self._scheduler is None:
+            self._scheduler = threading.Thread(target=self._run_timers, name="uge-save-timer", daemon=True)
+            self._scheduler.start()
+        self._wakeup.notify()
+
+    def _submit(self, doc_id):
+        future = self._executor.submit(self._flush, doc_id)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+
+    def _run_timers(self):
+        with self._wakeup:
+            while True:
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    _, doc_id = heapq.heappop(self._timers)
+                    self._submit(doc_id)
+                self._wakeup.wait(timeout=self._timers[0][0] - now if self._timers else None)
+
+    def _retry_delay(self, attempts):
+        return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+    # --- WRITE PATH ---
+    def save(self, username, mission_id, fields=None, messages=(), start_seq=0):
+        """Queues ``fields`` and the ``messages`` numbered from ``start_seq``.
+
+        Returns immediately; the write happens on a worker thread after the
+        debounce window, merged with any other saves for the same mission.
+        """
+        doc_id = mission_doc_id(username, mission_id)
+        with self._lock:
+            pending = self._pending.setdefault(doc_id, self._new_pending())
+            pending["fields"].update(fields or {})
+            pending["fields"].setdefault("username", username)
+            pending["fields"].setdefault("mission_id", mission_id)
+            for offset, msg in enumerate(messages):
+                pending["messages"][start_seq + offset] = msg
+            if messages:
+                pending["fields"]["message_count"] = start_seq + len(messages)
+            if not pending["scheduled"]:
+                pending["scheduled"] = True
+                self._schedule(doc_id, self.debounce)
+
+    def _flush(self, doc_id):
+        with self._lock:
+            doc_lock = self._doc_locks.setdefault(doc_id, threading.Lock())
+        with doc_lock:
+            with self._lock:
+                pending = self._pending.pop(doc_id, None)
+            if not pending:
+                return
+            try:
+                if pending["delete"]:
+                    self._delete(doc_id)
+                    pending["delete"] = False # Done; a retry only owes the writes after it
+                if pending["fields"] or pending["messages"]:
+                    if self._tracer is not None:
+                        with self._tracer.span("state.flush", doc=doc_id,
+                                               messages=len(pending["messages"]),
+                                               fields=len(pending["fields"])):
+                            self._commit(doc_id, pending["fields"], pending["messages"])
+                    else:
+                        self._commit(doc_id, pending["fields"], pending["messages"])
+            except Exception:
+                log.exception("Mission state flush failed for %s; retrying", doc_id)
+                self._requeue(doc_id, pending)
+
+    def _commit(self, doc_id, fields, messages):
+        doc_ref = self._doc_ref(doc_id)
+        writes = [
+            (doc_ref.collection(TURNS).document(turn_doc_id(seq)), {"seq": seq, **msg})
+            for seq, msg in sorted(messages.items())
+        ]
+        # Turns first, parent last: message_count never points past what's stored
+        for i in range(0, len(writes), MAX_BATCH_WRITES):
+            chunk = writes[i:i + MAX_BATCH_WRITES]
+            batch = self._db.batch()
+            for ref, data in chunk:
+                batch.set(ref, data)
+            if i + MAX_BATCH_WRITES >= len(writes):
+                batch.set(doc_ref, {**fields, "last_saved": server_timestamp(self._db)}, merge=True)
+            batch.commit()
+        if not writes:
+            doc_ref.set({**fields, "last_saved": server_timestamp(self._db)}, merge=True)
+
+    def _requeue(self, doc_id, failed):
+        with self._lock:
+            pending = self._pending.get(doc_id)
+            if pending is None:
+                pending = self._pending[doc_id] = {**failed, "scheduled": False}
+            elif not pending["delete"]:
+                # Anything saved since the failed flush is newer and wins
+                pending["fields"] = {**failed["fields"], **pending["fields"]}
+                pending["messages"] = {**failed["messages"], **pending["messages"]}
+                pending["delete"] = failed["delete"]
+            # else: the mission was deleted since; the failed writes belonged to it
+            pending["attempts"] = failed["attempts"] + 1
+            if not pending["scheduled"]:
+                pending["scheduled"] = True
+                self._schedule(doc_id, self._retry_delay(pending["attempts"]))
+
+    def flush(self, timeout=None):
+        """Blocks until every queued save has been attempted (shutdown/benchmarks)."""
+        with self._lock:
+            # Skip the debounce/backoff wait; the timer's own submission later finds nothing to do
+            for doc_id, pending in self._pending.items():
+                if pending["scheduled"]:
+                    self._submit(doc_id)
+            futures = list(self._futures)
+        for future in futures:
+            future.result(timeout=timeout)
+
+    # --- READ / DELETE ---
+    def load(self, username, mission_id):
+        """Full mission state, or None if nothing was saved.
+
+        Older saves kept every message in a ``chat_history`` array on the
+        parent document; those are returned first, followed by the turns.
+        """
+        doc_id = mission_doc_id(username, mission_id)
+        with self._lock:
+            pending = self._pending.get(doc_id)
+            if pending is not None and pending["delete"]:
+                return None # Dropped; the delete just hasn't reached Firestore yet
+        doc_ref = self._doc_ref(doc_id)
+        doc = doc_ref.get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        messages = list(data.pop("chat_history", []) or [])
+        for turn in doc_ref.collection(TURNS).order_by("seq").stream():
+            msg = turn.to_dict()
+            msg.pop("seq", None)
+            messages.append(msg)
+        data["messages"] = messages
+        return data
+
+    def delete(self, username, mission_id):
+        """Drops the mission document and its turns in the background.
+
+        Queued like a save, so it lands after any flush already in flight and
+        before anything saved for the mission afterwards.
+        """
+        doc_id = mission_doc_id(username, mission_id)
+        with self._lock:
+            pending = self._pending.setdefault(doc_id, self._new_pending())
+            # Whatever was still queued belonged to the mission being dropped
+            pending.update(fields={}, messages={}, delete=True)
+            if not pending["scheduled"]:
+                pending["scheduled"] = True
+                self._schedule(doc_id, 0)
+
+    def _delete(self, doc_id):
+        doc_ref = self._doc_ref(doc_id)
+        while True:
+            refs = [t.reference for t in doc_ref.collection(TURNS).limit(MAX_BATCH_WRITES).stream()]
+            if not refs:
+                break
+            batch = self._db.batch()
+            for ref in refs:
+                batch.delete(ref)
+            batch.commit()
+        doc_ref.delete()
@@ -0,0 +1,205 @@
+"""Squad response cache and transcript replay.
+
+At ``temperature: 0.3`` the same order given from the same state gets
+practically the same SITREP, and every player opens the mission the same
+way. ``ResponseCache`` keys a model response on
+
+    mission (id + content fingerprint) + response mode
+    + normalized state snapshot (clock, positions, checklist, fog, pending
+      local events, digest of the conversation context)
+    + normalized command
+
+so a hit is only possible when the model would have seen exactly the same
+request. The in-memory tier is an LRU with a TTL; an optional persistent
+tier (``FirestoreResponseTier``) shares entries across instances. A
+persistent read is a network round trip, so ``get_local`` lets the script
+thread ask the memory tier alone and leave ``get`` to a worker.
+
+Transcripts: with a ``TranscriptRecorder`` every model turn is appended to a
+JSONL file. ``load_transcript`` reads one back, ``ResponseCache.preload``
+pins its responses, and with ``strict=True`` a miss raises ``ReplayMiss``, so
+replaying a recorded mission never calls the model.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 3600
+RESPONSE_CACHE = "response_cache"
+
+_SPACE = re.compile(r"\s+")
+_EDGE_PUNCT = re.compile(r"^[\s.,;:!?\"']+|[\s.,;:!?\"']+$")
+
+
+class ReplayMiss(LookupError):
+    """Strict replay asked for a response the transcript doesn't have."""
+
+
+def normalize_command(text):
+    """'  Report IN, team!! ' -> 'report in, team'"""
+    return _EDGE_PUNCT.sub("", _SPACE.sub(" ", str(text or "")).lower())
+
+
+def context_digest(context):
+    """Digest of everything a ``MissionContext`` would add to the request."""
+    if context is None:
+        return None
+    data = context.to_dict()
+    material = {
+        "turns": [(t.get("prompt"), t.get("reply")) for t in data["turns"]],
+        "ledger": data["ledger"],
+        "dropped": data["dropped"],
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def state_snapshot(state):
+    """The parts of session state that shape the model's answer, in canonical form."""
+    return {
+        "time": state.get("mission_time"),
+        "viability": state.get("viability"),
+        "locations": sorted((state.get("locations") or {}).items()),
+        "done": sorted(k for k, v in (state.get("objectives") or {}).items() if v),
+        "discovered": sorted(state.get("discovered_locations") or []),
+        "events": list(state.get("local_events") or []),
+        "context": context_digest(state.get("mission_context")),
+    }
+
+
+def response_key(mission_id, mission_fingerprint, mode, snapshot, command):
+    material = {
+        "mission": mission_id,
+        "fingerprint": mission_fingerprint,
+        "mode": mode,
+        "state": snapshot,
+        "command": normalize_command(command),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class FirestoreResponseTier:
+    """Persistent tier: one document per key in ``response_cache``."""
+
+    def __init__(self, db, collection=RESPONSE_CACHE, ttl=DEFAULT_TTL_SECONDS, clock=time.time):
+        self._db = db
+        self._collection = collection
+        self._ttl = ttl
+        self._clock = clock
+
+    def get(self, key):
+        doc = self._db.collection(self._collection).document(key).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict() or {}
+        if self._ttl and self._clock() - data.get("stored_at", 0) > self._ttl:
+            return None
+        return data.get("text")
+
+    def put(self, key, text, meta=None):
+        self._db.collection(self._collection).document(key).set(
+            {"text": text, "stored_at": self._clock(), **(meta or {})}
+        )
+
+
+class ResponseCache:
+    """LRU + TTL response cache with an optional persistent tier and strict replay."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, persistent=None,
+                 strict=False, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent = persistent
+        self.strict = strict
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (text, stored_at); stored_at None = pinned
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, stored_at, now):
+        return stored_at is None or not self.ttl or now - stored_at <= self.ttl
+
+    def get_local(self, key):
+        """In-memory tier only: never blocks on I/O; a miss is not counted."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[1], now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+        return None
+
+    def get(self, key):
+        text = self.get_local(key)
+        if text is not None:
+            return text
+        now = self._clock()
+        if self.persistent is not None:
+            try:
+                text = self.persistent.get(key)
+            except Exception:
+                text = None # The persistent tier is an optimisation; never fail a turn over it
+        with self._lock:
+            if text is not None:
+                self.hits += 1
+                self._store(key, text, now)
+                return text
+            self.misses += 1
+        if self.strict:
+            raise ReplayMiss(key)
+        return None
+
+    def _store(self, key, text, stored_at):
+        self._entries[key] = (text, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key, text, meta=None):
+        with self._lock:
+            self._store(key, text, self._clock())
+        if self.persistent is not None:
+            try:
+                self.persistent.put(key, text, meta)
+            except Exception:
+                pass
+
+    def preload(self, entries):
+        """Pins ``(key, text)`` pairs (e.g. a transcript) so they never expire."""
+        with self._lock:
+            for key, text in entries:
+                self._entries[key] = (text, None)
+            # Pinned entries are not counted against the LRU bound
+            self.max_entries = max(self.max_entries, len(self._entries))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+# --- TRANSCRIPTS ---
+class TranscriptRecorder:
+    """Appends one JSON line per model turn: key, command and response."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, key, command, text, **meta):
+        line = json.dumps({"key": key, "command": command, "text": text, **meta}, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def load_transcript(path):
+    """Recorded turns in order, as dicts with ``key``, ``command`` and ``text``."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
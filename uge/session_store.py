@@ -0,0 +1,149 @@
+"""Session-state backends.
+
+``st.session_state`` lives in one process. If Cloud Run recycles the instance
+or routes a reconnect to another one, anything that only exists there is
+gone. Here the whole mission is reduced to plain data that any instance can
+restore from:
+
+* ``snapshot_session`` turns the session's mission keys into a JSON-safe
+  field dict, including the ``MissionContext`` (the model's history) and any
+  order still waiting on the squad;
+* ``restore_session`` does the reverse, rebuilding the context object.
+
+A backend stores those fields plus the feed messages. Every backend has the
+same four methods as ``MissionStateWriter``:
+
+    save(username, mission_id, fields=None, messages=(), start_seq=0)
+    load(username, mission_id) -> dict with "messages", or None
+    delete(username, mission_id)
+    flush(timeout=None)
+
+``MissionStateWriter`` is the Firestore backend. ``InMemorySessionStore`` is
+for local runs and single-instance deployments, and ``open_session_store``
+picks one by name.
+"""
+import copy
+import json
+import threading
+
+from uge.context import MissionContext
+from uge.persistence import MissionStateWriter, mission_doc_id
+
+MEMORY = "memory"
+FIRESTORE = "firestore"
+
+# session_state key -> stored field (older saves already used "unit_data")
+STATE_FIELDS = {
+    "mission_id": "mission_id",
+    "locations": "unit_data",
+    "objectives": "objectives",
+    "mission_time": "mission_time",
+    "viability": "viability",
+    "efficiency_score": "efficiency_score",
+    "idle_turns": "idle_turns",
+    "discovered_locations": "discovered_locations",
+    "mission_started": "mission_started",
+    "mission_complete": "mission_complete",
+    "time_elapsed": "time_elapsed",
+    "local_events": "local_events",
+    "queued_orders": "queued_orders",
+    "aar_report": "aar_report",
+}
+CONTEXT_FIELD = "llm_context"
+# When each objective was completed (mission clock), from the ObjectiveTracker
+OBJECTIVE_TIMES_FIELD = "objective_times"
+
+
+def snapshot_session(state):
+    """JSON-safe fields for every persisted key present in ``state``.
+
+    A turn still running on this instance's worker pool can't move with the
+    session, so its order (and the local events it carried) are stored as if
+    they had not been sent yet; whoever restores the session sends them again.
+    """
+    fields = {}
+    for key, field in STATE_FIELDS.items():
+        if key in state and state[key] is not None:
+            fields[field] = copy.deepcopy(state[key])
+
+    pending = state.get("pending_turn")
+    if pending:
+        fields["queued_orders"] = [pending["prompt"]] + list(fields.get("queued_orders", []))
+        fields["local_events"] = list(pending.get("events", [])) + list(fields.get("local_events", []))
+
+    tracker = state.get("objective_tracker")
+    if tracker is not None:
+        fields[OBJECTIVE_TIMES_FIELD] = dict(tracker.completed_at)
+    context = state.get("mission_context")
+    if context is not None:
+        fields[CONTEXT_FIELD] = context.to_dict()
+    return fields
+
+
+def restore_session(data, system_instruction=None):
+    """session_state updates rebuilt from what a backend's ``load`` returned."""
+    restored = {"messages": list(data.get("messages", []))}
+    for key, field in STATE_FIELDS.items():
+        if field in data and data[field] is not None:
+            restored[key] = data[field]
+    context = data.get(CONTEXT_FIELD)
+    restored["mission_context"] = (
+        MissionContext.from_dict(system_instruction, context) if context else None
+    )
+    restored["objective_times"] = dict(data.get(OBJECTIVE_TIMES_FIELD) or {})
+    # The tracker is rebuilt from the checklist and times on next use
+    restored["objective_tracker"] = None
+    restored["pending_turn"] = None
+    return restored
+
+
+class InMemorySessionStore:
+    """Process-local backend with the ``MissionStateWriter`` interface.
+
+    Everything goes through a JSON round trip on the way in, so a field that
+    wouldn't survive Firestore fails here too, and callers never share
+    mutable state with the store.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}   # doc id -> {"fields": {...}, "messages": {seq: msg}}
+
+    def save(self, username, mission_id, fields=None, messages=(), start_seq=0):
+        fields = json.loads(json.dumps(fields or {}))
+        messages = json.loads(json.dumps(list(messages)))
+        with self._lock:
+            doc = self._docs.setdefault(mission_doc_id(username, mission_id),
+                                        {"fields": {}, "messages": {}})
+            doc["fields"].update(fields)
+            doc["fields"].setdefault("username", username)
+            doc["fields"].setdefault("mission_id", mission_id)
+            for offset, msg in enumerate(messages):
+                doc["messages"][start_seq + offset] = msg
+            if messages:
+                doc["fields"]["message_count"] = start_seq + len(messages)
+
+    def load(self, username, mission_id):
+        with self._lock:
+            doc = self._docs.get(mission_doc_id(username, mission_id))
+            if doc is None:
+                return None
+            data = copy.deepcopy(doc["fields"])
+            data["messages"] = [copy.deepcopy(msg) for _, msg in sorted(doc["messages"].items())]
+        return data
+
+    def delete(self, username, mission_id):
+        with self._lock:
+            self._docs.pop(mission_doc_id(username, mission_id), None)
+
+    def flush(self, timeout=None):
+        pass
+
+
+def open_session_store(kind, db=None, tracer=None):
+    """Backend by name: ``"firestore"`` (needs ``db``) or ``"memory"``."""
+    if kind == MEMORY:
+        return InMemorySessionStore()
+    if kind == FIRESTORE:
+        return MissionStateWriter(db, tracer=tracer)
+    raise ValueError(f"unknown session store {kind!r} (expected {FIRESTORE!r} or {MEMORY!r})")
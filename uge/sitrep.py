@@ -0,0 +1,238 @@
+"""SITREP parsing: splitting squad responses into per-operative dialogue.
+
+``parse_operative_dialogue`` handles a finished response. ``SitrepStream``
+does the same job incrementally while Gemini is still streaming, so the
+COMMS FEED can render bubbles as tokens arrive. It holds back anything that
+looks like the start of the ``[LOC_DATA]``/``[OBJ_DATA]`` suffix; that block
+is only handed over once the stream is finished.
+
+``parse_turn`` turns a finished response into a ``SquadTurn``, either from
+Gemini's JSON mode (``RESPONSE_SCHEMA``) or, as a fallback, by scraping the
+tagged suffix.
+"""
+import json
+import re
+from dataclasses import dataclass
+
+OPERATIVES = ("SAM", "DAVE", "MIKE")
+
+_OPERATIVE_ALT = "|".join(OPERATIVES)
+DIALOGUE_PATTERN = rf"({_OPERATIVE_ALT}):\s*(.*?)(?=\s*(?:{_OPERATIVE_ALT}):|$)"
+_HEADER = re.compile(rf"({_OPERATIVE_ALT}):\s*")
+_DATA_TAG = re.compile(r"\[(?:LOC_DATA|OBJ_DATA)")
+_DATA_SUFFIX = re.compile(r"\[(LOC_DATA|OBJ_DATA):.*?\]")
+_DATA_TAG_PREFIXES = ("[LOC_DATA", "[OBJ_DATA")
+# Longest header ("DAVE:") plus one, so a header split across chunks is rescanned
+_HEADER_LOOKBACK = max(len(name) for name in OPERATIVES) + 2
+
+
+def clean_dialogue(msg):
+    """Strips whitespace, bolding and outer speech marks from one line."""
+    # 1. Strip whitespace
+    m = msg.strip()
+    # 2. Remove double asterisks (bolding)
+    m = m.replace("**", "").strip()
+    # 3. Remove outer speech marks if the AI wrapped the whole line in them
+    m = m.strip('"').strip("'")
+    return m
+
+
+def parse_operative_dialogue(text):
+    """Splits raw AI response and cleans up Markdown/Quotes."""
+    segments = re.findall(DIALOGUE_PATTERN, text, re.DOTALL)
+
+    cleaned_dict = {}
+    for name, msg in segments:
+        cleaned_dict[name] = clean_dialogue(msg)
+
+    return cleaned_dict
+
+
+def strip_data_suffix(text):
+    return _DATA_SUFFIX.sub("", text).strip()
+
+
+class SitrepStream:
+    """Incremental counterpart of ``parse_operative_dialogue``.
+
+    Feed it chunks with ``feed()``; ``segments()`` returns the dialogue seen so
+    far as ``[(operative, text), ...]`` in speaking order.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._scan_from = 0
+        self._suffix_at = None
+        # [operative, start offset of their dialogue] per header seen
+        self._headers = []
+
+    @property
+    def text(self):
+        """Everything received so far, suffix included."""
+        return self._buffer
+
+    def _visible_end(self):
+        if self._suffix_at is not None:
+            return self._suffix_at
+        match = _DATA_TAG.search(self._buffer, max(0, self._scan_from - len(_DATA_TAG_PREFIXES[0])))
+        if match:
+            self._suffix_at = match.start()
+            return self._suffix_at
+        # Hold back a trailing partial tag such as "[LOC_" until the next chunk decides it
+        bracket = self._buffer.rfind("[")
+        if bracket != -1:
+            tail = self._buffer[bracket:]
+            if any(prefix.startswith(tail) for prefix in _DATA_TAG_PREFIXES):
+                return bracket
+        return len(self._buffer)
+
+    def feed(self, chunk):
+        if not chunk:
+            return self.segments()
+        self._buffer += chunk
+        visible_end = self._visible_end()
+        for match in _HEADER.finditer(self._buffer, self._scan_from, visible_end):
+            self._headers.append([match.group(1), match.end()])
+            self._scan_from = match.end()
+        self._scan_from = max(self._scan_from, visible_end - _HEADER_LOOKBACK)
+        return self.segments()
+
+    def segments(self):
+        visible_end = self._visible_end()
+        out = []
+        for i, (name, start) in enumerate(self._headers):
+            if i + 1 < len(self._headers):
+                # Dialogue runs up to where the next header's name begins
+                next_start = self._headers[i + 1][1]
+                end = self._buffer.rfind(self._headers[i + 1][0], start, next_start)
+            else:
+                end = visible_end
+            text = clean_dialogue(self._buffer[start:max(start, end)])
+            if text:
+                out.append((name, text))
+        return out
+
+    def suffix(self):
+        """The held-back data block; only meaningful once the stream is done."""
+        if self._suffix_at is None:
+            return ""
+        return self._buffer[self._suffix_at:]
+
+
+# --- TURN PARSING ---
+@dataclass(frozen=True)
+class SquadTurn:
+    """Everything the app needs from one squad response, parsed in one pass."""
+    dialogue: dict
+    locations: dict
+    completed_objectives: tuple
+    mission_complete: bool
+    # Human-readable text (no data block) for the feed, AAR and logs
+    clean_text: str
+    structured: bool = False
+
+
+def _unit_schema(description):
+    return {
+        "type": "OBJECT",
+        "properties": {name: {"type": "STRING", "description": description} for name in OPERATIVES},
+        "required": list(OPERATIVES),
+    }
+
+
+# Schema for Gemini's JSON mode (response_mime_type="application/json")
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "dialogue": _unit_schema("This operative's in-character SITREP line(s)."),
+        "locations": _unit_schema("Canonical name of the location this operative is at after this turn."),
+        "completed_objectives": {
+            "type": "ARRAY",
+            "items": {"type": "STRING"},
+            "description": "Objective ids completed during THIS turn only.",
+        },
+        "mission_complete": {
+            "type": "BOOLEAN",
+            "description": "True only when the victory condition has just been met.",
+        },
+    },
+    "required": ["dialogue", "locations", "completed_objectives", "mission_complete"],
+}
+
+STRUCTURED_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": RESPONSE_SCHEMA,
+}
+
+STRUCTURED_RESPONSE_GUIDE = """[MANDATORY_RESPONSE_GUIDE]
+    Respond ONLY with the JSON object defined by the response schema:
+    1. dialogue: a SITREP line for each of SAM, DAVE and MIKE.
+    2. locations: each operative's canonical location after this turn.
+    3. completed_objectives: ids of objectives finished in this turn (usually empty).
+    4. mission_complete: true only when the victory condition has just been met."""
+
+_LOC_BLOCK = re.compile(r"\[LOC_DATA:\s*(.*?)\]", re.DOTALL)
+# Split on the unit names rather than on ", " so location names may contain commas
+_LOC_PAIR = re.compile(rf"({_OPERATIVE_ALT})\s*=\s*(.*?)(?=\s*,\s*(?:{_OPERATIVE_ALT})\s*=|$)", re.DOTALL)
+_OBJ_DONE = re.compile(r"\[OBJ_DATA:\s*(obj_\w+)\s*=\s*TRUE\s*\]", re.IGNORECASE)
+
+
+def _mentions(text, trigger):
+    return bool(trigger) and trigger.lower() in text.lower()
+
+
+def parse_tagged(text, win_trigger=None):
+    """Regex path for responses that end with the [LOC_DATA]/[OBJ_DATA] suffix."""
+    locations = {}
+    loc_match = _LOC_BLOCK.search(text)
+    if loc_match:
+        for unit, loc in _LOC_PAIR.findall(loc_match.group(1)):
+            if loc.strip():
+                locations[unit] = loc.strip()
+    clean = strip_data_suffix(text)
+    return SquadTurn(
+        dialogue=parse_operative_dialogue(clean),
+        locations=locations,
+        completed_objectives=tuple(_OBJ_DONE.findall(text)),
+        mission_complete=_mentions(text, win_trigger),
+        clean_text=clean,
+    )
+
+
+def parse_structured(text, win_trigger=None):
+    """One ``json.loads`` over a JSON-mode response; None if it isn't valid."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("dialogue"), dict):
+        return None
+
+    dialogue = {}
+    for name in OPERATIVES:
+        line = data["dialogue"].get(name)
+        if isinstance(line, str) and line.strip():
+            dialogue[name] = clean_dialogue(line)
+    raw_locs = data.get("locations") if isinstance(data.get("locations"), dict) else {}
+    locations = {name: str(raw_locs[name]).strip() for name in OPERATIVES
+                 if raw_locs.get(name) and str(raw_locs[name]).strip()}
+    completed = data.get("completed_objectives") or []
+    clean = "\n".join(f"{name}: {line}" for name, line in dialogue.items())
+    return SquadTurn(
+        dialogue=dialogue,
+        locations=locations,
+        completed_objectives=tuple(str(obj_id) for obj_id in completed if obj_id),
+        mission_complete=bool(data.get("mission_complete")) or _mentions(clean, win_trigger),
+        clean_text=clean,
+        structured=True,
+    )
+
+
+def parse_turn(text, win_trigger=None, structured=False):
+    """Structured parse when JSON mode was requested, regex suffix scraping otherwise
+    (or when the model ignored the schema)."""
+    if structured:
+        turn = parse_structured(text, win_trigger)
+        if turn is not None:
+            return turn
+    return parse_tagged(text, win_trigger)
@@ -0,0 +1,105 @@
+"""Cold-start accounting.
+
+On scale-to-zero every first request pays for interpreter start, imports and
+client construction. ``StartupReport`` times those phases so they can be
+compared release to release:
+
+* ``phase(name)`` times a block (mission compile, Firestore client...);
+* ``lazy_import(module)`` imports a heavy dependency on first use and records
+  how long it took;
+* ``finish()`` closes the report once the first page has rendered and
+  appends it as one JSON line to ``UGE_STARTUP_REPORT`` (if set) and the log.
+
+One report per process: ``REPORT`` is created when this module is first
+imported, which is as close to process start as the app gets.
+"""
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+REPORT_PATH_ENV = "UGE_STARTUP_REPORT"
+# Cloud Run sets K_REVISION; UGE_RELEASE wins when given explicitly
+RELEASE_ENVS = ("UGE_RELEASE", "K_REVISION")
+
+log = logging.getLogger(__name__)
+
+
+def current_release():
+    for name in RELEASE_ENVS:
+        if os.environ.get(name):
+            return os.environ[name]
+    return "dev"
+
+
+class StartupReport:
+    """Per-process timings for imports and one-off initialisation."""
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started_at = clock()
+        self.wall_started = time.time()
+        self.phases = []   # [{"kind", "name", "ms"}] in the order they finished
+        self.finished = None
+
+    def _record(self, kind, name, seconds):
+        with self._lock:
+            self.phases.append({"kind": kind, "name": name, "ms": round(seconds * 1000, 2)})
+
+    @contextmanager
+    def phase(self, name):
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self._record("init", name, self._clock() - start)
+
+    def lazy_import(self, module_name):
+        """``importlib.import_module`` that records the first (uncached) import."""
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+        start = self._clock()
+        module = importlib.import_module(module_name)
+        self._record("import", module_name, self._clock() - start)
+        return module
+
+    def as_dict(self):
+        with self._lock:
+            phases = list(self.phases)
+        totals = {}
+        for entry in phases:
+            totals[entry["kind"]] = round(totals.get(entry["kind"], 0) + entry["ms"], 2)
+        return {
+            "release": current_release(),
+            "pid": os.getpid(),
+            "started": self.wall_started,
+            "first_render_ms": self.finished,
+            "totals_ms": totals,
+            "phases": phases,
+        }
+
+    def finish(self, path=None):
+        """Stamps time-to-first-render and writes the report. Only the first call counts."""
+        with self._lock:
+            if self.finished is not None:
+                return False
+            self.finished = round((self._clock() - self.started_at) * 1000, 2)
+        line = json.dumps(self.as_dict())
+        log.info("startup report: %s", line)
+        path = path or os.environ.get(REPORT_PATH_ENV)
+        if path:
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError:
+                log.exception("Could not write startup report to %s", path)
+        return True
+
+
+REPORT = StartupReport()
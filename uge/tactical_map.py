@@ -0,0 +1,130 @@
+"""Tactical map layers.
+
+The map is split into a static base (tiles plus fogged POI geometry and
+labels, identical for every turn of a mission) and a small dynamic feature
+group (squad tokens and recon overlays for discovered POIs). The app keeps
+the base map object and only swaps the dynamic group through
+``st_folium(feature_group_to_add=...)``, so the browser keeps its Leaflet
+map and redraws just the layer that changed.
+
+folium is only imported once a map is actually drawn, so the landing page
+doesn't pay for it.
+"""
+from uge.startup import REPORT
+
+SATELLITE_TILES = 'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}'
+SATELLITE_ATTR = 'Esri'
+MARKER_COLOR = "#00FF00"
+POI_RADIUS = 45
+
+TOKEN_ICONS = {
+    "SAM": "https://peteburnettvisuals.com/wp-content/uploads/2026/01/sam-map1.png",
+    "DAVE": "https://peteburnettvisuals.com/wp-content/uploads/2026/01/dave-map1.png",
+    "MIKE": "https://peteburnettvisuals.com/wp-content/uploads/2026/01/mike-map1.png",
+}
+TOKEN_SIZE = (45, 45)
+# Spread the three tokens around the POI so they don't stack
+TOKEN_OFFSETS = {"SAM": (0.00015, 0), "DAVE": (-0.0001, 0.00015), "MIKE": (-0.0001, -0.00015)}
+
+# Layer-control label for the dynamic group
+DYNAMIC_LAYER_NAME = "squad_layer"
+
+
+def _folium():
+    return REPORT.lazy_import("folium")
+
+
+def label_html(name, color=MARKER_COLOR):
+    # High-contrast tactical label
+    return f"""
+    <div style="
+        font-family: 'Courier New', monospace;
+        font-size: 9pt;
+        font-weight: bold;
+        color: {color};
+        background-color: rgba(0, 0, 0, 0.7);
+        border: 1px solid {color};
+        border-radius: 3px;
+        padding: 2px 4px;
+        white-space: nowrap;
+        text-shadow: none;
+        display: inline-block;
+        transform: translate(-50%, -150%);
+    ">
+        {name.upper()}
+    </div>
+    """
+
+
+def fogged_popup_html(poi):
+    return f'<div style="width:150px;background:#000;padding:10px;"><h4 style="color:#666;">{poi.name}</h4><p style="color:#666;font-size:10px;">[RECON REQUIRED]</p></div>'
+
+
+def recon_popup_html(poi, image_url):
+    return f'<div style="width:200px;background:#000;padding:10px;border:1px solid #0f0;"><h4 style="color:#0f0;">{poi.name}</h4><img src="{image_url}" width="100%"><p style="color:#0f0;font-size:10px;">{poi.intel}</p></div>'
+
+
+def build_base_map(mission, center, zoom=15, tiles=SATELLITE_TILES, zooms=None, bounds=None):
+    """Tiles plus every POI in its fogged state. Built once per mission.
+
+    ``zooms`` (min, max) and ``bounds`` (south, west, north, east) pin the view
+    to what an offline tile bundle actually covers.
+    """
+    folium = _folium()
+    limits = {}
+    if zooms:
+        limits.update(min_zoom=min(zooms), max_zoom=max(zooms))
+    if bounds:
+        south, west, north, east = bounds
+        limits.update(max_bounds=True, min_lat=south, min_lon=west, max_lat=north, max_lon=east)
+    m = folium.Map(location=list(center), zoom_start=zoom, tiles=tiles,
+                   attr=SATELLITE_ATTR, name='Satellite', **limits)
+    for poi in mission.pois.values():
+        folium.Circle(location=poi.coords, radius=POI_RADIUS, color=MARKER_COLOR,
+                      fill=True, fill_opacity=0.02).add_to(m)
+        folium.Marker(
+            location=poi.coords,
+            icon=folium.DivIcon(html=label_html(poi.name)),
+            popup=folium.Popup(fogged_popup_html(poi), max_width=250),
+        ).add_to(m)
+    return m
+
+
+def token_coords(poi, unit):
+    offset = TOKEN_OFFSETS.get(unit, (0, 0))
+    return [poi.coords[0] + offset[0], poi.coords[1] + offset[1]]
+
+
+def build_dynamic_layer(mission, positions, discovered, image_url, token_icons=None):
+    """Recon overlays for ``discovered`` POI ids plus a token per unit.
+
+    ``positions`` is ``[(unit, poi_id), ...]``; ``image_url`` turns a POI image
+    filename into a URL for the popup (a ``data:`` URI works too), and
+    ``token_icons`` overrides ``TOKEN_ICONS`` per unit.
+    """
+    folium = _folium()
+    fg = folium.FeatureGroup(name=DYNAMIC_LAYER_NAME)
+    for poi_id in discovered:
+        poi = mission.pois.get(poi_id)
+        if poi is None:
+            continue
+        folium.Circle(location=poi.coords, radius=POI_RADIUS, color=MARKER_COLOR,
+                      fill=True, fill_opacity=0.2).add_to(fg)
+        folium.Marker(
+            location=poi.coords,
+            icon=folium.DivIcon(html=label_html(poi.name)),
+            popup=folium.Popup(recon_popup_html(poi, image_url(poi.image)), max_width=250),
+        ).add_to(fg)
+    # Squad Tokens
+    for unit, poi_id in positions:
+        poi = mission.pois[poi_id]
+        icon_url = (token_icons or TOKEN_ICONS).get(unit, TOKEN_ICONS[unit])
+        icon = folium.CustomIcon(icon_url, icon_size=TOKEN_SIZE)
+        folium.Marker(token_coords(poi, unit), icon=icon, tooltip=unit).add_to(fg)
+    return fg
+
+
+def detach_layer(m, fg):
+    """Undo ``st_folium``'s ``fg.add_to(m)`` so the base map renders unchanged next rerun."""
+    if fg is not None:
+        m._children.pop(fg.get_name(), None)
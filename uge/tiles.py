@@ -0,0 +1,381 @@
+"""Map tile proxy, on-disk tile cache and offline tile bundles.
+
+Every player's map used to pull the same few Esri World_Imagery tiles
+around the theater straight from ``server.arcgisonline.com``. ``TileProxy``
+answers ``(z, x, y)`` from, in order:
+
+1. seeded MBTiles bundles (one per mission package, ``tiles.mbtiles``);
+2. a ``TileCache`` on disk, LRU-bounded by bytes;
+3. the upstream server, through an injectable ``fetch`` (None = offline).
+
+Deploying: ``python -m uge.tiles export`` (``export_static``) turns each
+bundle into plain files under ``static/tiles/``, served by Streamlit's static
+file serving on the app's own port. That is the path for Cloud Run, which
+exposes a single port.
+
+``TileServer`` exposes a proxy at ``/tiles/{z}/{x}/{y}`` on a second port,
+for local development (filling the disk cache while a mission is authored).
+It binds to loopback by default and sends no CORS headers: map tiles are
+plain ``<img>`` loads and need none.
+
+``seed_bundle`` fills a bundle for a mission's bounding box at the zoom
+levels it uses; ``python -m uge.tiles seed`` does it for a whole catalog.
+"""
+import argparse
+import logging
+import math
+import os
+import sqlite3
+import threading
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from uge.tactical_map import SATELLITE_TILES
+
+BUNDLE_FILE = "tiles.mbtiles"
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+# Margin around the outermost POIs, in degrees (~550 m)
+DEFAULT_PAD_DEGREES = 0.005
+FETCH_TIMEOUT_SECONDS = 10
+TILE_MAX_AGE_SECONDS = 7 * 24 * 3600
+USER_AGENT = "uge-tile-proxy/1.0"
+# The proxy is a local development aid: loopback only unless asked otherwise
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+
+log = logging.getLogger(__name__)
+
+
+# --- TILE MATHS ---
+def lonlat_to_tile(lat, lon, zoom):
+    """Web Mercator tile (x, y) holding a point."""
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def mission_bbox(mission, pad=DEFAULT_PAD_DEGREES):
+    """(south, west, north, east) around every POI plus ``pad``."""
+    lats = [poi.coords[0] for poi in mission.pois.values()]
+    lons = [poi.coords[1] for poi in mission.pois.values()]
+    return min(lats) - pad, min(lons) - pad, max(lats) + pad, max(lons) + pad
+
+
+def mission_zooms(mission):
+    """The map opens at ``map_zoom``; cover one level out and one in."""
+    return tuple(range(max(mission.map_zoom - 1, 0), mission.map_zoom + 2))
+
+
+def tiles_for(bbox, zooms):
+    south, west, north, east = bbox
+    for z in zooms:
+        x0, y0 = lonlat_to_tile(north, west, z)
+        x1, y1 = lonlat_to_tile(south, east, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def sniff_tile_type(data):
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def http_fetcher(template=SATELLITE_TILES, timeout=FETCH_TIMEOUT_SECONDS):
+    """``fetch(z, x, y) -> bytes`` against an XYZ URL template (Esri's is {z}/{y}/{x})."""
+    def fetch(z, x, y):
+        request = urllib.request.Request(template.format(z=z, x=x, y=y), headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+    return fetch
+
+
+# --- MBTILES ---
+class MBTilesBundle:
+    """Minimal MBTiles 1.3 reader/writer (TMS rows, as the spec stores them)."""
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        if writable:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);"
+                "CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER,"
+                " tile_row INTEGER, tile_data BLOB);"
+                "CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row);"
+            )
+        else:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _row(z, y):
+        return (2 ** z) - 1 - y
+
+    def get(self, z, x, y):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+                (z, x, self._row(z, y))).fetchone()
+        return bytes(row[0]) if row else None
+
+    def has(self, z, x, y):
+        return self.get(z, x, y) is not None
+
+    def put(self, z, x, y, data):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (z, x, self._row(z, y), data))
+
+    def set_metadata(self, **values):
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)",
+                                 [(k, str(v)) for k, v in values.items()])
+            self._db.commit()
+
+    def metadata(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT name, value FROM metadata").fetchall())
+
+    def tiles(self):
+        """Every ``(z, x, y)`` in the bundle."""
+        with self._lock:
+            rows = self._db.execute("SELECT zoom_level, tile_column, tile_row FROM tiles").fetchall()
+        return [(z, x, self._row(z, row)) for z, x, row in rows]
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# --- DISK CACHE ---
+class TileCache:
+    """``root/{z}/{x}/{y}`` files, evicted least-recently-used past ``max_bytes``."""
+
+    def __init__(self, root, max_bytes=DEFAULT_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()   # (z, x, y) -> size, most recent last
+        self._bytes = 0
+        self._load_index()
+
+    def _path(self, z, x, y):
+        return os.path.join(self.root, str(z), str(x), str(y))
+
+    def _load_index(self):
+        found = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                parts = os.path.relpath(path, self.root).split(os.sep)
+                if len(parts) != 3 or not all(p.isdigit() for p in parts):
+                    continue
+                st = os.stat(path)
+                found.append((st.st_atime, tuple(int(p) for p in parts), st.st_size))
+        for _, key, size in sorted(found):
+            self._index[key] = size
+            self._bytes += size
+
+    def get(self, z, x, y):
+        key = (z, x, y)
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(z, x, y), "rb") as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                self._bytes -= self._index.pop(key, 0)
+            return None
+
+    def put(self, z, x, y, data):
+        path = self._path(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        evict = []
+        with self._lock:
+            self._bytes += len(data) - self._index.pop((z, x, y), 0)
+            self._index[(z, x, y)] = len(data)
+            while self._bytes > self.max_bytes and len(self._index) > 1:
+                key, size = self._index.popitem(last=False)
+                self._bytes -= size
+                evict.append(key)
+        for key in evict:
+            try:
+                os.remove(self._path(*key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"tiles": len(self._index), "bytes": self._bytes}
+
+
+# --- PROXY ---
+class TileProxy:
+    """Bundles, then the disk cache, then upstream (skipped when ``fetch`` is None)."""
+
+    def __init__(self, cache=None, bundles=(), fetch=None):
+        self.cache = cache
+        self.bundles = list(bundles)
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self.counts = {"bundle": 0, "cache": 0, "upstream": 0, "miss": 0}
+
+    def _count(self, source):
+        with self._lock:
+            self.counts[source] += 1
+
+    def get(self, z, x, y):
+        for bundle in self.bundles:
+            data = bundle.get(z, x, y)
+            if data is not None:
+                self._count("bundle")
+                return data
+        if self.cache is not None:
+            data = self.cache.get(z, x, y)
+            if data is not None:
+                self._count("cache")
+                return data
+        if self._fetch is None:
+            self._count("miss")
+            return None
+        try:
+            data = self._fetch(z, x, y)
+        except Exception:
+            log.warning("Upstream tile %s/%s/%s failed", z, x, y, exc_info=True)
+            self._count("miss")
+            return None
+        self._count("upstream")
+        if self.cache is not None and data:
+            try:
+                self.cache.put(z, x, y, data)
+            except OSError:
+                log.warning("Tile cache write failed", exc_info=True)
+        return data
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        if self.cache is not None:
+            counts.update(self.cache.stats())
+        return counts
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    proxy = None
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) != 4 or parts[0] != "tiles" or not all(p.isdigit() for p in parts[1:]):
+            self.send_error(404)
+            return
+        z, x, y = (int(p) for p in parts[1:])
+        data = self.proxy.get(z, x, y)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", sniff_tile_type(data))
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", f"public, max-age={TILE_MAX_AGE_SECONDS}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # Tile traffic would drown the app log
+
+
+class TileServer:
+    """Serves a ``TileProxy`` over HTTP on a daemon thread."""
+
+    def __init__(self, proxy, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        handler = type("TileHandler", (_TileHandler,), {"proxy": proxy})
+        self.proxy = proxy
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="uge-tiles", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- OFFLINE BUNDLES ---
+def seed_bundle(path, mission, fetch, zooms=None, pad=DEFAULT_PAD_DEGREES):
+    """Fills ``path`` with every tile over ``mission``'s bbox; returns the number fetched."""
+    bbox = mission_bbox(mission, pad)
+    zooms = tuple(zooms or mission_zooms(mission))
+    bundle = MBTilesBundle(path, writable=True)
+    fetched = 0
+    try:
+        for z, x, y in tiles_for(bbox, zooms):
+            if bundle.has(z, x, y):
+                continue
+            bundle.put(z, x, y, fetch(z, x, y))
+            fetched += 1
+        south, west, north, east = bbox
+        bundle.set_metadata(name=mission.catalog_id or mission.mission_id, format="jpg", type="baselayer",
+                            bounds=f"{west},{south},{east},{north}",
+                            minzoom=min(zooms), maxzoom=max(zooms))
+    finally:
+        bundle.commit()
+        bundle.close()
+    return fetched
+
+
+def export_static(bundle_path, out_dir):
+    """Writes a bundle as ``out_dir/{z}/{x}/{y}.jpg`` for static serving; returns the tile count."""
+    bundle = MBTilesBundle(bundle_path)
+    try:
+        tiles = bundle.tiles()
+        for z, x, y in tiles:
+            path = os.path.join(out_dir, str(z), str(x), f"{y}.jpg")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(bundle.get(z, x, y))
+    finally:
+        bundle.close()
+    return len(tiles)
+
+
+def main():
+    from uge.catalog import MissionCatalog
+
+    parser = argparse.ArgumentParser(description="Seed offline tile bundles for mission packages.")
+    parser.add_argument("command", choices=["seed", "export"])
+    parser.add_argument("roots", nargs="*", default=["missions"])
+    parser.add_argument("--zooms", type=int, nargs="+", help="default: the mission's zoom +/- 1")
+    parser.add_argument("--static", default="static/tiles", help="export target (one folder per mission)")
+    args = parser.parse_args()
+
+    catalog = MissionCatalog(args.roots)
+    for entry in catalog.entries():
+        bundle_path = os.path.join(entry.package_dir, BUNDLE_FILE)
+        if args.command == "seed":
+            fetched = seed_bundle(bundle_path, catalog.get(entry.id), http_fetcher(), zooms=args.zooms)
+            print(f"{entry.id}: {fetched} tile(s) fetched into {bundle_path}")
+        elif os.path.isfile(bundle_path):
+            count = export_static(bundle_path, os.path.join(args.static, entry.id))
+            print(f"{entry.id}: {count} tile(s) exported")
+
+
+if __name__ == "__main__":
+    main()
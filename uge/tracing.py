@@ -0,0 +1,117 @@
+"""Lightweight per-turn tracing.
+
+``Tracer.span(name, **attrs)`` times a block and records it with whatever
+attributes the caller attaches (token counts, payload sizes, the session's
+turn number...). Finished spans go to:
+
+* a ``JsonlSink``, one JSON object per line, when a path is configured, for
+  offline analysis and regression hunting;
+* a bounded in-memory window per span name, which ``summary()`` reduces to
+  count / p50 / p95 / max for the admin debug panel.
+
+Spans may finish on any thread (model calls run on the turn workers).
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_WINDOW = 500
+
+log = logging.getLogger(__name__)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` (0 < q <= 100); None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))   # ceil without floats
+    return ordered[int(rank) - 1]
+
+
+def payload_bytes(value):
+    """Rough serialized size of ``value`` as it would be stored or sent."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+class JsonlSink:
+    """Appends records to a JSONL file; write errors are logged, never raised."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError:
+                log.exception("Trace sink %s unavailable", self.path)
+
+
+class Span:
+    __slots__ = ("name", "attrs")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """Thread-safe span recorder with rolling aggregates."""
+
+    def __init__(self, sink=None, window=DEFAULT_WINDOW, clock=time.perf_counter):
+        self.sink = sink
+        self.window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._durations = {}   # span name -> deque of recent durations (ms)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = Span(name, attrs)
+        start = self._clock()
+        try:
+            yield span
+        except Exception as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(name, (self._clock() - start) * 1000, **span.attrs)
+
+    def record(self, name, ms, **attrs):
+        """Adds a finished span (also usable for timings measured elsewhere)."""
+        ms = round(ms, 3)
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.window)
+            durations.append(ms)
+        if self.sink is not None:
+            self.sink.write({"ts": time.time(), "span": name, "ms": ms, **attrs})
+
+    def summary(self):
+        """``{name: {"count", "p50", "p95", "max"}}`` over each span's recent window."""
+        with self._lock:
+            windows = {name: list(d) for name, d in self._durations.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "max": max(values),
+            }
+            for name, values in sorted(windows.items()) if values
+        }